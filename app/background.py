@@ -0,0 +1,226 @@
+"""Bounded executor for Redis writes that can happen after the response.
+
+Memory saves, token accounting and feedback events don't change the answer,
+so request handlers ``submit`` them here and return. A job is an async
+callable taking ``pipe=``. It queues its commands on the pipeline it is given
+instead of executing them. Each shard worker collects up to ``BATCH_SIZE``
+queued jobs, or whatever arrives within ``BATCH_LINGER``, and sends them all
+in one pipeline round trip.
+
+Jobs are sharded by key (``chatmem:<client>:<chat>`` for memory), so writes
+for one session run in submission order. ``flush(key)`` waits for a key's
+pending writes in this process; ``redis_memory.get_memory`` calls it, so the
+next turn on the same worker sees the saved history. Another worker can still
+read the list before the write lands. Deferred memory writes are therefore
+appends of the new turn (``append_memory``), never a rewrite of the whole
+list, so a turn is never lost even if the next one briefly misses it. When a shard queue is full, ``submit`` waits briefly
+and then runs the job inline. A backlog slows requests down rather than
+growing without bound. ``drain()`` on shutdown finishes everything queued.
+"""
+import asyncio
+import os
+import zlib
+from functools import partial
+
+from app import metrics
+from app import redis_utils
+from app.logging_utils import get_logger
+
+try:
+    from redis.exceptions import ResponseError
+except Exception:  # redis stubbed out (tests)
+    class ResponseError(Exception):
+        pass
+
+logger = get_logger("background")
+
+SHARDS = int(os.getenv("BACKGROUND_SHARDS", "4"))
+QUEUE_SIZE = int(os.getenv("BACKGROUND_QUEUE_SIZE", "1000"))
+BATCH_SIZE = int(os.getenv("BACKGROUND_BATCH_SIZE", "64"))
+BATCH_LINGER = float(os.getenv("BACKGROUND_BATCH_LINGER_MS", "5")) / 1000.0
+SUBMIT_TIMEOUT = float(os.getenv("BACKGROUND_SUBMIT_TIMEOUT", "0.5"))
+DRAIN_TIMEOUT = float(os.getenv("BACKGROUND_DRAIN_TIMEOUT", "10"))
+
+PENDING = metrics.REGISTRY.register(metrics.Gauge(
+    "axios_background_pending",
+    "Post-response jobs queued and not yet written.",
+    ("shard",),
+))
+JOBS = metrics.REGISTRY.register(metrics.Counter(
+    "axios_background_jobs_total",
+    "Post-response jobs by outcome (batched, inline, failed).",
+    ("kind", "result"),
+))
+BATCH_JOBS = metrics.REGISTRY.register(metrics.Histogram(
+    "axios_background_batch_jobs",
+    "Jobs written per pipeline round trip.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+))
+
+
+def _kind(job) -> str:
+    func = job.func if isinstance(job, partial) else job
+    return getattr(func, "__name__", "job")
+
+
+async def _run_alone(job) -> None:
+    pipe = redis_utils.r.pipeline()
+    await job(pipe=pipe)
+    await pipe.execute()
+
+
+class BackgroundExecutor:
+    def __init__(self, shards: int = SHARDS, queue_size: int = QUEUE_SIZE,
+                 batch_size: int = BATCH_SIZE, linger: float = BATCH_LINGER):
+        self.shards = shards
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.linger = linger
+        self._loop = None
+        self._queues: list[asyncio.Queue] = []
+        self._workers: list[asyncio.Task] = []
+        self._last: dict[str, asyncio.Future] = {}
+        self._closing = False
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # first use, or a new event loop (tests, reloads): the old workers are gone
+        self._loop = loop
+        self._closing = False
+        self._last = {}
+        self._queues = [asyncio.Queue(self.queue_size) for _ in range(self.shards)]
+        self._workers = [loop.create_task(self._work(i)) for i in range(self.shards)]
+
+    def _shard(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.shards
+
+    async def submit(self, key: str, job) -> None:
+        """Queue ``job`` (``async def job(pipe)``) behind earlier jobs for ``key``."""
+        self._ensure_started()
+        if self._closing:
+            await self._inline(job)
+            return
+        shard = self._shard(key)
+        queue = self._queues[shard]
+        previous = self._last.get(key)
+        done = self._loop.create_future()
+        self._last[key] = done
+        try:
+            try:
+                queue.put_nowait((key, job, done))
+            except asyncio.QueueFull:
+                await asyncio.wait_for(queue.put((key, job, done)), SUBMIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Background queue %d full; writing inline", shard, extra={"category": "background"})
+            if previous is not None:
+                await asyncio.shield(previous)
+            await self._inline(job)
+            done.set_result(None)
+            if self._last.get(key) is done:
+                del self._last[key]
+        PENDING.set(queue.qsize(), shard=str(shard))
+
+    async def _inline(self, job) -> None:
+        try:
+            await _run_alone(job)
+            JOBS.inc(kind=_kind(job), result="inline")
+        except Exception:
+            JOBS.inc(kind=_kind(job), result="failed")
+            logger.exception("Inline background job %s failed", _kind(job), extra={"category": "background"})
+
+    async def flush(self, key: str) -> None:
+        """Wait until every job submitted for ``key`` so far has been written."""
+        done = self._last.get(key)
+        if done is not None and self._loop is asyncio.get_running_loop():
+            await asyncio.shield(done)
+
+    async def _work(self, shard: int) -> None:
+        queue = self._queues[shard]
+        while True:
+            batch = [await queue.get()]
+            if self.linger and queue.qsize() < self.batch_size - 1:
+                # plain sleep rather than wait_for(queue.get()), which can swallow a cancel
+                await asyncio.sleep(self.linger)
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            await self._write(batch)
+            for key, _, done in batch:
+                if not done.done():
+                    done.set_result(None)
+                if self._last.get(key) is done:
+                    del self._last[key]
+                queue.task_done()
+            PENDING.set(queue.qsize(), shard=str(shard))
+
+    async def _write(self, batch) -> None:
+        """Send a batch in one pipeline without ever applying a job twice.
+
+        Counters (INCRBY), streams (XADD) and appends (RPUSH) are not
+        idempotent, so only jobs known to have written nothing are replayed:
+        ones that raised while queuing, and the whole batch when the
+        transaction was aborted. A command that errors inside EXEC leaves the
+        rest of its job applied, and a connection lost mid-EXEC leaves the
+        batch in an unknown state; those jobs are logged as failed instead.
+        """
+        pipe = redis_utils.r.pipeline()
+        queued, replay = [], []  # queued: (job, first reply index, end index)
+        for _, job, _ in batch:
+            start = len(pipe.command_stack)
+            try:
+                await job(pipe=pipe)
+            except Exception as e:
+                del pipe.command_stack[start:]  # never sent; run it alone afterwards
+                logger.warning("Background job %s failed to queue (%r); retrying alone", _kind(job), e,
+                               extra={"category": "background"})
+                replay.append(job)
+                continue
+            queued.append((job, start, len(pipe.command_stack)))
+        try:
+            replies = await pipe.execute(raise_on_error=False) if queued else []
+        except ResponseError as e:
+            # EXECABORT (a command was rejected while queuing): nothing ran
+            logger.warning("Background batch of %d aborted (%r); retrying singly", len(queued), e,
+                           extra={"category": "background"})
+            replay = [job for job, _, _ in queued] + replay
+            queued = []
+        except Exception as e:
+            logger.error("Background batch of %d may be partly written (%r); not retrying", len(queued), e,
+                         extra={"category": "background"})
+            for job, _, _ in queued:
+                JOBS.inc(kind=_kind(job), result="failed")
+            queued = []
+        else:
+            BATCH_JOBS.observe(len(queued))
+        for job, start, end in queued:
+            errors = [reply for reply in replies[start:end] if isinstance(reply, Exception)]
+            if errors:
+                JOBS.inc(kind=_kind(job), result="failed")
+                logger.error("Background job %s failed in batch: %r", _kind(job), errors[0],
+                             extra={"category": "background"})
+            else:
+                JOBS.inc(kind=_kind(job), result="batched")
+        for job in replay:
+            await self._inline(job)
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT) -> None:
+        """Stop taking new work, write everything queued, then stop the workers."""
+        if self._loop is not asyncio.get_running_loop():
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            left = sum(q.qsize() for q in self._queues)
+            logger.error("Background drain timed out with %d jobs unwritten", left, extra={"category": "background"})
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._loop = None
+
+
+executor = BackgroundExecutor()
+submit = executor.submit
+flush = executor.flush
+drain = executor.drain
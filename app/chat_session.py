@@ -0,0 +1,131 @@
+"""In-process state for one live chat connection (the ``/ws/chat`` transport).
+
+On every message, ``/chat`` re-resolves the client config, reloads the whole
+history from Redis, re-checks ``last_seen`` and rebuilds the memory summary. A
+``ChatSession`` does all of that once, when the socket authenticates. For the
+life of the connection it then keeps:
+
+- the resolved config (persona and prompt placeholders applied)
+- the conversation history
+- the rolling summary, rebuilt only after ``summary_max_messages`` new messages
+
+Each turn is appended to Redis through the background writer
+(write-through), so ``/history`` and a later reconnect see the same
+conversation. ``close()`` waits for those writes to land.
+"""
+import time
+from datetime import datetime
+from functools import partial
+
+from app import background
+from app import metrics
+from app import redis_memory
+from app import scheduler
+from app.chatbot import (
+    ChatMessageHistory,
+    TokenStream,
+    _answer,
+    add_user_name,
+    faq_answer,
+    finalize_prompt,
+    get_memory,
+    resolve_config,
+    summarize_recent_messages_with_llm,
+)
+from app.logging_utils import get_logger
+from app.redis_utils import get_last_seen, get_session_timeout, set_last_seen
+
+logger = get_logger("session")
+
+
+class ChatSession:
+    def __init__(self, client_id: str, chat_id: str, config: dict, history: ChatMessageHistory,
+                 timeout_seconds: float, allow_fallback: bool = False):
+        self.client_id = client_id
+        self.chat_id = chat_id
+        self.config = config
+        self.history = history
+        self.timeout_seconds = timeout_seconds
+        self.allow_fallback = allow_fallback
+        self.memory = bool(config.get("has_chat_memory", False))
+        self.summary: str | None = None
+        self.summarized_at = 0  # history length the summary was built from
+        self.last_active = time.monotonic()
+
+    @classmethod
+    async def open(cls, client_id: str, chat_id: str, allow_fallback: bool = False) -> "ChatSession":
+        """Resolve config and load (or expire) the stored conversation once."""
+        config = await resolve_config(client_id)
+        timeout = await get_session_timeout(client_id)
+        now = datetime.utcnow()
+        last = await get_last_seen(client_id, chat_id)
+        if last is None or (now - last) > timeout:
+            await redis_memory.delete_memory(client_id, chat_id)
+            history = ChatMessageHistory()
+        else:
+            history = await get_memory(chat_id, client_id)
+        await set_last_seen(client_id, chat_id, now)
+        logger.debug(
+            "Opened session %s for %s (%d messages)", chat_id, client_id, len(history.messages),
+            extra={"category": "memory"},
+        )
+        return cls(client_id, chat_id, config, history, timeout.total_seconds(), allow_fallback)
+
+    async def ask(self, question: str, on_token=None) -> dict:
+        """Answer one message, passing answer tokens to ``await on_token(text)`` as they stream."""
+        now = time.monotonic()
+        if now - self.last_active > self.timeout_seconds:
+            # idle past the session timeout: start over, as /chat would
+            await redis_memory.delete_memory(self.client_id, self.chat_id)
+            self.history = ChatMessageHistory()
+            self.summary, self.summarized_at = None, 0
+        self.last_active = now
+
+        config = self.config.copy()
+        metrics.set_request_labels(client_id=self.client_id, model=config.get("gpt_model", "unknown"))
+        result = await faq_answer(config, question) if config.get("faq_enabled") else None
+        if result is not None:
+            if on_token:
+                await on_token(result["answer"])
+        else:
+            result = await self._generate(config, question, on_token)
+
+        key = redis_memory.memory_key(self.client_id, self.chat_id)
+        if self.memory:
+            self.history.add_user_message(question)
+            self.history.add_ai_message(result["answer"])
+            await background.submit(key, partial(
+                redis_memory.append_memory, self.client_id, self.chat_id, self.history.messages[-2:],
+            ))
+        else:
+            self.history = ChatMessageHistory()
+        await background.submit(key, partial(set_last_seen, self.client_id, self.chat_id, datetime.utcnow()))
+        return result
+
+    async def _generate(self, config: dict, question: str, on_token) -> dict:
+        scheduler.llm.check(self.client_id, config)
+        # the chain sees a copy, like /chat's per-request load, so it can't touch the session's history
+        working = ChatMessageHistory()
+        for msg in self.history.messages:
+            working.add_message(msg)
+        add_user_name(config, working, question)
+        finalize_prompt(config, working, question, await self._summary(working))
+
+        callbacks = [TokenStream(on_token)] if on_token else []
+        return await _answer(
+            config, working, question, self.chat_id, self.client_id, self.allow_fallback, callbacks,
+        )
+
+    async def _summary(self, history: ChatMessageHistory) -> str | None:
+        if not self.config.get("enable_memory_summary"):
+            return None
+        every = self.config.get("memory_options", {}).get("summary_max_messages", 5)
+        size = len(history.messages)
+        if size != self.summarized_at and (not self.summary or size - self.summarized_at >= every):
+            self.summary = await summarize_recent_messages_with_llm(history, self.config)
+            self.summarized_at = size
+        return self.summary
+
+    async def close(self) -> None:
+        """Wait until this session's queued writes are in Redis."""
+        await background.flush(redis_memory.memory_key(self.client_id, self.chat_id))
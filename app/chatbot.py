@@ -1,23 +1,43 @@
-from langchain_community.callbacks.manager import get_openai_callback
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain.chains import ConversationalRetrievalChain
-from langchain.prompts import PromptTemplate
 from langchain_community.chat_message_histories.in_memory import ChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain.schema import SystemMessage, HumanMessage, AIMessage
-from pinecone import Pinecone as PineconeClient
-from langchain_pinecone import PineconeVectorStore
-from app.redis_utils import get_persona, increment_token_usage
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from app.redis_utils import get_debug_prompt, get_persona, increment_token_usage
 from app import redis_memory
+from app import background
+from app import faq
+from app import metrics
+from app import scheduler
+from app import serialization
+from app import singleflight
+from app.embeddings import get_embeddings, is_local_model
+from app.lazy import LazyAttr
+from app.logging_utils import get_logger, prompt_dump_enabled
+import asyncio
 import os
-import tiktoken
+import time
 from datetime import datetime, timedelta, timezone
 import re
 import inspect
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import partial
 
 from app.client_config import CLIENT_CONFIG
 from app.redis_utils import get_client_config
 
+logger = get_logger("chatbot")
+
+# Heavy SDKs (OpenAI, Pinecone, LangChain chains) load on first use, not at boot
+get_openai_callback = LazyAttr("langchain_community.callbacks.manager", "get_openai_callback")
+ChatOpenAI = LazyAttr("langchain_openai", "ChatOpenAI")
+ConversationalRetrievalChain = LazyAttr("langchain.chains", "ConversationalRetrievalChain")
+PromptTemplate = LazyAttr("langchain.prompts", "PromptTemplate")
+RunnableWithMessageHistory = LazyAttr("langchain_core.runnables.history", "RunnableWithMessageHistory")
+PineconeClient = LazyAttr("pinecone", "Pinecone")
+PineconeVectorStore = LazyAttr("langchain_pinecone", "PineconeVectorStore")
+HydratingRetriever = LazyAttr("app.retrieval", "HydratingRetriever")
 
 def get_prompt_template(system_prompt_str: str):
     return PromptTemplate(
@@ -37,17 +57,36 @@ async def get_memory(chat_id: str, client_id: str) -> ChatMessageHistory:
     """Load session memory from Redis or return a new history if disabled."""
     if not await is_memory_enabled(client_id):
         return ChatMessageHistory()
-    history = await redis_memory.get_memory(client_id, chat_id)
-    print(
-        f"[MEMORY DEBUG] Loaded Redis memory for {client_id}:{chat_id} ({len(history.messages)} messages)"
+    with metrics.stage("memory_load"):
+        history = await redis_memory.get_memory(client_id, chat_id)
+    logger.debug(
+        "Loaded Redis memory for %s:%s (%d messages)",
+        client_id, chat_id, len(history.messages),
+        extra={"category": "memory"},
     )
     return history
 
 
-async def save_redis_memory(client_id: str, chat_id: str, chat_history: ChatMessageHistory) -> None:
-    """Persist session history to Redis."""
-    await redis_memory.save_memory(client_id, chat_id, chat_history)
-    print(f"[MEMORY DEBUG] Saved memory for session {chat_id} client {client_id} to Redis")
+async def save_redis_memory(client_id: str, chat_id: str, chat_history: ChatMessageHistory, pipe=None) -> None:
+    """Persist session history to Redis (queued on ``pipe`` when given)."""
+    with metrics.stage("memory_save"):
+        await redis_memory.save_memory(client_id, chat_id, chat_history, pipe=pipe)
+    logger.debug(
+        "Saved memory for session %s client %s to Redis", chat_id, client_id,
+        extra={"category": "memory"},
+    )
+
+
+async def append_redis_memory_later(client_id: str, chat_id: str, messages: list) -> None:
+    """Hand this turn's messages to the background writer as an append.
+
+    Never a full rewrite: another worker may load the session before this
+    write lands, and a rewrite from its stale copy would drop the turn.
+    """
+    await background.submit(
+        redis_memory.memory_key(client_id, chat_id),
+        partial(redis_memory.append_memory, client_id, chat_id, messages),
+    )
 
 
 # Identity extraction to insert as system message once
@@ -96,23 +135,145 @@ async def summarize_recent_messages_with_llm(
         openai_api_key=config.get("openai_api_key"),
         temperature=0.0,
     )
-    result = await llm.ainvoke(prompt)
+    with metrics.stage("summary_llm"):
+        async with scheduler.llm.slot(config.get("client_id", ""), config):
+            result = await llm.ainvoke(prompt)
     summary = getattr(result, "content", str(result))
-    print(f"[MEMORY DEBUG] Generated LLM summary:\n{summary}")
+    logger.debug("Generated LLM summary (%d chars)", len(summary), extra={"category": "memory"})
     return summary
 
 
+# Query vectors already computed for the current task (batch requests embed
+# every question up front; retrieval then looks them up here)
+_query_vectors: ContextVar[dict[str, list[float]] | None] = ContextVar("query_vectors", default=None)
+
+
+class TimedEmbeddings(Embeddings):
+    """Embeddings wrapper that records time spent embedding as a metrics stage.
+
+    Async calls to a remote model also wait for an embedding scheduler slot,
+    so the queueing shows up in the ``embedding`` stage.
+    """
+
+    def __init__(self, inner: Embeddings, config: dict | None = None):
+        self.inner = inner
+        self.config = config or {}
+        self.scheduled = not is_local_model(self.config.get("embedding_model"))
+
+    def _slot(self):
+        if not self.scheduled:
+            return _no_slot()
+        return scheduler.embedding.slot(self.config.get("client_id", ""), self.config)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with metrics.stage("embedding"):
+            return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        known = _query_vectors.get()
+        if known and text in known:
+            return known[text]
+        with metrics.stage("embedding"):
+            return self.inner.embed_query(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        with metrics.stage("embedding"):
+            async with self._slot():
+                return await self.inner.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        known = _query_vectors.get()
+        if known and text in known:
+            return known[text]
+        with metrics.stage("embedding"):
+            async with self._slot():
+                return await self.inner.aembed_query(text)
+
+
+@asynccontextmanager
+async def _no_slot():
+    yield
+
+
+class StageTimingHandler(BaseCallbackHandler):
+    """Callback handler timing answer-LLM calls and vector queries in a chain run.
+
+    Retriever time excludes embedding, which ``TimedEmbeddings`` records itself.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._starts = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            metrics.observe_stage("answer_llm", time.perf_counter() - start)
+
+    on_llm_error = on_llm_end
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._starts[run_id] = (time.perf_counter(), metrics.stage_total("embedding"))
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            elapsed = time.perf_counter() - start[0]
+            embedding = metrics.stage_total("embedding") - start[1]
+            metrics.observe_stage("vector_query", max(elapsed - embedding, 0.0))
+
+    on_retriever_error = on_retriever_end
+
+
+class TokenStream(AsyncCallbackHandler):
+    """Callback handler passing each streamed answer token to ``send``."""
+
+    def __init__(self, send):
+        self.send = send
+
+    async def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if token:
+            await self.send(token)
+
+
+# Concurrent retrieval + generation per /chat/batch request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+_indexes: dict[tuple, object] = {}
+
+
+def get_pinecone_index(config: dict):
+    """Return the client's Pinecone index handle, built once per process.
+
+    Building one resolves the index host (a control-plane call) and opens a
+    connection pool, so it is shared across requests and warmed at startup.
+    """
+    # an explicit data-plane host skips the describe_index lookup (and lets
+    # load tests target a local stand-in)
+    host = config.get("pinecone_host") or os.getenv("PINECONE_HOST")
+    key = (config["pinecone_api_key"], config["pinecone_index_name"], host)
+    index = _indexes.get(key)
+    if index is None:
+        pc = PineconeClient(api_key=config["pinecone_api_key"])
+        if host:
+            index = pc.Index(config["pinecone_index_name"], host=host)
+        else:
+            index = pc.Index(config["pinecone_index_name"])
+        _indexes[key] = index
+    return index
 
 
 def get_qa_chain(config: dict, chat_history: ChatMessageHistory):
     chat_prompt = get_prompt_template(config["system_prompt"])
-    embeddings = OpenAIEmbeddings(
-        model=config["embedding_model"],
-        openai_api_key=config["openai_api_key"],
-    )
-    pc = PineconeClient(api_key=config["pinecone_api_key"])
-    index = pc.Index(config["pinecone_index_name"])
-    vectorstore = PineconeVectorStore(index=index, embedding=embeddings, text_key="text")
+    embeddings = TimedEmbeddings(get_embeddings(config), config)
+    index = get_pinecone_index(config)
     llm = ChatOpenAI(
         model_name=config["gpt_model"],
         temperature=0.7,
@@ -121,9 +282,27 @@ def get_qa_chain(config: dict, chat_history: ChatMessageHistory):
         streaming=True,
         stream_usage=True,
     )
-    retriever = vectorstore.as_retriever(search_kwargs={"k": config["max_chunks"]})
+    if config.get("slim_metadata"):
+        # vectors hold ids only; text comes from the chunk store / Redis
+        retriever = HydratingRetriever(
+            index=index,
+            embeddings=embeddings,
+            index_name=config["pinecone_index_name"],
+            k=config["max_chunks"],
+            chunk_store_path=config.get("chunk_store_path"),
+        )
+    else:
+        vectorstore = PineconeVectorStore(index=index, embedding=embeddings, text_key="text")
+        retriever = vectorstore.as_retriever(search_kwargs={"k": config["max_chunks"]})
+    # the follow-up rephrasing call doesn't stream, so token callbacks only see the answer
+    condense_llm = ChatOpenAI(
+        model_name=config["gpt_model"],
+        temperature=0.7,
+        openai_api_key=config["openai_api_key"],
+    )
     base_chain = ConversationalRetrievalChain.from_llm(
         llm=llm,
+        condense_question_llm=condense_llm,
         retriever=retriever,
         combine_docs_chain_kwargs={
             "prompt": chat_prompt,
@@ -144,33 +323,21 @@ def get_qa_chain(config: dict, chat_history: ChatMessageHistory):
     return qa_with_history, retriever
 
 
-async def get_response(
-    chat_id: str,
-    question: str,
-    client_id: str,
-    allow_fallback: bool = False
-):
-    print("\n--- Incoming request ---")
-    print(f"client_id: {client_id}, chat_id: {chat_id}, question: {question}")
+async def resolve_config(client_id: str) -> dict:
+    """Per-request copy of the client's config with its system prompt resolved.
+
+    The prompt comes from the Redis persona when ``use_dynamic_persona`` is set,
+    otherwise from the static config. Either way it is given the RAG
+    placeholders. The session summary and user name are applied later.
+    """
     config = await get_client_config(client_id)
     if not config:
         raise ValueError(f"Unknown client ID: {client_id}")
     # Work with a per-request copy so global settings remain unchanged
     config = config.copy()
     config["client_id"] = client_id
-
-    # Load session memory
-    mem_res = get_memory(chat_id, client_id)
-    chat_history = await mem_res if inspect.isawaitable(mem_res) else mem_res
-
-    # Inject user name if enabled
-    if config.get("enable_user_naming"):
-        name = extract_user_name(question)
-        if name:
-            existing = [m.content for m in chat_history.messages if "identified themselves as" in m.content]
-            if not existing:
-                chat_history.add_message(SystemMessage(content=f"The user has identified themselves as {name}. Refer to them by this name."))
-                print(f"[MEMORY DEBUG] Added system message for user name: {name}")
+    if await get_debug_prompt(client_id):
+        config["debug_prompt_dump"] = True
 
     # Build system_prompt: dynamic if flagged, else use static config
     use_dynamic = config.get("use_dynamic_persona", False)
@@ -188,7 +355,7 @@ async def get_response(
             if "{context}" not in prompt_text or "{question}" not in prompt_text:
                 prompt_text += "\n\nContext:\n{context}\n\nQuestion:\n{question}"
             config["system_prompt"] = prompt_text
-            print("[MEMORY DEBUG] Using Redis persona for system_prompt")
+            logger.debug("Using Redis persona for system_prompt", extra={"category": "persona"})
     else:
         # static prompt from client_config
         sp = config.get("system_prompt", "")
@@ -199,45 +366,208 @@ async def get_response(
         # fallback chunk size if missing
         if "max_chunks" not in config:
             config["max_chunks"] = 5
-
-    # Inject session-memory summary if enabled
-    if config.get("enable_memory_summary"):
-        summary = await summarize_recent_messages_with_llm(chat_history, config)
-        if summary:
-            config["system_prompt"] = (
-                f"Recent conversation summary:\n{summary}\n\n"
-                f"{config['system_prompt']}"
-            )
-            print("[MEMORY DEBUG] Injected conversation summary into system_prompt")
+    return config
+
+
+def add_user_name(config: dict, chat_history: ChatMessageHistory, question: str) -> None:
+    """Record the user's name as a system message, if naming is on and they gave one."""
+    if not config.get("enable_user_naming"):
+        return
+    name = extract_user_name(question)
+    if name:
+        existing = [m.content for m in chat_history.messages if "identified themselves as" in m.content]
+        if not existing:
+            chat_history.add_message(SystemMessage(content=f"The user has identified themselves as {name}. Refer to them by this name."))
+            logger.debug("Added system message for user name", extra={"category": "memory"})
+
+
+def finalize_prompt(config: dict, chat_history: ChatMessageHistory, question: str, summary: str | None) -> None:
+    """Prepend the conversation summary and fill in the user's name."""
+    if summary:
+        config["system_prompt"] = (
+            f"Recent conversation summary:\n{summary}\n\n"
+            f"{config['system_prompt']}"
+        )
+        logger.debug("Injected conversation summary into system_prompt", extra={"category": "memory"})
     user_name = "my friend" # attempt to pull name from session memory, default to "my friend"
     for msg in chat_history.messages:
         if isinstance(msg, SystemMessage) and "identified themselves as" in msg.content:
             user_name = msg.content.split("identified themselves as ")[1].rstrip(".")
             break
-    print(f"[DEBUG] user_name from memory: {user_name}")
-
 
     # Perform the .format() with the user_name
     config["system_prompt"] = config["system_prompt"].format(
         user_name=user_name, context="{context}", question="{question}"
     )
-    print(f"[DEBUG] Final system prompt:\n{config['system_prompt']}")
+    if prompt_dump_enabled(config):
+        logger.info(
+            "Final system prompt:\n%s", config["system_prompt"],
+            extra={"category": "prompt", "client_id": config.get("client_id"), "question": question},
+        )
+
+
+async def faq_answer(config: dict, question: str) -> dict | None:
+    """The client's precomputed answer to ``question``, if it has a confident one.
+
+    The query embedding is kept for retrieval, so a miss doesn't embed twice.
+    FAQ trouble (Redis down, a bad set) never fails the request.
+    """
+    embeddings = TimedEmbeddings(get_embeddings(config), config)
 
+    async def embed(text: str) -> list[float]:
+        vector = await embeddings.aembed_query(text)
+        _query_vectors.set({text: vector})
+        return vector
 
+    try:
+        with metrics.stage("faq_lookup", exclude="embedding"):
+            return await faq.match(config, question, embed)
+    except Exception:
+        logger.warning("FAQ lookup failed; answering normally", exc_info=True, extra={"category": "faq"})
+        return None
 
-    # Invoke QA chain
+
+async def get_response(
+    chat_id: str,
+    question: str,
+    client_id: str,
+    allow_fallback: bool = False
+):
+    logger.info(
+        "Incoming request",
+        extra={"client_id": client_id, "chat_id": chat_id, "question_chars": len(question)},
+    )
+    config = await resolve_config(client_id)
+    metrics.set_request_labels(client_id=client_id, model=config.get("gpt_model", "unknown"))
+    if config.get("faq_enabled"):
+        hit = await faq_answer(config, question)
+        if hit is not None:
+            return hit
+    # refuse before loading memory or embedding if this client's LLM queue is already full
+    scheduler.llm.check(client_id, config)
+
+    # Load session memory
+    mem_res = get_memory(chat_id, client_id)
+    chat_history = await mem_res if inspect.isawaitable(mem_res) else mem_res
+
+    add_user_name(config, chat_history, question)
+
+    # Inject session-memory summary if enabled
+    summary = None
+    if config.get("enable_memory_summary"):
+        summary = await summarize_recent_messages_with_llm(chat_history, config)
+    finalize_prompt(config, chat_history, question, summary)
+
+    async def answer():
+        return await _answer(config, chat_history, question, chat_id, client_id, allow_fallback)
+
+    if singleflight.enabled(config):
+        # identical concurrent questions (same config, same history) share one answer
+        key = singleflight.flight_key(
+            client_id, config, question, chat_history.messages, allow_fallback=allow_fallback,
+        )
+        return await singleflight.do(
+            key, answer, encode=encode_result, decode=decode_result, client_id=client_id,
+        )
+    return await answer()
+
+
+async def _answer(config, chat_history, question, chat_id, client_id, allow_fallback, callbacks=()) -> dict:
+    """Retrieve, generate and account tokens for one question.
+
+    Extra ``callbacks`` (e.g. a ``TokenStream``) are attached to the chain run.
+    """
+    timing = StageTimingHandler()
     with get_openai_callback() as callback:
         qa_chain, retriever = get_qa_chain(config, chat_history)
-        retrieved_docs = await retriever.ainvoke(question)
+        with metrics.stage("vector_query", exclude="embedding"):
+            retrieved_docs = await retriever.ainvoke(question)
         if not retrieved_docs and not allow_fallback:
             return {"answer": "No relevant information found.", "source_documents": [], "token_usage": 0, "cost_estimation": 0.0}
-        result = await qa_chain.ainvoke(
-            {"question": question},
-            config={"configurable": {"session_id": chat_id}},
-        )
+        async with scheduler.llm.slot(client_id, config):
+            result = await qa_chain.ainvoke(
+                {"question": question},
+                config={"configurable": {"session_id": chat_id}, "callbacks": [timing, *callbacks]},
+            )
         result["source_documents"] = retrieved_docs
         token_usage = callback.total_tokens
         cost_estimation = callback.total_cost
-        await increment_token_usage(api_key=client_id, token_count=token_usage, model=config.get("gpt_model", "unknown"))
+        model = config.get("gpt_model", "unknown")
+        metrics.record_tokens(token_usage, model)
+        with metrics.stage("token_accounting"):
+            await background.submit(
+                f"tokens:{client_id}",
+                partial(increment_token_usage, api_key=client_id, token_count=token_usage, model=model),
+            )
         result.update({"token_usage": token_usage, "cost_estimation": cost_estimation})
     return result
+
+
+async def get_batch_responses(
+    client_id: str,
+    questions: list[str],
+    allow_fallback: bool = False,
+    concurrency: int = BATCH_CONCURRENCY,
+):
+    """Answer independent questions for one client.
+
+    Resolves config and persona once and embeds every distinct question in
+    one call; errors there raise from this call. Then returns an async
+    iterator of ``(index, result)`` in completion order. Retrieval and
+    generation run at most ``concurrency`` at a time, and each still takes an
+    LLM scheduler slot. Each item finalizes the prompt with its own question
+    and has no session memory. A failed item yields its exception in place
+    of the result.
+    """
+    config = await resolve_config(client_id)
+    metrics.set_request_labels(client_id=client_id, model=config.get("gpt_model", "unknown"))
+    scheduler.llm.check(client_id, config)
+
+    distinct = list(dict.fromkeys(questions))
+    embeddings = TimedEmbeddings(get_embeddings(config), config)
+    vectors = dict(zip(distinct, await embeddings.aembed_documents(distinct)))
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(index: int, question: str):
+        _query_vectors.set(vectors)  # task-local: each task runs in a copied context
+        async with gate:
+            try:
+                item_config = dict(config)  # the prompt is finalized (and dumped) per question
+                finalize_prompt(item_config, ChatMessageHistory(), question, None)
+                result = await _answer(
+                    item_config, ChatMessageHistory(), question, f"batch-{index}", client_id, allow_fallback,
+                )
+            except Exception as e:
+                return index, e
+        return index, result
+
+    async def results():
+        tasks = [asyncio.ensure_future(one(i, q)) for i, q in enumerate(questions)]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            # the caller stopped reading (client went away): don't keep spending tokens
+            for task in tasks:
+                task.cancel()
+
+    return results()
+
+
+def encode_result(result: dict) -> str:
+    """Serialize the shareable part of a ``get_response`` result."""
+    return serialization.dumps({
+        "answer": result["answer"],
+        "source_documents": [
+            {"page_content": d.page_content, "metadata": d.metadata}
+            for d in result.get("source_documents", [])
+        ],
+        "token_usage": result.get("token_usage", 0),
+        "cost_estimation": result.get("cost_estimation", 0.0),
+    })
+
+
+def decode_result(payload: str) -> dict:
+    data = serialization.loads(payload)
+    data["source_documents"] = [Document(**d) for d in data["source_documents"]]
+    return data
@@ -0,0 +1,263 @@
+"""Single-file, memory-mapped store of every ingested chunk.
+
+One ``.chunks`` file replaces the per-document JSON files under
+``data/chunks``. It is opened with ``mmap`` so loading costs nothing up
+front: lookups by chunk id binary-search a fixed-width index and slice the
+text straight out of the mapping, and the OS page cache shares the file
+between workers.
+
+Layout (little-endian)::
+
+    header   magic "AXCHUNK1", version, count, index/order/info offsets
+    texts    UTF-8 chunk texts and compact JSON metadata, back to back
+    index    ``count`` fixed-width entries sorted by chunk id
+    order    ``count`` u32 index slots in corpus (build) order
+    info     JSON: encoding, build time, field names
+
+Every record has the normalized schema ``id``, ``text``, ``token_count``,
+``source``, ``filename``, ``position``, ``section``, ``section_title``.
+Build one with ``scripts/build_chunk_store.py``.
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"AXCHUNK1"
+VERSION = 1
+ID_WIDTH = 40
+_HEADER = struct.Struct("<8sIIQQQQ")     # magic, version, count, index, order, info offset, info length
+_ENTRY = struct.Struct(f"<{ID_WIDTH}sQIIQI")  # id, text offset, text length, tokens, meta offset, meta length
+_SLOT = struct.Struct("<I")
+# Redis copy of chunk text for slim-metadata indexes (see app/retrieval.py)
+REDIS_TEXT_KEY = "chunk:{index}:{id}"
+# digest of an index's chunk ids and fingerprints, set by embed_upsert.py (see app/faq.py)
+CORPUS_VERSION_KEY = "corpus_version:{index}"
+META_FIELDS = ("source", "filename", "position", "section", "section_title")
+FIELDS = ("id", "text", "token_count") + META_FIELDS
+
+
+class ChunkStoreError(ValueError):
+    pass
+
+
+def normalize(record: dict) -> dict:
+    """Coerce a chunk dict into the store schema (missing fields get defaults)."""
+    if not record.get("id"):
+        raise ChunkStoreError("chunk has no id")
+    if len(record["id"].encode("ascii")) > ID_WIDTH:
+        raise ChunkStoreError(f"chunk id longer than {ID_WIDTH} bytes: {record['id']}")
+    return {
+        "id": record["id"],
+        "text": record["text"],
+        "token_count": int(record.get("token_count") or 0),
+        "source": record.get("source") or "unknown",
+        "filename": record.get("filename") or "",
+        "position": int(record.get("position") or 0),
+        "section": record.get("section") or "",
+        "section_title": record.get("section_title") or "",
+    }
+
+
+def write_store(path: str, records, encoding: str = "cl100k_base") -> int:
+    """Write ``records`` (dicts, see ``normalize``) to ``path`` atomically.
+
+    Texts are streamed to disk; only the fixed-width index is held in memory.
+    Returns the number of chunks written.
+    """
+    tmp = f"{path}.tmp"
+    try:
+        count = _write(tmp, records, encoding)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return count
+
+
+def _write(tmp: str, records, encoding: str) -> int:
+    entries = []
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        offset = _HEADER.size
+        for record in records:
+            record = normalize(record)
+            text = record["text"].encode("utf-8")
+            meta = json.dumps({k: record[k] for k in META_FIELDS}, separators=(",", ":"),
+                              ensure_ascii=False).encode("utf-8")
+            f.write(text)
+            f.write(meta)
+            entries.append((record["id"].encode("ascii"), offset, len(text), record["token_count"],
+                            offset + len(text), len(meta), len(entries)))
+            offset += len(text) + len(meta)
+
+        by_id = sorted(entries, key=lambda e: e[0])
+        for prev, cur in zip(by_id, by_id[1:]):
+            if prev[0] == cur[0]:
+                raise ChunkStoreError(f"duplicate chunk id {cur[0].decode()}")
+        index_offset = offset
+        slots = [0] * len(entries)
+        for slot, entry in enumerate(by_id):
+            f.write(_ENTRY.pack(*entry[:6]))
+            slots[entry[6]] = slot
+        order_offset = index_offset + _ENTRY.size * len(entries)
+        f.write(b"".join(_SLOT.pack(s) for s in slots))
+        info_offset = order_offset + _SLOT.size * len(entries)
+        info = json.dumps({"encoding": encoding, "built_at": time.time(), "fields": FIELDS}).encode("utf-8")
+        f.write(info)
+
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, len(entries), index_offset, order_offset, info_offset, len(info)))
+    return len(entries)
+
+
+class ChunkStore:
+    """Read-only, memory-mapped view of a ``.chunks`` file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ChunkStoreError(f"{path} is empty")
+        if len(self._mm) < _HEADER.size:
+            self.close()
+            raise ChunkStoreError(f"{path} is truncated")
+        magic, version, count, index_offset, order_offset, info_offset, info_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ChunkStoreError(f"{path} is not a version {VERSION} chunk store")
+        self.count = count
+        self._index_offset = index_offset
+        self._order_offset = order_offset
+        self.info = json.loads(self._mm[info_offset:info_offset + info_len])
+        self._ids = _IdView(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        if getattr(self, "_mm", None) is not None and not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _entry(self, slot: int):
+        return _ENTRY.unpack_from(self._mm, self._index_offset + slot * _ENTRY.size)
+
+    def _slot(self, chunk_id: str) -> int | None:
+        key = chunk_id.encode("ascii", "replace").ljust(ID_WIDTH, b"\0")
+        slot = bisect.bisect_left(self._ids, key)
+        if slot < self.count and self._ids[slot] == key:
+            return slot
+        return None
+
+    def _record(self, slot: int) -> dict:
+        raw_id, text_off, text_len, tokens, meta_off, meta_len = self._entry(slot)
+        record = {
+            "id": raw_id.rstrip(b"\0").decode("ascii"),
+            "text": self._mm[text_off:text_off + text_len].decode("utf-8"),
+            "token_count": tokens,
+        }
+        record.update(json.loads(self._mm[meta_off:meta_off + meta_len]))
+        return record
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return self._slot(chunk_id) is not None
+
+    def get(self, chunk_id: str) -> dict | None:
+        slot = self._slot(chunk_id)
+        return None if slot is None else self._record(slot)
+
+    def get_many(self, chunk_ids) -> list[dict | None]:
+        return [self.get(i) for i in chunk_ids]
+
+    def text(self, chunk_id: str) -> str | None:
+        slot = self._slot(chunk_id)
+        if slot is None:
+            return None
+        _, text_off, text_len, *_ = self._entry(slot)
+        return self._mm[text_off:text_off + text_len].decode("utf-8")
+
+    def ids(self) -> list[str]:
+        return [self._ids[i].rstrip(b"\0").decode("ascii") for i in range(self.count)]
+
+    def __iter__(self):
+        """Records in the order they were written."""
+        for i in range(self.count):
+            (slot,) = _SLOT.unpack_from(self._mm, self._order_offset + i * _SLOT.size)
+            yield self._record(slot)
+
+
+class _IdView:
+    """Sequence over the sorted id column, for ``bisect``."""
+
+    def __init__(self, store: ChunkStore):
+        self._store = store
+
+    def __len__(self) -> int:
+        return self._store.count
+
+    def __getitem__(self, slot: int) -> bytes:
+        offset = self._store._index_offset + slot * _ENTRY.size
+        return self._store._mm[offset:offset + ID_WIDTH]
+
+
+def validate(path: str, expected: list[dict] | None = None) -> list[str]:
+    """Check a store's structure and, optionally, its contents against ``expected``.
+
+    Returns a list of problems; empty means the store is sound.
+    """
+    problems = []
+    try:
+        store = ChunkStore(path)
+    except (ChunkStoreError, OSError) as e:
+        return [str(e)]
+    with store:
+        size = len(store._mm)
+        if store._order_offset + store.count * _SLOT.size > size:
+            return ["index or order table runs past end of file"]
+        previous = b""
+        for slot in range(store.count):
+            raw_id, text_off, text_len, tokens, meta_off, meta_len = store._entry(slot)
+            label = raw_id.rstrip(b"\0").decode("ascii", "replace")
+            if raw_id <= previous:
+                problems.append(f"{label}: index not sorted or duplicate id")
+            previous = raw_id
+            if text_off + text_len > store._index_offset or meta_off + meta_len > store._index_offset:
+                problems.append(f"{label}: offsets out of bounds")
+                continue
+            try:
+                record = store._record(slot)
+            except (UnicodeDecodeError, ValueError) as e:
+                problems.append(f"{label}: unreadable record ({e})")
+                continue
+            if not record["text"].strip():
+                problems.append(f"{label}: empty text")
+            if tokens <= 0:
+                problems.append(f"{label}: missing token count")
+        slots = sorted(_SLOT.unpack_from(store._mm, store._order_offset + i * _SLOT.size)[0]
+                       for i in range(store.count))
+        if slots != list(range(store.count)):
+            problems.append("order table is not a permutation of the index")
+
+        if expected is not None:
+            if len(expected) != store.count:
+                problems.append(f"expected {len(expected)} chunks, store has {store.count}")
+            for record in expected:
+                stored = store.get(record["id"])
+                if stored is None:
+                    problems.append(f"{record['id']}: missing from store")
+                elif stored["text"] != record["text"]:
+                    problems.append(f"{record['id']}: text differs from source")
+    return problems
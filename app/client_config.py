@@ -85,6 +85,7 @@ Question:
         "enable_user_naming": False,
         "enable_memory_summary": False,
         "enable_feedback": True,
+        "faq_enabled": True,  # serve published FAQ answers (scripts/build_faq.py)
         "memory_options": {
         "format_roles": False,
         "filter_bot_only": False,  # or True if you want only his replies summarized
@@ -242,6 +243,7 @@ Question:
         "enable_user_naming": False,
         "enable_memory_summary": True,
         "enable_feedback": True,
+        "faq_enabled": True,  # serve published FAQ answers (scripts/build_faq.py)
         "memory_options": {
         "format_roles": False,
         "filter_bot_only": False,
@@ -0,0 +1,155 @@
+"""Embedding provider selection shared by the chat path and ingestion.
+
+A client's ``embedding_model`` picks the backend:
+
+- ``"local:<model>"`` or ``"sentence-transformers/<model>"`` runs a
+  sentence-transformers model on CPU in this process;
+- anything else is an OpenAI embedding model name.
+
+Local models are loaded once per process and shared. Inference runs in a
+small thread pool so it never blocks the event loop, and concurrent query
+embeddings are coalesced into a single batched ``encode`` call.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+LOCAL_PREFIXES = ("local:", "sentence-transformers/")
+LOCAL_DEVICE = os.getenv("LOCAL_EMBEDDING_DEVICE", "cpu")
+LOCAL_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+# How long a query waits for others to share its encode() call
+LOCAL_BATCH_WINDOW = float(os.getenv("LOCAL_EMBEDDING_BATCH_WINDOW_MS", "2")) / 1000.0
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LOCAL_EMBEDDING_THREADS", "2")),
+    thread_name_prefix="embed",
+)
+_models: dict = {}
+_models_lock = threading.Lock()
+
+
+def is_local_model(name: str | None) -> bool:
+    return bool(name) and name.startswith(LOCAL_PREFIXES)
+
+
+def _local_name(name: str) -> str:
+    return name[len("local:"):] if name.startswith("local:") else name
+
+
+def load_local_model(name: str):
+    """Load (or return the already loaded) sentence-transformers model."""
+    model_name = _local_name(name)
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+
+            model = SentenceTransformer(model_name, device=LOCAL_DEVICE)
+            _models[model_name] = model
+    return model
+
+
+class LocalEmbeddings(Embeddings):
+    """CPU sentence-transformers embeddings with batched, off-loop inference."""
+
+    def __init__(self, model_name: str, batch_size: int = LOCAL_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._flush_handle = None
+
+    @property
+    def dimension(self) -> int:
+        return load_local_model(self.model_name).get_sentence_embedding_dimension()
+
+    def _encode(self, texts: list[str]) -> list[list[float]]:
+        model = load_local_model(self.model_name)
+        vectors = model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._encode(list(texts))
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._encode([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, self._encode, list(texts))
+
+    async def aembed_query(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(LOCAL_BATCH_WINDOW, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        try:
+            vectors = await self.aembed_documents([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+
+_local_providers: dict[str, LocalEmbeddings] = {}
+_openai_providers: dict[tuple, Embeddings] = {}
+
+
+def get_embeddings(config: dict) -> Embeddings:
+    """Return the embedding provider configured for a client."""
+    name = config["embedding_model"]
+    if is_local_model(name):
+        # one shared instance per model so concurrent requests batch together
+        provider = _local_providers.get(name)
+        if provider is None:
+            provider = _local_providers[name] = LocalEmbeddings(name)
+        return provider
+    # shared per (model, key) so its HTTP connection pool survives across requests
+    key = (name, config["openai_api_key"])
+    provider = _openai_providers.get(key)
+    if provider is None:
+        from langchain_openai import OpenAIEmbeddings
+
+        provider = _openai_providers[key] = OpenAIEmbeddings(model=name, openai_api_key=config["openai_api_key"])
+    return provider
+
+
+def warm_up(model_names) -> list[str]:
+    """Load every local model in ``model_names`` and run one encode to warm it.
+
+    Blocking; call it from a thread at startup. Returns the models loaded.
+    """
+    loaded = []
+    for name in sorted({n for n in model_names if is_local_model(n)}):
+        LocalEmbeddings(name).embed_query("warmup")
+        loaded.append(name)
+    return loaded
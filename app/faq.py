@@ -0,0 +1,182 @@
+"""Precomputed answers for a client's most common questions.
+
+``scripts/build_faq.py`` generates answers offline, from a curated question
+list or from clustered chat history. Someone reviews them, and the approved
+set is published to Redis as ``faq:<client>``. Each entry holds an answer,
+its sources and the question phrasings it covers, with their embeddings.
+
+``match`` serves an entry when it is confident the question is the same:
+
+- exact: the normalized question (``singleflight.normalize_question``) equals
+  a phrasing;
+- semantic: cosine similarity to the closest phrasing is at least
+  ``faq_min_score`` (default ``FAQ_MIN_SCORE``).
+
+A hit costs no LLM tokens and needs at most one query embedding, which
+retrieval reuses on a miss. A set is served only while it is current. It
+records the prompt version (system prompt and model) and the corpus version
+(``scripts/embed_upsert.py``) it was built against. A change to either, or to
+the embedding model, marks it stale until it is rebuilt. Sets are cached in
+process and re-read only when their Redis stamp changes.
+"""
+import hashlib
+import math
+import os
+
+from langchain_core.documents import Document
+
+from app import metrics
+from app import singleflight
+from app.logging_utils import get_logger
+from app.redis_utils import get_corpus_version, get_faq_set, get_faq_stamp
+
+logger = get_logger("faq")
+
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.92"))
+
+LOOKUPS = metrics.REGISTRY.register(metrics.Counter(
+    "axios_faq_lookups_total",
+    "FAQ answer lookups by result (exact, semantic, miss, stale).",
+    ("client_id", "result"),
+))
+
+
+_np = False  # numpy, or None when missing; imported on first use to keep it out of startup
+
+
+def _numpy():
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:  # small sets are fine in pure Python
+            numpy = None
+        _np = numpy
+    return _np
+
+
+def prompt_version(config: dict) -> str:
+    """Digest of what shapes an answer besides the corpus: the resolved system prompt and model."""
+    digest = hashlib.sha256()
+    digest.update(config.get("system_prompt", "").encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(config.get("gpt_model", "").encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def unit(vector) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class FaqSet:
+    """A published FAQ set, indexed for lookup."""
+
+    def __init__(self, data: dict):
+        self.stamp = data.get("stamp")
+        self.prompt_version = data.get("prompt_version")
+        self.corpus_version = data.get("corpus_version")
+        self.embedding_model = data.get("embedding_model")
+        self.entries = data.get("entries", [])
+        self.exact: dict[str, int] = {}
+        self.owners: list[int] = []  # entry index for each row of vectors
+        vectors = []
+        for i, entry in enumerate(self.entries):
+            for phrasing in entry.get("questions", []):
+                self.exact.setdefault(singleflight.normalize_question(phrasing["text"]), i)
+                if phrasing.get("vector"):
+                    self.owners.append(i)
+                    vectors.append(unit(phrasing["vector"]))
+        np = _numpy()
+        self.vectors = np.array(vectors, dtype=np.float32) if np is not None and vectors else vectors
+
+    def nearest(self, vector) -> tuple[int | None, float]:
+        """Entry closest to ``vector`` and its cosine similarity."""
+        if not self.owners:
+            return None, 0.0
+        query = unit(vector)
+        if not isinstance(self.vectors, list):  # a numpy matrix
+            scores = self.vectors @ _numpy().asarray(query, dtype=self.vectors.dtype)
+            best = int(scores.argmax())
+            return self.owners[best], float(scores[best])
+        scores = [sum(a * b for a, b in zip(row, query)) for row in self.vectors]
+        best = max(range(len(scores)), key=scores.__getitem__)
+        return self.owners[best], scores[best]
+
+
+_sets: dict[str, FaqSet | None] = {}
+
+
+async def load(client_id: str) -> FaqSet | None:
+    """The client's published set, re-read from Redis only when its stamp changes."""
+    stamp = await get_faq_stamp(client_id)
+    if stamp is None:
+        _sets.pop(client_id, None)
+        return None
+    if isinstance(stamp, bytes):
+        stamp = stamp.decode("utf-8")
+    cached = _sets.get(client_id)
+    if cached is not None and cached.stamp == stamp:
+        return cached
+    data = await get_faq_set(client_id)
+    faq_set = FaqSet(data) if data else None
+    _sets[client_id] = faq_set
+    if faq_set is not None:
+        logger.info(
+            "Loaded FAQ set %s for %s (%d entries)", faq_set.stamp, client_id, len(faq_set.entries),
+            extra={"category": "faq"},
+        )
+    return faq_set
+
+
+async def is_current(faq_set: FaqSet, config: dict) -> bool:
+    if faq_set.prompt_version != prompt_version(config):
+        return False
+    if faq_set.embedding_model != config.get("embedding_model"):
+        return False
+    corpus = await get_corpus_version(config.get("pinecone_index_name", ""))
+    if isinstance(corpus, bytes):
+        corpus = corpus.decode("utf-8")
+    return faq_set.corpus_version == corpus
+
+
+def as_result(entry: dict) -> dict:
+    """An entry in ``get_response`` result shape."""
+    return {
+        "answer": entry["answer"],
+        "source_documents": [
+            Document(page_content=s.get("text", ""), metadata={"source": s.get("source", "unknown")})
+            for s in entry.get("sources", [])
+        ],
+        "token_usage": 0,
+        "cost_estimation": 0.0,
+        "faq": True,
+    }
+
+
+async def match(config: dict, question: str, embed) -> dict | None:
+    """A precomputed answer for ``question``, or None.
+
+    ``embed`` is ``async def embed(text) -> vector``; it is only called when
+    there is no exact match.
+    """
+    client_id = config["client_id"]
+    faq_set = await load(client_id)
+    if faq_set is None:
+        return None
+    if not await is_current(faq_set, config):
+        LOOKUPS.inc(client_id=client_id, result="stale")
+        logger.debug("FAQ set %s for %s is stale", faq_set.stamp, client_id, extra={"category": "faq"})
+        return None
+
+    index = faq_set.exact.get(singleflight.normalize_question(question))
+    result = "exact"
+    if index is None:
+        index, score = faq_set.nearest(await embed(question))
+        if index is None or score < config.get("faq_min_score", FAQ_MIN_SCORE):
+            LOOKUPS.inc(client_id=client_id, result="miss")
+            return None
+        result = "semantic"
+    LOOKUPS.inc(client_id=client_id, result=result)
+    logger.debug("FAQ %s hit for %s", result, client_id, extra={"category": "faq"})
+    return as_result(faq_set.entries[index])
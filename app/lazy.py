@@ -0,0 +1,54 @@
+"""Deferred imports for heavy optional dependencies.
+
+``LazyAttr("langchain_openai", "ChatOpenAI")`` stands in for the class until
+it is first called or one of its attributes is read, and only then imports
+the module. Binding one to a module-level name keeps call sites unchanged, and
+keeps tests that ``monkeypatch`` that name working. The import cost moves from
+worker boot to the first request that needs it (or to ``app/warmup.py``).
+
+Check what a cold import pulls in with ``scripts/import_time.py``.
+"""
+import importlib
+
+
+class LazyAttr:
+    """Proxy for ``module.attr``, imported on first use."""
+
+    __slots__ = ("_module", "_attr", "_target")
+
+    def __init__(self, module: str, attr: str):
+        self._module = module
+        self._attr = attr
+        self._target = None
+
+    def resolve(self):
+        # importlib serializes concurrent imports of one module, so a race
+        # here only repeats the (idempotent) getattr
+        if self._target is None:
+            self._target = getattr(importlib.import_module(self._module), self._attr)
+        return self._target
+
+    @property
+    def loaded(self) -> bool:
+        return self._target is not None
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._target is not None else "not loaded"
+        return f"<LazyAttr {self._module}.{self._attr} ({state})>"
+
+
+def preload(*modules) -> list[str]:
+    """Resolve every ``LazyAttr`` bound at module level in ``modules``."""
+    loaded = []
+    for module in modules:
+        for value in list(vars(module).values()):
+            if isinstance(value, LazyAttr) and not value.loaded:
+                value.resolve()
+                loaded.append(f"{value._module}.{value._attr}")
+    return loaded
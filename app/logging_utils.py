@@ -0,0 +1,151 @@
+"""Structured, queue-backed logging for the request path.
+
+Log calls on the event loop only build a record and push it onto an
+in-memory queue; a ``QueueListener`` thread does the JSON formatting and the
+blocking write to stdout. Every record carries the current ``request_id`` so
+lines from one chat turn can be correlated.
+
+Debug output is grouped into categories (``extra={"category": "memory"}``)
+that can be sampled via ``LOG_SAMPLE_RATES="memory=0.1,redis=0.01"``.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed via ``extra``
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "category"}
+
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: logging.Handler | None = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp the caller's request id onto the record before it leaves the loop."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Drop a fraction of DEBUG records per category; warnings and up always pass."""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self.rates.get(getattr(record, "category", None), 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        category = getattr(record, "category", None)
+        if category:
+            entry["category"] = category
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the stock prepare() formats the message and traceback here, on the
+        # event loop, and clears exc_info; leave all of that to the listener
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def parse_sample_rates(spec: str | None) -> dict[str, float]:
+    """Parse ``"memory=0.1,redis=0.01"`` into ``{"memory": 0.1, "redis": 0.01}``."""
+    rates = {}
+    for part in (spec or "").split(","):
+        name, _, value = part.partition("=")
+        if not name.strip():
+            continue
+        try:
+            rates[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return rates
+
+
+def configure_logging(level: str | None = None, stream=None) -> None:
+    """Route the ``axios`` logger through a queue to a background writer thread.
+
+    Safe to call more than once; later calls are no-ops.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    _queue_handler = _NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(RequestIdFilter())
+    _queue_handler.addFilter(SamplingFilter(parse_sample_rates(os.getenv("LOG_SAMPLE_RATES"))))
+
+    root = logging.getLogger("axios")
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    root.addHandler(_queue_handler)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger("axios").removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a child of the ``axios`` logger, e.g. ``get_logger("chatbot")``."""
+    return logging.getLogger(f"axios.{name}")
+
+
+def prompt_dump_enabled(config: dict | None) -> bool:
+    """Whether full prompt dumps are enabled for this client.
+
+    Off by default; ``/admin/debug-prompts`` turns it on at runtime via the
+    ``debug_prompt:<client>`` key, which ``resolve_config`` copies into
+    ``debug_prompt_dump`` on the request's config.
+    """
+    return bool(config and config.get("debug_prompt_dump", False))
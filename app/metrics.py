@@ -0,0 +1,257 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Counters and histograms are kept in plain dicts keyed by label values so the
+hot path only pays for a lock and a few additions. Per-request labels
+(``client_id`` and ``model``) live in a ``ContextVar`` so deeply nested helpers
+such as the Redis wrapper can attribute work without threading arguments.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_request_labels: ContextVar[dict] = ContextVar("metrics_request_labels", default={})
+_stage_totals: ContextVar[dict | None] = ContextVar("metrics_stage_totals", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., sum, count]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {row[-1]}")
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {row[-2]}")
+            lines.append(f"{self.name}_count{plain} {row[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "axios_stage_duration_seconds",
+    "Time spent in each chat pipeline stage.",
+    ("stage", "client_id", "model"),
+))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "axios_http_request_duration_seconds",
+    "End-to-end HTTP request latency.",
+    ("method", "path", "status"),
+))
+REDIS_COMMANDS = REGISTRY.register(Counter(
+    "axios_redis_commands_total",
+    "Redis round trips issued, pipelines counted once per execute.",
+    ("client_id", "command"),
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "axios_cache_requests_total",
+    "Cache lookups by cache name and result (hit/miss).",
+    ("cache", "result"),
+))
+TOKENS = REGISTRY.register(Counter(
+    "axios_llm_tokens_total",
+    "LLM tokens consumed per client and model.",
+    ("client_id", "model"),
+))
+
+
+def start_request() -> None:
+    """Reset per-request labels and stage totals; call once per request."""
+    _request_labels.set({})
+    _stage_totals.set({})
+
+
+def set_request_labels(**labels) -> None:
+    """Attach labels (client_id, model) to all metrics recorded by this request."""
+    _request_labels.set({**_request_labels.get(), **labels})
+
+
+def current_labels() -> dict:
+    return _request_labels.get()
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    labels = _request_labels.get()
+    STAGE_SECONDS.observe(
+        seconds,
+        stage=stage,
+        client_id=labels.get("client_id", ""),
+        model=labels.get("model", ""),
+    )
+    totals = _stage_totals.get()
+    if totals is not None:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+
+
+def stage_total(stage: str) -> float:
+    """Seconds accumulated in ``stage`` so far during the current request."""
+    totals = _stage_totals.get()
+    return totals.get(stage, 0.0) if totals else 0.0
+
+
+@contextmanager
+def stage(name: str, exclude: str | None = None):
+    """Time the enclosed block as pipeline stage ``name``.
+
+    If ``exclude`` names another stage, time recorded for it inside the block
+    is subtracted so nested stages are not double counted.
+    """
+    start = time.perf_counter()
+    excluded_before = stage_total(exclude) if exclude else 0.0
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if exclude:
+            elapsed -= stage_total(exclude) - excluded_before
+        observe_stage(name, max(elapsed, 0.0))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_tokens(count: int, model: str) -> None:
+    labels = _request_labels.get()
+    TOKENS.inc(count, client_id=labels.get("client_id", ""), model=model)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# --- Redis instrumentation ---
+
+class _InstrumentedPipeline:
+    def __init__(self, pipe):
+        self._pipe = pipe
+
+    def __getattr__(self, name):
+        return getattr(self._pipe, name)
+
+    def execute(self, *args, **kwargs):
+        _count_redis("pipeline")
+        return self._pipe.execute(*args, **kwargs)
+
+
+class InstrumentedRedis:
+    """Proxy around a Redis client that counts round trips per command."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        if name == "pipeline":
+            def wrapper(*args, **kwargs):
+                return _InstrumentedPipeline(attr(*args, **kwargs))
+        else:
+            def wrapper(*args, **kwargs):
+                _count_redis(name)
+                return attr(*args, **kwargs)
+        # cache the wrapper so later lookups skip __getattr__
+        self.__dict__[name] = wrapper
+        return wrapper
+
+
+def _count_redis(command: str) -> None:
+    REDIS_COMMANDS.inc(client_id=_request_labels.get().get("client_id", ""), command=command)
+
+
+def instrument_redis(client):
+    return InstrumentedRedis(client)
@@ -16,43 +16,89 @@ if not hasattr(LCChatHistory, "add_user_message"):
 else:
     ChatMessageHistory = LCChatHistory
     
-from .redis_utils import r, get_session_timeout
+import os
+
+from . import background
+from .redis_pool import r
+from .redis_utils import get_session_timeout
 
 
 def _make_key(client_id: str, chat_id: str) -> str:
     return f"chatmem:{client_id}:{chat_id}"
 
 
-async def save_memory(client_id: str, chat_id: str, chat_history: ChatMessageHistory) -> None:
-    """Persist chat history to Redis as raw strings with expiration."""
+def memory_key(client_id: str, chat_id: str) -> str:
+    """Ordering key for a session's background writes (see app/background.py)."""
+    return _make_key(client_id, chat_id)
+
+
+# LRANGE chunk size when streaming a whole session
+STREAM_BATCH = int(os.getenv("HISTORY_STREAM_BATCH", "200"))
+
+
+def _encode(msg) -> str:
+    if isinstance(msg, AIMessage):
+        role = "ai"
+    elif isinstance(msg, HumanMessage):
+        role = "human"
+    elif isinstance(msg, SystemMessage):
+        role = "system"
+    else:
+        role = msg.type
+    return f"{role}:{msg.content}"
+
+
+def _parse(entry: str) -> tuple[str, str]:
+    if ":" in entry:
+        role, content = entry.split(":", 1)
+        return role, content
+    return "human", entry
+
+
+async def save_memory(client_id: str, chat_id: str, chat_history: ChatMessageHistory, pipe=None) -> None:
+    """Persist chat history to Redis as raw strings with expiration.
+
+    With ``pipe`` the commands are only queued on it; the caller executes.
+    """
     key = _make_key(client_id, chat_id)
     ttl_seconds = int((await get_session_timeout(client_id)).total_seconds())
-    pipe = r.pipeline()
+    own_pipe = pipe is None
+    if own_pipe:
+        pipe = r.pipeline()
     pipe.delete(key)
     for msg in chat_history.messages:
-        if isinstance(msg, AIMessage):
-            role = "ai"
-        elif isinstance(msg, HumanMessage):
-            role = "human"
-        elif isinstance(msg, SystemMessage):
-            role = "system"
-        else:
-            role = msg.type
-        pipe.rpush(key, f"{role}:{msg.content}")
+        pipe.rpush(key, _encode(msg))
+    pipe.expire(key, ttl_seconds)
+    if own_pipe:
+        await pipe.execute()
+
+
+async def append_memory(client_id: str, chat_id: str, messages: list, pipe=None) -> None:
+    """Append ``messages`` to the stored history and refresh its expiry.
+
+    Cheaper than ``save_memory`` when the caller knows the stored list is
+    already up to date (a live session). With ``pipe`` the commands are only
+    queued on it; the caller executes.
+    """
+    key = _make_key(client_id, chat_id)
+    ttl_seconds = int((await get_session_timeout(client_id)).total_seconds())
+    own_pipe = pipe is None
+    if own_pipe:
+        pipe = r.pipeline()
+    pipe.rpush(key, *[_encode(msg) for msg in messages])
     pipe.expire(key, ttl_seconds)
-    await pipe.execute()
+    if own_pipe:
+        await pipe.execute()
 
 
 async def get_memory(client_id: str, chat_id: str) -> ChatMessageHistory:
     """Retrieve chat history from Redis and rebuild ChatMessageHistory."""
     key = _make_key(client_id, chat_id)
+    await background.flush(key)
     entries = await r.lrange(key, 0, -1)
     history = ChatMessageHistory()
     for entry in entries:
-        if ":" in entry:
-            role, content = entry.split(":", 1)
-        else:
-            role, content = "human", entry
+        role, content = _parse(entry)
         if role == "ai":
             history.add_ai_message(content)
         elif role == "human":
@@ -67,4 +113,54 @@ async def get_memory(client_id: str, chat_id: str) -> ChatMessageHistory:
 async def delete_memory(client_id: str, chat_id: str) -> None:
     """Remove chat history from Redis."""
     key = _make_key(client_id, chat_id)
-    await r.delete(key)
\ No newline at end of file
+    await background.flush(key)
+    await r.delete(key)
+
+
+async def get_memory_page(
+    client_id: str, chat_id: str, limit: int | None = None, before: int | None = None
+) -> tuple[list[tuple[int, str, str]], int | None]:
+    """Read a window of ``(id, role, content)`` entries without building messages.
+
+    ``id`` is the entry's position in the session list. The window holds up to
+    ``limit`` entries ending just before ``before`` (or at the newest one), oldest
+    first. Also returns the ``before`` cursor for the next older page, or
+    ``None`` when the window reaches the start.
+    """
+    key = _make_key(client_id, chat_id)
+    await background.flush(key)
+    if before is None and limit is not None:
+        # newest page: the length gives the ids, in the same round trip
+        pipe = r.pipeline()
+        pipe.llen(key)
+        pipe.lrange(key, -limit, -1)
+        total, entries = await pipe.execute()
+        start = max(total - len(entries), 0)
+    elif before is None:
+        start, entries = 0, await r.lrange(key, 0, -1)
+    else:
+        start = 0 if limit is None else max(before - limit, 0)
+        entries = await r.lrange(key, start, before - 1) if before > start else []
+    page = [(start + i, *_parse(entry)) for i, entry in enumerate(entries)]
+    return page, (start or None)
+
+
+async def memory_length(client_id: str, chat_id: str) -> int:
+    """Number of stored entries (the newest id is this minus one)."""
+    key = _make_key(client_id, chat_id)
+    await background.flush(key)
+    return await r.llen(key)
+
+
+async def iter_memory(client_id: str, chat_id: str, batch: int = STREAM_BATCH):
+    """Yield every ``(id, role, content)`` entry, oldest first, ``batch`` at a time."""
+    key = _make_key(client_id, chat_id)
+    await background.flush(key)
+    start = 0
+    while True:
+        entries = await r.lrange(key, start, start + batch - 1)
+        for i, entry in enumerate(entries):
+            yield (start + i, *_parse(entry))
+        if len(entries) < batch:
+            return
+        start += batch
@@ -0,0 +1,207 @@
+"""The one Redis client every module in a worker shares.
+
+``r`` sits on a single bounded pool. Its size, socket timeouts, health checks
+and retry on connection errors are set from the environment. ``ratelimit``,
+``redis_utils`` and ``redis_memory`` all import it, so a worker holds at most
+``REDIS_MAX_CONNECTIONS`` connections. When every connection is busy, callers
+wait up to ``REDIS_POOL_TIMEOUT`` instead of opening more.
+
+With ``REDIS_CLIENT_CACHE=1`` the read-mostly keys (client configs,
+personas, prompt-dump flags, FAQ stamps and corpus versions,
+``CACHED_PREFIXES``) are also kept
+in a small in-process cache. It is kept coherent by Redis server-assisted
+invalidation. One connection subscribes to ``__redis__:invalidate``. A second
+one enables ``CLIENT TRACKING ... BCAST`` for those prefixes, redirected to
+the first. Any write to a tracked key, from any worker, evicts it here. The
+cache only serves hits while both connections are up.
+``REDIS_CLIENT_CACHE_TTL`` bounds staleness if an invalidation is ever missed.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+try:
+    import redis.asyncio as redis
+except Exception:
+    import redis as redis
+try:
+    from redis.asyncio.retry import Retry
+    from redis.backoff import ExponentialBackoff
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+except Exception:
+    Retry = None
+
+from app import metrics
+from app.logging_utils import get_logger
+
+load_dotenv()
+logger = get_logger("redis")
+
+REDIS_URL = os.getenv("REDIS_URL")
+MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))
+HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+RETRIES = int(os.getenv("REDIS_RETRIES", "3"))
+
+CLIENT_CACHE_ENABLED = os.getenv("REDIS_CLIENT_CACHE", "0").lower() in ("1", "true", "yes")
+CLIENT_CACHE_TTL = float(os.getenv("REDIS_CLIENT_CACHE_TTL", "300"))
+CLIENT_CACHE_SIZE = int(os.getenv("REDIS_CLIENT_CACHE_SIZE", "2048"))
+CACHED_PREFIXES = ("client_config:", "persona:", "debug_prompt:", "faq:", "corpus_version:")
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+
+def create_client(url: str | None = REDIS_URL):
+    """Build the shared client; falls back to plain ``from_url`` without redis.asyncio."""
+    kwargs = {
+        "decode_responses": True,
+        "max_connections": MAX_CONNECTIONS,
+        "socket_timeout": SOCKET_TIMEOUT,
+        "socket_connect_timeout": CONNECT_TIMEOUT,
+        "socket_keepalive": True,
+        "health_check_interval": HEALTH_CHECK_INTERVAL,
+    }
+    if Retry is None:
+        return redis.from_url(url, **kwargs)
+    kwargs.update(
+        retry=Retry(ExponentialBackoff(cap=1.0, base=0.05), RETRIES),
+        retry_on_error=[RedisConnectionError, RedisTimeoutError],
+    )
+    pool = redis.BlockingConnectionPool.from_url(url, timeout=POOL_TIMEOUT, **kwargs)
+    return redis.Redis(connection_pool=pool)
+
+
+r = metrics.instrument_redis(create_client())
+
+MISS = object()
+
+
+class ClientCache:
+    """Invalidation-tracked local copy of a few Redis keys.
+
+    Entries are raw values (``None`` for a missing key). ``token()`` taken
+    before a read and passed to ``store()`` afterwards drops the value if an
+    invalidation arrived in between, so a stale read never lands in the cache.
+    """
+
+    def __init__(self, prefixes=CACHED_PREFIXES, ttl: float = CLIENT_CACHE_TTL, max_size: int = CLIENT_CACHE_SIZE):
+        self.prefixes = tuple(prefixes)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.active = False
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._epoch = 0
+
+    def tracks(self, key: str) -> bool:
+        return key.startswith(self.prefixes)
+
+    def token(self) -> int:
+        return self._epoch
+
+    def lookup(self, key: str):
+        if not self.active or not self.tracks(key):
+            return MISS
+        entry = self._entries.get(key)
+        hit = entry is not None and entry[0] > time.monotonic()
+        metrics.record_cache("redis_local", hit)
+        if not hit:
+            return MISS
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def store(self, key: str, value, token: int) -> None:
+        if not self.active or not self.tracks(key) or token != self._epoch:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, keys=None) -> None:
+        """Drop ``keys`` (a key, a list of keys, or ``None`` for everything)."""
+        self._epoch += 1
+        if keys is None:
+            self._entries.clear()
+            return
+        for key in [keys] if isinstance(keys, str) else keys:
+            # scan results are stored under "<prefix>*" and go stale with any key in it
+            self._entries.pop(key, None)
+            for prefix in self.prefixes:
+                if key.startswith(prefix):
+                    self._entries.pop(prefix + "*", None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+client_cache = ClientCache()
+_tracking_task: asyncio.Task | None = None
+
+
+async def _track_invalidations(url: str, cache: ClientCache) -> None:
+    """Keep a tracking subscription open, reconnecting with backoff."""
+    delay = 0.5
+    while True:
+        pool = redis.ConnectionPool.from_url(url, decode_responses=True, socket_connect_timeout=CONNECT_TIMEOUT)
+        listener, tracker = pool.make_connection(), pool.make_connection()
+        try:
+            await listener.connect()
+            await tracker.connect()
+            await listener.send_command("CLIENT", "ID")
+            listener_id = await listener.read_response()
+            await listener.send_command("SUBSCRIBE", INVALIDATE_CHANNEL)
+            await listener.read_response()
+            prefixes = [arg for p in cache.prefixes for arg in ("PREFIX", p)]
+            await tracker.send_command("CLIENT", "TRACKING", "ON", "REDIRECT", listener_id, "BCAST", *prefixes)
+            await tracker.read_response()
+
+            cache.invalidate()
+            cache.active = True
+            delay = 0.5
+            logger.info("Redis client-side caching on", extra={"category": "redis", "prefixes": cache.prefixes})
+            while True:
+                message = await listener.read_response(timeout=HEALTH_CHECK_INTERVAL)
+                if message is None:
+                    # quiet channel: make sure the tracking connection is still alive
+                    await tracker.send_command("PING")
+                    await tracker.read_response()
+                    continue
+                if isinstance(message, list) and len(message) == 3 and message[0] == "message":
+                    cache.invalidate(message[2])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Redis invalidation link lost: %r", e, extra={"category": "redis"})
+        finally:
+            cache.active = False
+            cache.invalidate()
+            await listener.disconnect(nowait=True)
+            await tracker.disconnect(nowait=True)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30.0)
+
+
+async def start_client_cache(url: str | None = REDIS_URL) -> bool:
+    """Start invalidation tracking if ``REDIS_CLIENT_CACHE`` is on."""
+    global _tracking_task
+    if not CLIENT_CACHE_ENABLED or Retry is None or _tracking_task is not None:
+        return False
+    _tracking_task = asyncio.create_task(_track_invalidations(url, client_cache))
+    return True
+
+
+async def close() -> None:
+    """Stop invalidation tracking and close every pooled connection."""
+    global _tracking_task
+    if _tracking_task is not None:
+        _tracking_task.cancel()
+        try:
+            await _tracking_task
+        except asyncio.CancelledError:
+            pass
+        _tracking_task = None
+    await r.close(close_connection_pool=True)
@@ -1,21 +1,31 @@
 import os
-import json
 import time
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import inspect
 import asyncio
 from app.client_config import CLIENT_CONFIG
-
-try:
-    import redis.asyncio as redis
-except Exception:
-    import redis as redis
+from app import metrics
+from app import serialization
+from app.chunk_store import CORPUS_VERSION_KEY, REDIS_TEXT_KEY
+from app.logging_utils import get_logger
+from app.redis_pool import MISS, client_cache, r
 
 load_dotenv()
 
-redis_url = os.getenv("REDIS_URL")
-r = redis.from_url(redis_url, decode_responses=True)
+logger = get_logger("redis")
+
+
+async def _cached_get(key: str):
+    """GET through the client-side cache (a plain GET when it is off)."""
+    cached = client_cache.lookup(key)
+    if cached is not MISS:
+        return cached
+    token = client_cache.token()
+    raw = r.get(key)
+    raw = await raw if inspect.isawaitable(raw) else raw
+    client_cache.store(key, raw, token)
+    return raw
 
 async def get_last_seen(client_id: str, chat_id: str) -> datetime | None:
     raw = await r.get(f"ls:{client_id}:{chat_id}")
@@ -38,76 +48,89 @@ async def get_session_timeout(client_id: str) -> timedelta:
     except (TypeError, ValueError):
         return DEFAULT_SESSION_TIMEOUT
 
-async def set_last_seen(client_id: str, chat_id: str, when: datetime):
+async def set_last_seen(client_id: str, chat_id: str, when: datetime, pipe=None):
     ttl_seconds = int((await get_session_timeout(client_id)).total_seconds())
-    await r.setex(f"ls:{client_id}:{chat_id}", ttl_seconds, when.isoformat())
+    if pipe is not None:
+        pipe.setex(f"ls:{client_id}:{chat_id}", ttl_seconds, when.isoformat())
+    else:
+        await r.setex(f"ls:{client_id}:{chat_id}", ttl_seconds, when.isoformat())
 
 async def get_persona(client_id):
-    raw = await r.get(f"persona:{client_id}")
+    raw = await _cached_get(f"persona:{client_id}")
+    metrics.record_cache("persona", raw is not None)
     if raw is None:
         return None
     try:
-        return json.loads(raw)  # Return dict with prompt/index/style
-    except json.JSONDecodeError:
+        return serialization.loads(raw)  # Return dict with prompt/index/style
+    except serialization.JSONDecodeError:
         return {"prompt": raw}  # Fallback for legacy prompt-only string
 
 async def save_chat_message(client_id, session_id, role, content):
     key = f"chat:{client_id}:{session_id}"
-    entry = json.dumps({"role": role, "content": content})
+    entry = serialization.dumps({"role": role, "content": content})
     await r.rpush(key, entry)
 
 
 async def get_chat_history(client_id, session_id):
     key = f"chat:{client_id}:{session_id}"
     raw_history = await r.lrange(key, 0, -1)
-    return [json.loads(entry) for entry in raw_history]
+    return [serialization.loads(entry) for entry in raw_history]
 
 async def append_to_persona(client_id, additional_text):
     key = f"persona:{client_id}"
     existing = await r.get(key)
     if existing is None:
         updated_prompt = additional_text.strip()
-        await r.set(key, json.dumps({"prompt": updated_prompt}))
+        await r.set(key, serialization.dumps({"prompt": updated_prompt}))
     else:
         try:
-            parsed = json.loads(existing)
+            parsed = serialization.loads(existing)
             if isinstance(parsed, dict) and "prompt" in parsed:
                 parsed["prompt"] = parsed["prompt"].strip() + "\n\n" + additional_text.strip()
-                await r.set(key, json.dumps(parsed))
+                await r.set(key, serialization.dumps(parsed))
             else:
                 # fallback in case existing isn't a proper dict
                 updated = existing.strip() + "\n\n" + additional_text.strip()
-                await r.set(key, json.dumps({"prompt": updated}))
-        except json.JSONDecodeError:
+                await r.set(key, serialization.dumps({"prompt": updated}))
+        except serialization.JSONDecodeError:
             updated = existing.strip() + "\n\n" + additional_text.strip()
-            await r.set(key, json.dumps({"prompt": updated}))
+            await r.set(key, serialization.dumps({"prompt": updated}))
+    client_cache.invalidate(key)
 
-async def increment_token_usage(api_key: str, token_count: int, model: str = "unknown"):
+async def increment_token_usage(api_key: str, token_count: int, model: str = "unknown", pipe=None):
     """
     Tracks token usage for a given API key in Redis.
     Includes daily, monthly, and model-specific usage.
+    With ``pipe`` the commands are only queued on it; the caller executes.
     """
     today = time.strftime("%Y-%m-%d")
     month = time.strftime("%Y-%m")
-    print(f"Incrementing token usage for {api_key}: {token_count} tokens")
-    
 
     # 🔹 Keys we'll update
     total_key = f"token_usage:{api_key}:total"
     daily_key = f"token_usage:{api_key}:daily:{today}"
     monthly_key = f"token_usage:{api_key}:monthly:{month}"
     model_key = f"token_usage:{api_key}:model:{model}"
-    print(f"Updating Redis keys: {total_key}, {daily_key}, {monthly_key}, {model_key}")
+    logger.debug(
+        "Incrementing token usage for %s: %d tokens (model %s)", api_key, token_count, model,
+        extra={"category": "redis"},
+    )
+
+    own_pipe = pipe is None
+    if own_pipe:
+        pipe = r.pipeline()
 
     # 🔹 Increment all counters
-    await r.incrby(total_key, token_count)
-    await r.incrby(daily_key, token_count)
-    await r.incrby(monthly_key, token_count)
-    await r.incrby(model_key, token_count)
+    pipe.incrby(total_key, token_count)
+    pipe.incrby(daily_key, token_count)
+    pipe.incrby(monthly_key, token_count)
+    pipe.incrby(model_key, token_count)
 
     # 🔹 Optionally: set expiry for daily + monthly keys
-    await r.expire(daily_key, 60 * 60 * 24 * 31)
-    await r.expire(monthly_key, 60 * 60 * 24 * 365)
+    pipe.expire(daily_key, 60 * 60 * 24 * 31)
+    pipe.expire(monthly_key, 60 * 60 * 24 * 365)
+    if own_pipe:
+        await pipe.execute()
 
 async def get_token_usage(api_key: str):
     today = time.strftime("%Y-%m-%d")
@@ -121,7 +144,6 @@ async def get_token_usage(api_key: str):
     total = int(await r.get(total_key) or 0)
     daily = int(await r.get(daily_key) or 0)
     monthly = int(await r.get(monthly_key) or 0)
-    print(f"Fetching token usage for {api_key}: {total_key}, {daily_key}, {monthly_key}")
 
     # Fetch per-model usage keys dynamically
     model_prefix = f"token_usage:{api_key}:model:"
@@ -144,44 +166,65 @@ async def set_persona(client_id: str, prompt: str):
     The prompt is stored as JSON under the key persona:{client_id}.
     """
     key = f"persona:{client_id}"
-    await r.set(key, json.dumps({"prompt": prompt.strip()}))
+    await r.set(key, serialization.dumps({"prompt": prompt.strip()}))
+    client_cache.invalidate(key)
 
 async def set_client_config(client_id: str, config: dict):
     key = f"client_config:{client_id}"
-    await r.set(key, json.dumps(config))
+    await r.set(key, serialization.dumps(config))
+    client_cache.invalidate(key)
 
 
 async def get_client_config(client_id: str) -> dict | None:
     """Fetch client config from Redis, falling back to CLIENT_CONFIG."""
     key = f"client_config:{client_id}"
-    raw = r.get(key)
-    raw = await raw if inspect.isawaitable(raw) else raw
+    raw = await _cached_get(key)
+    metrics.record_cache("client_config", raw is not None)
     if raw is None:
-        print(f"[DEBUG] Using fallback config for {client_id}")
+        logger.debug("Using fallback config for %s", client_id, extra={"category": "config"})
         return CLIENT_CONFIG.get(client_id)
     try:
-        cfg = json.loads(raw)
-        print(f"[DEBUG] Loaded {client_id} config from Redis")
+        cfg = serialization.loads(raw)
+        logger.debug("Loaded %s config from Redis", client_id, extra={"category": "config"})
         return cfg
-    except json.JSONDecodeError:
+    except serialization.JSONDecodeError:
         return CLIENT_CONFIG.get(client_id)
 
 
+async def get_debug_prompt(client_id: str) -> bool:
+    """Whether an admin turned on full prompt dumps for this client."""
+    return bool(await _cached_get(f"debug_prompt:{client_id}"))
+
+
+async def set_debug_prompt(client_id: str, enabled: bool) -> None:
+    """Toggle prompt dumps under their own key, leaving the client's config untouched."""
+    key = f"debug_prompt:{client_id}"
+    if enabled:
+        await r.set(key, "1")
+    else:
+        await r.delete(key)
+    client_cache.invalidate(key)
+
+
 async def get_all_client_configs() -> dict:
     """Return combined configs from Redis and fallback file."""
     configs = CLIENT_CONFIG.copy()
-    iterator = r.scan_iter(match="client_config:*")
-    if hasattr(iterator, "__aiter__"):
-        async for key in iterator:
+    keys = client_cache.lookup("client_config:*")
+    if keys is MISS:
+        token = client_cache.token()
+        iterator = r.scan_iter(match="client_config:*")
+        if hasattr(iterator, "__aiter__"):
+            keys = [key async for key in iterator]
+            client_cache.store("client_config:*", keys, token)
+    if keys is not MISS:
+        for key in keys:
             cid = key.split(":", 1)[1]
-            val = r.get(key)
-            val = await val if inspect.isawaitable(val) else val
+            val = await _cached_get(key)
             if not val:
                 continue
             try:
-                configs[cid] = json.loads(val)
-                print(f"[DEBUG] Loaded {cid} config from Redis")
-            except json.JSONDecodeError:
+                configs[cid] = serialization.loads(val)
+            except serialization.JSONDecodeError:
                 pass
     else:
         for key in iterator:
@@ -192,8 +235,8 @@ async def get_all_client_configs() -> dict:
             if not val:
                 continue
             try:
-                configs[cid] = json.loads(val)
-            except json.JSONDecodeError:
+                configs[cid] = serialization.loads(val)
+            except serialization.JSONDecodeError:
                 pass
     return configs
 
@@ -224,7 +267,7 @@ async def record_feedback_vote(
     }
 
     # HSETNX returns 1 if new field created (i.e., first vote by this user)
-    recorded = bool(await r.hsetnx(hash_key, user_id, json.dumps(payload)))
+    recorded = bool(await r.hsetnx(hash_key, user_id, serialization.dumps(payload)))
     if recorded:
         # Optional TTL: expire after 30 days
         await r.expire(hash_key, 60 * 60 * 24 * 30)
@@ -237,8 +280,12 @@ async def append_feedback_event(
     vote: str,
     *,
     reason: str | None = None,
+    pipe=None,
 ) -> None:
-    """Append a feedback event to a namespaced Redis stream for analytics."""
+    """Append a feedback event to a namespaced Redis stream for analytics.
+
+    With ``pipe`` the XADD is only queued on it; the caller executes.
+    """
     stream_key = f"feedback_stream:{client_id}"
     event = {
         "message_id": message_id,
@@ -248,7 +295,10 @@ async def append_feedback_event(
         "timestamp": datetime.utcnow().isoformat(),
     }
     # maxlen ensures the stream doesn’t grow unbounded
-    await r.xadd(stream_key, event, maxlen=100_000, approximate=True)
+    if pipe is not None:
+        pipe.xadd(stream_key, event, maxlen=100_000, approximate=True)
+    else:
+        await r.xadd(stream_key, event, maxlen=100_000, approximate=True)
 
     
 
@@ -274,11 +324,82 @@ async def store_vote(
         "reasons": reasons or [],
         "timestamp": datetime.utcnow().isoformat(),
     }
-    await r.hset(key, message_id, json.dumps(payload))
+    await r.hset(key, message_id, serialization.dumps(payload))
 
 
 async def append_event(client_id: str, event: dict) -> None:
     """Append an arbitrary event for a client to Redis."""
     key = f"events:{client_id}"
     event = {"timestamp": datetime.utcnow().isoformat(), **event}
-    await r.rpush(key, json.dumps(event))
\ No newline at end of file
+    await r.rpush(key, serialization.dumps(event))
+
+async def get_chunk_texts(index_name: str, chunk_ids: list[str]) -> dict[str, str]:
+    """Fetch chunk texts for vectors upserted with slim metadata (one MGET)."""
+    if not chunk_ids:
+        return {}
+    values = await r.mget(*[REDIS_TEXT_KEY.format(index=index_name, id=i) for i in chunk_ids])
+    found = {i: v for i, v in zip(chunk_ids, values) if v is not None}
+    metrics.record_cache("chunk_text", len(found) == len(chunk_ids))
+    return found
+
+
+# --- request coalescing (see app/singleflight.py) ---
+
+def _flight_keys(key: str) -> tuple[str, str]:
+    return f"sf:lock:{key}", f"sf:result:{key}"
+
+
+async def acquire_flight(key: str, ttl_ms: int) -> bool:
+    """Claim leadership of a coalesced request across workers (SET NX PX)."""
+    lock_key, _ = _flight_keys(key)
+    return bool(await r.set(lock_key, "1", px=ttl_ms, nx=True))
+
+
+async def finish_flight(key: str, payload: str | None, result_ttl: int, release: bool = True) -> None:
+    """Publish the leader's result for waiting workers and drop the lock, in one round trip."""
+    lock_key, result_key = _flight_keys(key)
+    pipe = r.pipeline()
+    if payload is not None:
+        pipe.set(result_key, payload, ex=result_ttl)
+    if release:
+        pipe.delete(lock_key)
+    await pipe.execute()
+
+
+async def poll_flight(key: str) -> tuple[str | None, bool]:
+    """Return ``(result, still_locked)`` for a flight led by another worker."""
+    lock_key, result_key = _flight_keys(key)
+    result, lock = await r.mget(result_key, lock_key)
+    return result, lock is not None
+
+
+# --- precomputed FAQ answers (see app/faq.py) ---
+
+async def get_corpus_version(index_name: str) -> str | None:
+    """Version of the ingested corpus for an index (set by scripts/embed_upsert.py)."""
+    return await _cached_get(CORPUS_VERSION_KEY.format(index=index_name))
+
+
+async def get_faq_stamp(client_id: str) -> str | None:
+    """Build id of the client's published FAQ set; changes on every publish."""
+    return await _cached_get(f"faq:{client_id}:stamp")
+
+
+async def get_faq_set(client_id: str) -> dict | None:
+    raw = await r.get(f"faq:{client_id}")
+    if raw is None:
+        return None
+    try:
+        return serialization.loads(raw)
+    except serialization.JSONDecodeError:
+        logger.warning("Unreadable FAQ set for %s", client_id, extra={"category": "faq"})
+        return None
+
+
+async def save_faq_set(client_id: str, faq_set: dict) -> None:
+    """Publish a FAQ set and its stamp together, so readers never see one without the other."""
+    pipe = r.pipeline()
+    pipe.set(f"faq:{client_id}", serialization.dumps(faq_set))
+    pipe.set(f"faq:{client_id}:stamp", faq_set["stamp"])
+    await pipe.execute()
+    client_cache.invalidate(f"faq:{client_id}:stamp")
@@ -0,0 +1,98 @@
+"""Retriever for indexes whose vectors carry ids and filter fields but no text.
+
+With ``slim_metadata`` enabled for a client, ``embed_upsert.py
+--slim-metadata`` leaves chunk text out of Pinecone metadata. Query
+responses then carry only ids, scores and small fields, and this retriever
+hydrates the text for all matches in one batched lookup. It reads the local
+memory-mapped chunk store (``chunk_store_path``) first and falls back to a
+single Redis ``MGET`` for anything the store lacks.
+"""
+import asyncio
+import threading
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from app import metrics
+from app.chunk_store import ChunkStore
+from app.logging_utils import get_logger
+from app.redis_utils import get_chunk_texts
+
+logger = get_logger("retrieval")
+
+_stores: dict[str, ChunkStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_chunk_store(path: str) -> ChunkStore:
+    """Return a process-wide shared mapping of the store at ``path``."""
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(path)
+            if store is None:
+                store = _stores[path] = ChunkStore(path)
+    return store
+
+
+class HydratingRetriever(BaseRetriever):
+    """Pinecone similarity search whose document text is looked up by id."""
+
+    index: object
+    embeddings: Embeddings
+    index_name: str
+    k: int = 3
+    chunk_store_path: str | None = None
+    namespace: str | None = None
+
+    def _query(self, vector: list[float]) -> list[dict]:
+        kwargs = {"vector": vector, "top_k": self.k, "include_metadata": True}
+        if self.namespace:
+            kwargs["namespace"] = self.namespace
+        return self.index.query(**kwargs)["matches"]
+
+    def _local_texts(self, ids: list[str]) -> dict[str, str]:
+        if not self.chunk_store_path:
+            return {}
+        store = open_chunk_store(self.chunk_store_path)
+        texts = {}
+        for chunk_id in ids:
+            text = store.text(chunk_id)
+            if text is not None:
+                texts[chunk_id] = text
+        metrics.record_cache("chunk_store", len(texts) == len(ids))
+        return texts
+
+    @staticmethod
+    def _documents(matches: list[dict], texts: dict[str, str]) -> list[Document]:
+        docs = []
+        for match in matches:
+            text = texts.get(match["id"])
+            if text is None:
+                logger.warning("No text for chunk %s", match["id"], extra={"category": "retrieval"})
+                continue
+            metadata = dict(match.get("metadata") or {})
+            metadata.update(id=match["id"], score=match.get("score"))
+            docs.append(Document(page_content=text, metadata=metadata))
+        return docs
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        # the Redis client is async-only, so sync callers hydrate from the local store
+        matches = self._query(self.embeddings.embed_query(query))
+        return self._documents(matches, self._local_texts([m["id"] for m in matches]))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        vector = await self.embeddings.aembed_query(query)
+        matches = await asyncio.to_thread(self._query, vector)
+        ids = [m["id"] for m in matches]
+        texts = self._local_texts(ids)
+        missing = [i for i in ids if i not in texts]
+        if missing:
+            texts.update(await get_chunk_texts(self.index_name, missing))
+        return self._documents(matches, texts)
@@ -0,0 +1,204 @@
+"""Weighted fair-share admission control for upstream OpenAI calls.
+
+Every LLM and embedding call takes a slot from a ``FairScheduler`` before it
+goes out. Each pool has a global concurrency cap, and each client has its own
+cap, weight and queue bound, read from ``client_config``:
+
+- ``scheduler_weight``: share of contended capacity (default 1)
+- ``max_concurrency``: in-flight LLM calls for this client
+- ``max_embedding_concurrency``: in-flight embedding calls for this client
+- ``max_queue``: calls allowed to wait per client and pool
+
+When capacity frees up, the next waiter comes from the client with the lowest
+virtual time (calls served divided by weight). A burst from one tenant
+therefore queues behind its own cap and cannot starve the others. A full
+queue rejects at once with ``Overloaded``, and so does a wait longer than
+``SCHEDULER_QUEUE_TIMEOUT``. The API turns that into a 503 with
+``Retry-After``.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from app import metrics
+
+GLOBAL_LLM_CONCURRENCY = int(os.getenv("LLM_GLOBAL_CONCURRENCY", "32"))
+GLOBAL_EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_GLOBAL_CONCURRENCY", "64"))
+GLOBAL_QUEUE = int(os.getenv("SCHEDULER_GLOBAL_QUEUE", "256"))
+QUEUE_TIMEOUT = float(os.getenv("SCHEDULER_QUEUE_TIMEOUT", "10"))
+DEFAULT_CLIENT_CONCURRENCY = int(os.getenv("SCHEDULER_CLIENT_CONCURRENCY", "8"))
+DEFAULT_CLIENT_QUEUE = int(os.getenv("SCHEDULER_CLIENT_QUEUE", "32"))
+
+QUEUE_DEPTH = metrics.REGISTRY.register(metrics.Gauge(
+    "axios_scheduler_queue_depth",
+    "Upstream calls waiting for a slot, per pool and client.",
+    ("pool", "client_id"),
+))
+IN_FLIGHT = metrics.REGISTRY.register(metrics.Gauge(
+    "axios_scheduler_in_flight",
+    "Upstream calls holding a slot, per pool and client.",
+    ("pool", "client_id"),
+))
+WAIT_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    "axios_scheduler_wait_seconds",
+    "Time upstream calls spent queued before getting a slot.",
+    ("pool", "client_id"),
+))
+REJECTED = metrics.REGISTRY.register(metrics.Counter(
+    "axios_scheduler_rejected_total",
+    "Upstream calls refused by admission control.",
+    ("pool", "client_id", "reason"),
+))
+
+
+class Overloaded(Exception):
+    """A client's (or the global) queue is saturated; retry after ``retry_after`` seconds."""
+
+    def __init__(self, pool: str, client_id: str, reason: str, retry_after: int):
+        super().__init__(f"{pool} capacity exhausted for {client_id} ({reason})")
+        self.pool = pool
+        self.client_id = client_id
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ClientQueue:
+    __slots__ = ("weight", "limit", "max_queue", "active", "waiters", "vtime")
+
+    def __init__(self):
+        self.weight = 1.0
+        self.limit = DEFAULT_CLIENT_CONCURRENCY
+        self.max_queue = DEFAULT_CLIENT_QUEUE
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.vtime = 0.0
+
+
+class FairScheduler:
+    def __init__(self, name: str, global_limit: int, limit_key: str,
+                 global_queue: int = GLOBAL_QUEUE, queue_timeout: float = QUEUE_TIMEOUT):
+        self.name = name
+        self.global_limit = global_limit
+        self.global_queue = global_queue
+        self.queue_timeout = queue_timeout
+        self.limit_key = limit_key
+        self.active = 0
+        self.waiting = 0
+        self._clients: dict[str, _ClientQueue] = {}
+        self._vclock = 0.0
+        self._service_time = 1.0  # moving average of slot hold time, for Retry-After
+
+    def _queue(self, client_id: str, config: dict | None) -> _ClientQueue:
+        q = self._clients.get(client_id)
+        if q is None:
+            q = self._clients[client_id] = _ClientQueue()
+        if config:
+            q.weight = max(float(config.get("scheduler_weight", 1.0)), 0.01)
+            q.limit = max(int(config.get(self.limit_key, DEFAULT_CLIENT_CONCURRENCY)), 1)
+            q.max_queue = max(int(config.get("max_queue", DEFAULT_CLIENT_QUEUE)), 0)
+        return q
+
+    def _retry_after(self, q: _ClientQueue) -> int:
+        return max(1, math.ceil((len(q.waiters) + 1) * self._service_time / q.limit))
+
+    def check(self, client_id: str, config: dict | None = None) -> None:
+        """Raise ``Overloaded`` now if a new call for this client could not even queue."""
+        q = self._queue(client_id, config)
+        if q.active < q.limit and self.active < self.global_limit and not q.waiters:
+            return
+        reason = None
+        if len(q.waiters) >= q.max_queue:
+            reason = "client_queue_full"
+        elif self.waiting >= self.global_queue:
+            reason = "global_queue_full"
+        if reason:
+            REJECTED.inc(pool=self.name, client_id=client_id, reason=reason)
+            raise Overloaded(self.name, client_id, reason, self._retry_after(q))
+
+    @asynccontextmanager
+    async def slot(self, client_id: str, config: dict | None = None):
+        """Hold one upstream slot for ``client_id`` for the duration of the block."""
+        q = self._queue(client_id, config)
+        start = time.perf_counter()
+        if q.active < q.limit and self.active < self.global_limit and not q.waiters:
+            self._grant(client_id, q)
+        else:
+            self.check(client_id, config)
+            await self._wait(client_id, q)
+        WAIT_SECONDS.observe(time.perf_counter() - start, pool=self.name, client_id=client_id)
+        held = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._service_time = 0.9 * self._service_time + 0.1 * (time.perf_counter() - held)
+            self._release(client_id, q)
+
+    async def _wait(self, client_id: str, q: _ClientQueue) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        q.waiters.append(fut)
+        self.waiting += 1
+        self._gauges(client_id, q)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(client_id, q, fut)
+            if fut.done() and not fut.cancelled():
+                return  # granted just as the timer fired
+            REJECTED.inc(pool=self.name, client_id=client_id, reason="queue_timeout")
+            raise Overloaded(self.name, client_id, "queue_timeout", self._retry_after(q))
+        except asyncio.CancelledError:
+            self._abandon(client_id, q, fut)
+            if fut.done() and not fut.cancelled():
+                self._release(client_id, q)
+            raise
+
+    def _abandon(self, client_id: str, q: _ClientQueue, fut: asyncio.Future) -> None:
+        if fut in q.waiters:
+            q.waiters.remove(fut)
+            self.waiting -= 1
+            fut.cancel()
+            self._gauges(client_id, q)
+
+    def _grant(self, client_id: str, q: _ClientQueue) -> None:
+        # an idle client rejoins at the current virtual time instead of cashing in old credit
+        q.vtime = max(q.vtime, self._vclock) + 1.0 / q.weight
+        q.active += 1
+        self.active += 1
+        self._gauges(client_id, q)
+
+    def _release(self, client_id: str, q: _ClientQueue) -> None:
+        q.active -= 1
+        self.active -= 1
+        self._gauges(client_id, q)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.active < self.global_limit:
+            eligible = [(q.vtime, cid, q) for cid, q in self._clients.items() if q.waiters and q.active < q.limit]
+            if not eligible:
+                return
+            vtime, client_id, q = min(eligible, key=lambda e: e[0])
+            fut = q.waiters.popleft()
+            self.waiting -= 1
+            self._vclock = vtime
+            self._grant(client_id, q)
+            fut.set_result(None)
+
+    def _gauges(self, client_id: str, q: _ClientQueue) -> None:
+        QUEUE_DEPTH.set(len(q.waiters), pool=self.name, client_id=client_id)
+        IN_FLIGHT.set(q.active, pool=self.name, client_id=client_id)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "clients": {cid: {"active": q.active, "waiting": len(q.waiters), "weight": q.weight}
+                        for cid, q in self._clients.items() if q.active or q.waiters},
+        }
+
+
+llm = FairScheduler("llm", GLOBAL_LLM_CONCURRENCY, "max_concurrency")
+embedding = FairScheduler("embedding", GLOBAL_EMBEDDING_CONCURRENCY, "max_embedding_concurrency")
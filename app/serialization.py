@@ -0,0 +1,48 @@
+"""JSON encoding for API responses and Redis-stored values.
+
+Uses orjson when it is installed. It encodes straight to compact UTF-8 bytes
+and handles datetimes and dataclasses natively, so responses can skip
+FastAPI's ``jsonable_encoder`` walk. Without orjson it falls back to the
+stdlib encoder with the same compact output. ``loads`` accepts ``str`` or
+``bytes``. Decode failures raise ``JSONDecodeError``, which is the stdlib
+class that ``orjson.JSONDecodeError`` subclasses, so existing ``except``
+clauses keep working.
+"""
+import json
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError
+
+
+def _default(obj):
+    if hasattr(obj, "model_dump"):  # pydantic models
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumpb(obj) -> bytes:
+        return orjson.dumps(obj, default=_default)
+
+    def loads(raw):
+        return orjson.loads(raw)
+else:
+    def dumpb(obj) -> bytes:
+        return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def loads(raw):
+        return json.loads(raw)
+
+
+def dumps(obj) -> str:
+    """Encode ``obj`` as a compact JSON string (for Redis values)."""
+    return dumpb(obj).decode("utf-8")
@@ -0,0 +1,158 @@
+"""Coalesce identical concurrent chat requests into one upstream call.
+
+When a bulletin goes out, many people ask the same question within seconds.
+Requests with the same ``flight_key`` share one retrieval and generation. The
+key covers client, config version, normalized question and history
+fingerprint. In this process, followers await the leader's task. Across
+workers, the first request to claim a short Redis lock leads. The others poll
+for the result it publishes, and run the work themselves if the leader
+vanishes or takes longer than ``WAIT_TIMEOUT``.
+
+Only the leader spends tokens; followers get a copy of its result with zero
+token usage and ``coalesced`` set. Redis trouble never fails a request: the
+flight just runs locally.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+
+from app import metrics
+from app.logging_utils import get_logger
+from app.redis_utils import acquire_flight, finish_flight, poll_flight
+
+logger = get_logger("singleflight")
+
+ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1").lower() in ("1", "true", "yes")
+CROSS_WORKER = os.getenv("SINGLEFLIGHT_REDIS", "1").lower() in ("1", "true", "yes")
+# The lock only has to outlive one generation; the result only has to reach the followers
+LOCK_TTL_MS = int(os.getenv("SINGLEFLIGHT_LOCK_TTL_MS", "30000"))
+RESULT_TTL = int(os.getenv("SINGLEFLIGHT_RESULT_TTL", "10"))
+WAIT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", "30"))
+POLL_MIN, POLL_MAX = 0.05, 0.25
+
+COALESCED = metrics.REGISTRY.register(metrics.Counter(
+    "axios_coalesced_requests_total",
+    "Chat requests by singleflight role (leader, local follower, remote follower).",
+    ("client_id", "role"),
+))
+
+_flights: dict[str, asyncio.Task] = {}
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def enabled(config: dict) -> bool:
+    return ENABLED and config.get("coalesce_requests", True)
+
+
+def normalize_question(question: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a question."""
+    return " ".join(_PUNCTUATION.sub(" ", question.lower()).split())
+
+
+def history_fingerprint(messages) -> str:
+    """Empty string for no history, else a digest of the (type, content) turns."""
+    if not messages:
+        return ""
+    digest = hashlib.sha256()
+    for m in messages:
+        digest.update(f"{getattr(m, 'type', '')}\0{getattr(m, 'content', m)}\0".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def config_version(config: dict) -> str:
+    raw = json.dumps(config, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def flight_key(client_id: str, config: dict, question: str, messages=(), **extra) -> str:
+    parts = [config_version(config), normalize_question(question), history_fingerprint(messages),
+             json.dumps(extra, sort_keys=True, default=str)]
+    return f"{client_id}:{hashlib.sha256(chr(0).join(parts).encode('utf-8')).hexdigest()[:32]}"
+
+
+def _as_follower(result: dict) -> dict:
+    return {**result, "token_usage": 0, "cost_estimation": 0.0, "coalesced": True}
+
+
+async def do(key: str, fn, encode=None, decode=None, client_id: str = "") -> dict:
+    """Run ``fn()`` once for every concurrent caller with the same ``key``.
+
+    ``encode``/``decode`` turn the result into a string and back, for sharing
+    it with other workers; without them coalescing stays in-process.
+    """
+    task = _flights.get(key)
+    if task is not None:
+        COALESCED.inc(client_id=client_id, role="local_follower")
+        result, _ = await asyncio.shield(task)
+        return _as_follower(result)
+
+    cross_worker = CROSS_WORKER and encode is not None and decode is not None
+    task = asyncio.create_task(_lead(key, fn, encode, decode, cross_worker, client_id))
+    _flights[key] = task
+    task.add_done_callback(lambda _: _flights.pop(key, None) if _flights.get(key) is task else None)
+    # shielded: one caller disconnecting must not cancel the work the others wait on
+    result, shared = await asyncio.shield(task)
+    return _as_follower(result) if shared else result
+
+
+async def _lead(key, fn, encode, decode, cross_worker, client_id) -> tuple[dict, bool]:
+    """Returns the result and whether it came from another worker."""
+    if not cross_worker:
+        COALESCED.inc(client_id=client_id, role="leader")
+        return await fn(), False
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            leader = await acquire_flight(key, LOCK_TTL_MS)
+        except Exception as e:
+            logger.debug("Singleflight lock unavailable: %r", e, extra={"category": "singleflight"})
+            break
+        if leader:
+            return await _run_as_leader(key, fn, encode, client_id), False
+        payload = await _wait_for_result(key, deadline)
+        if payload is not None:
+            COALESCED.inc(client_id=client_id, role="remote_follower")
+            return decode(payload), True
+        # the other leader gave up without a result: try to lead instead
+    COALESCED.inc(client_id=client_id, role="leader")
+    return await fn(), False
+
+
+async def _wait_for_result(key: str, deadline: float) -> str | None:
+    """Poll another worker's flight; ``None`` once its lock is gone or time is up."""
+    delay = POLL_MIN
+    while time.monotonic() < deadline:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, POLL_MAX)
+        try:
+            payload, locked = await poll_flight(key)
+        except Exception:
+            return None
+        if payload is not None or not locked:
+            return payload
+    logger.info("Singleflight wait timed out for %s", key, extra={"category": "singleflight"})
+    return None
+
+
+async def _run_as_leader(key, fn, encode, client_id) -> dict:
+    COALESCED.inc(client_id=client_id, role="leader")
+    started = time.monotonic()
+    payload = None
+    try:
+        result = await fn()
+        try:
+            payload = encode(result)
+        except Exception as e:
+            logger.warning("Could not encode singleflight result: %r", e, extra={"category": "singleflight"})
+        return result
+    finally:
+        # past the lock TTL another worker may hold the lock now; leave it alone
+        still_ours = (time.monotonic() - started) * 1000 < LOCK_TTL_MS - 1000
+        try:
+            await finish_flight(key, payload, RESULT_TTL, release=still_ours)
+        except Exception as e:
+            logger.debug("Could not publish singleflight result: %r", e, extra={"category": "singleflight"})
@@ -0,0 +1,162 @@
+"""Startup warmup and readiness state.
+
+``run_warmup`` does the work a cold worker would otherwise do on its first
+requests. It opens Redis connections, imports the SDKs ``app.chatbot``
+defers (see ``app/lazy.py``) and preloads every client config and persona.
+It builds each tenant's Pinecone index handle and embedding client, loads
+tiktoken encodings and local embedding models, and optionally runs one
+synthetic retrieval per tenant (``WARMUP_QUERY``). ``/ready`` reports 503
+until it has finished; ``/live`` only says the process is up.
+
+Redis is required: warmup retries it until it answers. Every other step is
+best effort. A failure is recorded in ``state.steps`` and logged, but does
+not keep the worker out of rotation.
+"""
+import asyncio
+import os
+import time
+
+from app import chatbot
+from app import lazy
+from app.embeddings import get_embeddings, warm_up as warm_up_local_models
+from app.logging_utils import get_logger
+from app.redis_utils import get_all_client_configs, get_persona, r
+
+logger = get_logger("warmup")
+
+REDIS_CONNECTIONS = int(os.getenv("WARMUP_REDIS_CONNECTIONS", "4"))
+REDIS_RETRY_SECONDS = float(os.getenv("WARMUP_REDIS_RETRY_SECONDS", "2"))
+STEP_TIMEOUT = float(os.getenv("WARMUP_STEP_TIMEOUT", "30"))
+# Optional question retrieved once per tenant (embedding + vector query, no LLM call)
+SYNTHETIC_QUERY = os.getenv("WARMUP_QUERY")
+DEFAULT_ENCODING = "cl100k_base"
+
+
+class WarmupState:
+    def __init__(self):
+        self.ready = False
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.steps: dict[str, dict] = {}
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warmup_seconds": (
+                round(self.finished_at - self.started_at, 3)
+                if self.started_at and self.finished_at else None
+            ),
+            "steps": self.steps,
+        }
+
+
+state = WarmupState()
+
+
+_FAILED = object()
+
+
+async def _step(name: str, coro, describe=None):
+    """Run one warmup step, recording its outcome; returns ``_FAILED`` on error."""
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(coro, STEP_TIMEOUT)
+    except Exception as e:
+        state.steps[name] = {"status": "failed", "seconds": round(time.perf_counter() - start, 3), "error": repr(e)}
+        logger.warning("Warmup step %s failed: %r", name, e, extra={"category": "warmup"})
+        return _FAILED
+    state.steps[name] = {
+        "status": "ok",
+        "seconds": round(time.perf_counter() - start, 3),
+        **(describe(result) if describe else result if isinstance(result, dict) else {}),
+    }
+    return result
+
+
+async def connect_redis() -> dict:
+    # concurrent pings make the pool open several connections, not one
+    await asyncio.gather(*(r.ping() for _ in range(REDIS_CONNECTIONS)))
+    return {"connections": REDIS_CONNECTIONS}
+
+
+async def load_configs() -> tuple[dict, int]:
+    """Every client config, plus how many personas were found."""
+    configs = await get_all_client_configs()
+    personas = await asyncio.gather(*(get_persona(cid) for cid in configs))
+    return configs, sum(1 for p in personas if p)
+
+
+async def init_tenant_clients(configs: dict) -> dict:
+    built = []
+    for client_id, config in configs.items():
+        if not config or not config.get("pinecone_index_name"):
+            continue
+        try:
+            get_embeddings(config)
+            await asyncio.to_thread(chatbot.get_pinecone_index, config)
+            built.append(client_id)
+        except Exception as e:
+            logger.warning("Could not initialize clients for %s: %r", client_id, e, extra={"category": "warmup"})
+    return {"tenants": built}
+
+
+def load_encodings(configs: dict) -> dict:
+    import tiktoken
+
+    names = {DEFAULT_ENCODING}
+    tiktoken.get_encoding(DEFAULT_ENCODING)
+    for config in configs.values():
+        model = (config or {}).get("gpt_model")
+        if not model:
+            continue
+        try:
+            names.add(tiktoken.encoding_for_model(model).name)
+        except KeyError:
+            pass
+    return {"encodings": sorted(names)}
+
+
+async def synthetic_queries(configs: dict, question: str) -> dict:
+    async def one(client_id, config):
+        _, retriever = chatbot.get_qa_chain(
+            {**config, "client_id": client_id, "system_prompt": "{context}\n{question}"},
+            chatbot.ChatMessageHistory(),
+        )
+        await retriever.ainvoke(question)
+
+    tenants = [(cid, cfg) for cid, cfg in configs.items() if cfg and cfg.get("pinecone_index_name")]
+    results = await asyncio.gather(*(one(cid, cfg) for cid, cfg in tenants), return_exceptions=True)
+    failed = {cid: repr(res) for (cid, _), res in zip(tenants, results) if isinstance(res, Exception)}
+    return {"queried": len(tenants) - len(failed), "failed": failed}
+
+
+async def run_warmup(query: str | None = SYNTHETIC_QUERY) -> WarmupState:
+    """Warm this worker, then mark it ready."""
+    state.ready = False
+    state.started_at = time.perf_counter()
+    while await _step("redis", connect_redis()) is _FAILED:
+        await asyncio.sleep(REDIS_RETRY_SECONDS)
+
+    await _step("imports", asyncio.to_thread(lazy.preload, chatbot), describe=lambda names: {"modules": names})
+    loaded = await _step(
+        "configs", load_configs(), describe=lambda res: {"clients": len(res[0]), "personas": res[1]},
+    )
+    configs = {} if loaded is _FAILED else loaded[0]
+
+    models = {cfg.get("embedding_model") for cfg in configs.values() if cfg}
+    await asyncio.gather(
+        _step("tenant_clients", init_tenant_clients(configs)),
+        _step("encodings", asyncio.to_thread(load_encodings, configs)),
+        _step("local_embeddings", _local_models(models)),
+    )
+    if query:
+        await _step("synthetic_queries", synthetic_queries(configs, query))
+
+    state.finished_at = time.perf_counter()
+    state.ready = True
+    logger.info("Warmup finished", extra={"category": "warmup", **state.as_dict()})
+    return state
+
+
+async def _local_models(models: set) -> dict:
+    return {"models": await asyncio.to_thread(warm_up_local_models, models)}
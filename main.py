@@ -1,5 +1,8 @@
 import os
-import logging
+import time
+import asyncio
+import uuid
+from functools import partial
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,23 +16,25 @@ from fastapi import (
     status,
     Request,
     APIRouter,
+    WebSocket,
+    WebSocketDisconnect,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi import Query
 from app.redis_utils import r
 from datetime import datetime, timedelta
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from app.redis_utils import increment_token_usage
 from typing import Literal
 import httpx  # For proxy requests
-from app.redis_memory import delete_memory
+from app.redis_memory import delete_memory, get_memory_page, iter_memory, memory_length
 from app.redis_utils import get_last_seen, set_last_seen
-from app.chatbot import get_response
-from app.chatbot import get_memory, save_redis_memory, is_memory_enabled
+from app.chatbot import get_batch_responses, get_response
+from app.chatbot import get_memory, append_redis_memory_later, is_memory_enabled
 from langchain_community.chat_message_histories.in_memory import ChatMessageHistory
 from app.redis_utils import (
+    set_debug_prompt,
     get_persona,
     save_chat_message,
     get_token_usage,
@@ -38,6 +43,20 @@ from app.redis_utils import (
     record_feedback_vote,
     append_feedback_event,
 )
+from app import metrics
+from app import serialization
+from app import background
+from app.chat_session import ChatSession
+from app import redis_pool
+from app import scheduler
+from app.scheduler import Overloaded
+from app import warmup
+from app.logging_utils import (
+    configure_logging,
+    shutdown_logging,
+    get_logger,
+    request_id_var,
+)
 from recaptcha import verify_recaptcha  # Your recaptcha verification function
 from ratelimit import check_rate_limit, track_usage
 from slowapi import Limiter
@@ -46,6 +65,15 @@ from slowapi.middleware import SlowAPIMiddleware
 
 ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
 
+configure_logging()
+logger = get_logger("api")
+# Optional bearer token for scraping /metrics; unset means open (bind privately)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+# Largest /history page a caller may request
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", "200"))
+# Most questions one /chat/batch request may carry
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "200"))
+
 
 # Retrieve client configuration from Redis with fallback
 async def get_client_by_api_key(api_key: str):
@@ -56,8 +84,15 @@ async def get_client_by_api_key(api_key: str):
     return None, None
 
 
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (see app/serialization.py)."""
+
+    def render(self, content) -> bytes:
+        return serialization.dumpb(content)
+
+
 # FastAPI app instance
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Allowed frontend origins (adjust as needed)
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "").split(",")
@@ -76,6 +111,29 @@ app.state.limiter = limiter
 app.add_middleware(SlowAPIMiddleware)
 
 
+# Per-request latency histogram and request-id correlation for logs
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    metrics.start_request()
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            path=getattr(route, "path", "unmatched"),
+            status=str(status_code),
+        )
+
+
 # Ensure a provided client_id is known
 async def validate_client_id(client_id: str) -> None:
     cfg = await get_client_config(client_id)
@@ -88,7 +146,8 @@ async def verify_api_key(x_api_key: str = Header(...)):
     if x_api_key == ADMIN_API_KEY:
         return {"client": "admin", "key": x_api_key}
 
-    client_id, config = await get_client_by_api_key(x_api_key)
+    with metrics.stage("auth"):
+        client_id, config = await get_client_by_api_key(x_api_key)
     if client_id and config:
         return {
             "client": client_id,
@@ -112,6 +171,38 @@ class ChatRequest(BaseModel):
     recaptcha_token: str
 
 
+class ChatBatchRequest(BaseModel):
+    client_id: str
+    questions: list[str] = Field(..., min_length=1, max_length=BATCH_MAX_QUESTIONS)
+
+
+class SourceDocument(BaseModel):
+    source: str
+    text: str
+
+
+class ChatResponse(BaseModel):
+    answer: str
+    source_documents: list[SourceDocument]
+
+
+class HistoryMessage(BaseModel):
+    id: int
+    role: Literal["user", "assistant"]
+    text: str
+
+
+class HistoryResponse(BaseModel):
+    history: list[HistoryMessage]
+    # pass as ``before`` to fetch the next older page; null at the start
+    next_before: int | None = None
+
+
+class HistoryCount(BaseModel):
+    count: int
+    latest_id: int | None
+
+
 class FeedbackRequest(BaseModel):
     client_id: str
     message_id: str
@@ -120,6 +211,31 @@ class FeedbackRequest(BaseModel):
     reason: str | None = None
 
 # --- helpers ---
+def source_documents(result: dict) -> list[dict]:
+    return [
+        {
+            "source": doc.metadata.get("source", "unknown"),
+            "text": doc.page_content[:300],
+        }
+        for doc in result.get("source_documents", [])
+    ]
+
+
+def history_message(entry_id: int, role: str, content: str) -> dict:
+    return {"id": entry_id, "role": "assistant" if role == "ai" else "user", "text": content}
+
+
+def history_response(page=(), next_before: int | None = None) -> FastJSONResponse:
+    """Render a get_memory_page window as a HistoryResponse without FastAPI's encoder walk."""
+    msgs = [history_message(*entry) for entry in page]
+    return FastJSONResponse({"history": msgs, "next_before": next_before})
+
+
+async def history_ndjson(client_id: str, chat_id: str):
+    async for entry in iter_memory(client_id, chat_id):
+        yield serialization.dumpb(history_message(*entry)) + b"\n"
+
+
 def normalize_reason(text: str | None) -> str | None:
     """Trim and cap the free-text reason to a safe length."""
     if text is None:
@@ -199,15 +315,10 @@ async def get_token_usage_endpoint(
     if api_key_info["client"] != "admin":
         raise HTTPException(403, "Forbidden")
 
-    api_key = api_key_info["key"]
-
     try:
-        # Debugging: Log the API key and client before attempting to fetch usage
-        print(f"Fetching token usage for api_key: {api_key}")
         usage_data = await get_token_usage(client_id)   # Returns dict with detailed usage
     except Exception as e:
-        # Debugging: Log any errors during token usage retrieval
-        print(f"Error fetching token usage for {client_id}: {str(e)}")
+        logger.exception("Error fetching token usage for %s", client_id)
         raise HTTPException(
             status_code=500, detail=f"Failed to fetch token usage: {str(e)}"
         )
@@ -218,19 +329,79 @@ async def get_token_usage_endpoint(
     }
 
 
-# Core chat logic extracted to a reusable function
-SESSION_TIMEOUT = timedelta(minutes=30)
+class DebugPromptRequest(BaseModel):
+    client_id: str
+    enabled: bool
 
 
-@app.get("/history")
-async def get_history(
-    client_id: str = Query(..., description="Which client/pastorate"),
-    chat_id: str = Query(..., description="The chat session ID"),
+# Admin toggle for full system-prompt dumps in the logs (off by default)
+@app.post("/admin/debug-prompts")
+async def set_debug_prompts(
+    req: DebugPromptRequest,
     api_key_info: dict = Depends(verify_api_key),
 ):
-    """
-    Return the saved chat messages (as {role, text}) for this client_id + chat_id.
-    """
+    if api_key_info["client"] != "admin":
+        raise HTTPException(403, "Forbidden")
+    cfg = await get_client_config(req.client_id)
+    if cfg is None:
+        raise HTTPException(status_code=400, detail="Unknown client_id")
+    await set_debug_prompt(req.client_id, req.enabled)
+    return {"client_id": req.client_id, "debug_prompt_dump": req.enabled}
+
+
+_warmup_task: asyncio.Task | None = None
+
+
+@app.on_event("startup")
+async def start_warmup():
+    # warm in the background so the server binds at once; /ready gates traffic
+    global _warmup_task
+    await redis_pool.start_client_cache()
+    _warmup_task = asyncio.create_task(warmup.run_warmup())
+
+
+# Liveness: the process is up and serving the event loop
+@app.get("/live")
+async def live():
+    return {"status": "alive"}
+
+
+# Readiness: 503 until this worker has finished warming up
+@app.get("/ready")
+async def ready():
+    body = warmup.state.as_dict()
+    return FastJSONResponse(content=body, status_code=200 if warmup.state.ready else 503)
+
+
+@app.on_event("shutdown")
+async def close_redis():
+    # finish queued post-response writes before the pool goes away
+    await background.drain()
+    await redis_pool.close()
+
+
+@app.on_event("shutdown")
+async def flush_logs():
+    shutdown_logging()
+
+
+# Prometheus scrape endpoint; per-client counts stay private, so it's off without METRICS_TOKEN
+@app.get("/metrics")
+async def metrics_endpoint(authorization: str | None = Header(None)):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# Core chat logic extracted to a reusable function
+SESSION_TIMEOUT = timedelta(minutes=30)
+
+
+async def authorize_history(client_id: str, api_key_info: dict) -> None:
     await validate_client_id(client_id)
     caller = api_key_info["client"]
 
@@ -248,19 +419,70 @@ async def get_history(
             detail="Forbidden: you can only access your own history",
         )
 
+
+@app.get("/history", response_model=HistoryResponse)
+async def get_history(
+    client_id: str = Query(..., description="Which client/pastorate"),
+    chat_id: str = Query(..., description="The chat session ID"),
+    limit: int | None = Query(None, ge=1, le=HISTORY_PAGE_MAX, description="Page size (newest page by default)"),
+    before: int | None = Query(None, ge=0, description="Return messages with id below this cursor"),
+    fmt: Literal["json", "ndjson"] = Query("json", alias="format", description="ndjson streams the whole session"),
+    api_key_info: dict = Depends(verify_api_key),
+):
+    """
+    Return the saved chat messages (as {id, role, text}) for this client_id + chat_id.
+
+    Without ``limit`` the whole session is returned. With it, only that window is read
+    from Redis; follow ``next_before`` to page back.
+    """
+    await authorize_history(client_id, api_key_info)
+
     # Safe to read memory
     if not await is_memory_enabled(client_id):
-        return {"history": []}
+        return history_response()
 
-    # Retrieve your LangChain ChatMessageHistory
-    history_obj = await get_memory(chat_id, client_id)
+    if fmt == "ndjson":
+        return StreamingResponse(history_ndjson(client_id, chat_id), media_type="application/x-ndjson")
+
+    with metrics.stage("memory_load"):
+        page, next_before = await get_memory_page(client_id, chat_id, limit, before)
+    return history_response(page, next_before)
+
+
+@app.get("/history/count", response_model=HistoryCount)
+async def get_history_count(
+    client_id: str = Query(..., description="Which client/pastorate"),
+    chat_id: str = Query(..., description="The chat session ID"),
+    api_key_info: dict = Depends(verify_api_key),
+):
+    """Cheap poll: message count and newest id, without reading the messages."""
+    await authorize_history(client_id, api_key_info)
+    count = await memory_length(client_id, chat_id) if await is_memory_enabled(client_id) else 0
+    return FastJSONResponse({"count": count, "latest_id": count - 1 if count else None})
 
-    # Convert each LangChain BaseMessage into {role, text}
-    msgs = [
-        {"role": "assistant" if m.type == "ai" else "user", "text": m.content}
-        for m in history_obj.messages
-    ]
-    return {"history": msgs}
+
+async def charge_request(api_key_info: dict) -> None:
+    """Apply the rate limit and monthly quota, then record one request."""
+    key = api_key_info["key"]
+    max_req = api_key_info.get("max_requests", 20)
+    window = api_key_info.get("window_seconds", 60)
+    monthly_limit = api_key_info.get("monthly_limit")
+
+    with metrics.stage("rate_limit"):
+        # Rate‑limit checks
+        await check_rate_limit(
+            key,
+            max_requests=max_req,
+            window_seconds=window,
+        )
+
+        # Monthly quota enforcement
+        used = int(await r.get(f"quota_usage:{key}") or 0)
+        if monthly_limit and used >= monthly_limit:
+            raise HTTPException(status_code=429, detail="Monthly quota exceeded")
+
+        #  Record this request against the quota
+        await track_usage(key)
 
 
 async def process_chat(request: ChatRequest, api_key_info: dict):
@@ -270,11 +492,12 @@ async def process_chat(request: ChatRequest, api_key_info: dict):
     await validate_client_id(client_id)
 
     # ---Check whether gpt fallback is allowed for client, default to false for strict indexing only
-    client_settings = await get_client_config(client_id) or {}
+    with metrics.stage("config_lookup"):
+        client_settings = await get_client_config(client_id) or {}
+    metrics.set_request_labels(
+        client_id=client_id, model=client_settings.get("gpt_model", "unknown")
+    )
     allow_fallback = client_settings.get("allow_gpt_fallback", False)
-    print(
-        f"[Chat] client_id: {client_id} | allow_fallback: {allow_fallback}"
-    )  # log whether fallback allowed
 
     # --- Auto‑expire logic ---
     now = datetime.utcnow()
@@ -287,25 +510,9 @@ async def process_chat(request: ChatRequest, api_key_info: dict):
     # ---------------------------
 
     try:
-        key = api_key_info["key"]
-        max_req = api_key_info.get("max_requests", 20)
-        window = api_key_info.get("window_seconds", 60)
-        monthly_limit = api_key_info.get("monthly_limit")
-
-        # Rate‑limit checks
-        await check_rate_limit(
-            key,
-            max_requests=max_req,
-            window_seconds=window,
-        )
-
-        # Monthly quota enforcement
-        used = int(await r.get(f"quota_usage:{key}") or 0)
-        if monthly_limit and used >= monthly_limit:
-            raise HTTPException(status_code=429, detail="Monthly quota exceeded")
-
-        #  Record this request against the quota
-        await track_usage(key)
+        # shed before charging, so a 503 costs the tenant no rate limit or quota
+        scheduler.llm.check(client_id, client_settings)
+        await charge_request(api_key_info)
 
         # Retrieve or initialize chat history
         if await is_memory_enabled(client_id):
@@ -325,29 +532,31 @@ async def process_chat(request: ChatRequest, api_key_info: dict):
         if await is_memory_enabled(client_id):
             chat_history.add_user_message(request.question)
             chat_history.add_ai_message(result["answer"])
-            await save_redis_memory(client_id, chat_id, chat_history)
+            # appended after the response; a load in this worker waits for it
+            await append_redis_memory_later(client_id, chat_id, chat_history.messages[-2:])
 
         # Return the response
         return {
             "answer": result["answer"],
-            "source_documents": [
-                {
-                    "source": doc.metadata.get("source", "unknown"),
-                    "text": doc.page_content[:300],
-                }
-                for doc in result.get("source_documents", [])
-            ],
+            "source_documents": source_documents(result),
         }
 
     except HTTPException as he:
         raise he
+    except Overloaded as e:
+        logger.warning("Shedding load: %s", e, extra={"category": "scheduler", "client_id": client_id})
+        raise HTTPException(
+            status_code=503,
+            detail="Service busy, retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
-        print(f"Exception in process_chat: {e}")
+        logger.exception("Exception in process_chat")
         raise HTTPException(status_code=500, detail=f"Internal error: {e}")
 
 
 # Internal chat endpoint — expects valid API key header
-@app.post("/chat")
+@app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest, api_key_info: dict = Depends(verify_api_key)):
     await validate_client_id(request.client_id)
     # admins can't impersonate clients
@@ -356,12 +565,202 @@ async def chat(request: ChatRequest, api_key_info: dict = Depends(verify_api_key
     # Clients only hit their own client_id
     if api_key_info["client"] != request.client_id:
         raise HTTPException(403, "Forbidden: key does not match client_id")
-    print(
-        f"Processing chat for client_id: {request.client_id}, chat_id: {request.chat_id}"
-    )  # debug/logging to verify memory behavior is functioning
+    # process_chat builds a ChatResponse-shaped dict of plain strings; skip re-validation
+    return FastJSONResponse(await process_chat(request, api_key_info))
 
-    
-    return await process_chat(request, api_key_info)
+
+def batch_error(index: int, question: str, exc: Exception) -> dict:
+    if isinstance(exc, Overloaded):
+        status_code, detail = 503, "Service busy, retry shortly"
+    elif isinstance(exc, HTTPException):
+        status_code, detail = exc.status_code, exc.detail
+    else:
+        logger.error("Batch item %d failed: %r", index, exc, extra={"category": "batch"})
+        status_code, detail = 500, "Internal error"
+    return {"index": index, "question": question, "error": detail, "status": status_code}
+
+
+# Bulk endpoint — many independent questions for one client, streamed as NDJSON
+@app.post("/chat/batch")
+async def chat_batch(request: ChatBatchRequest, api_key_info: dict = Depends(verify_api_key)):
+    """
+    Answer up to BATCH_MAX_QUESTIONS questions, one JSON line per question as each finishes:
+    {index, question, answer, source_documents}, or {index, question, error, status}.
+
+    Auth, config and the rate limit are handled once per batch. Each answered
+    question counts as one request against the monthly quota. Questions beyond
+    the remaining quota get a 429 line. Items carry no session memory.
+    """
+    client_id = request.client_id
+    await validate_client_id(client_id)
+    if api_key_info["client"] == "admin":
+        raise HTTPException(403, "Admins may not call /chat/batch")
+    if api_key_info["client"] != client_id:
+        raise HTTPException(403, "Forbidden: key does not match client_id")
+
+    with metrics.stage("config_lookup"):
+        client_settings = await get_client_config(client_id) or {}
+    allow_fallback = client_settings.get("allow_gpt_fallback", False)
+
+    key = api_key_info["key"]
+    monthly_limit = api_key_info.get("monthly_limit")
+    questions = request.questions
+    try:
+        # shed before charging, so a 503 costs the tenant no rate limit or quota
+        scheduler.llm.check(client_id, client_settings)
+        with metrics.stage("rate_limit"):
+            await check_rate_limit(
+                key,
+                max_requests=api_key_info.get("max_requests", 20),
+                window_seconds=api_key_info.get("window_seconds", 60),
+            )
+            used = int(await r.get(f"quota_usage:{key}") or 0)
+        admitted = len(questions) if not monthly_limit else max(monthly_limit - used, 0)
+        if admitted == 0:
+            raise HTTPException(status_code=429, detail="Monthly quota exceeded")
+        results = await get_batch_responses(client_id, questions[:admitted], allow_fallback)
+    except Overloaded as e:
+        logger.warning("Shedding load: %s", e, extra={"category": "scheduler", "client_id": client_id})
+        raise HTTPException(
+            status_code=503,
+            detail="Service busy, retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    async def lines():
+        for index in range(admitted, len(questions)):
+            item = {"index": index, "question": questions[index], "error": "Monthly quota exceeded", "status": 429}
+            yield serialization.dumpb(item) + b"\n"
+        async for index, result in results:
+            if isinstance(result, Exception):
+                item = batch_error(index, questions[index], result)
+            else:
+                # charge each answered question against the quota
+                await track_usage(key)
+                item = {
+                    "index": index,
+                    "question": questions[index],
+                    "answer": result["answer"],
+                    "source_documents": source_documents(result),
+                }
+            yield serialization.dumpb(item) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def authorize_socket(hello: dict) -> dict:
+    """Check a /ws/chat auth message, by API key or (widget) reCAPTCHA, like /chat and /proxy-chat."""
+    if not isinstance(hello, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+    client_id = hello.get("client_id")
+    if not client_id or not hello.get("chat_id"):
+        raise HTTPException(status_code=400, detail="Missing client_id or chat_id")
+    await validate_client_id(client_id)
+    if hello.get("api_key"):
+        api_key_info = await verify_api_key(hello["api_key"])
+        if api_key_info["client"] == "admin":
+            raise HTTPException(403, "Admins may not call /chat")
+        if api_key_info["client"] != client_id:
+            raise HTTPException(403, "Forbidden: key does not match client_id")
+        return api_key_info
+    if not hello.get("recaptcha_token"):
+        raise HTTPException(status_code=400, detail="Missing api_key or recaptcha_token")
+    if not await verify_recaptcha(hello["recaptcha_token"]):
+        raise HTTPException(status_code=403, detail="reCAPTCHA verification failed")
+    info = await get_client_config(client_id)
+    if not info:
+        raise HTTPException(status_code=400, detail="Unknown client")
+    return {"client": client_id, **info}
+
+
+async def send_event(websocket: WebSocket, event: dict) -> None:
+    await websocket.send_text(serialization.dumps(event))
+
+
+# Streaming chat over one connection — authenticate once, then question/answer turns
+@app.websocket("/ws/chat")
+async def websocket_chat(websocket: WebSocket):
+    """
+    First message: {"client_id", "chat_id", "api_key" | "recaptcha_token"} -> {"type": "ready"}.
+    Then {"question", "request_id"?} -> {"type": "token", "text"}* and {"type": "answer", "answer", "source_documents"},
+    or {"type": "error", "status", "detail"} (the connection stays open).
+
+    Config, history and the summary are held in a ChatSession for the life of
+    the connection. Each turn still goes through the rate limit and quota.
+    """
+    await websocket.accept()
+    try:
+        hello = serialization.loads(await websocket.receive_text())
+        api_key_info = await authorize_socket(hello)
+        client_id, chat_id = hello["client_id"], hello["chat_id"]
+        client_settings = await get_client_config(client_id) or {}
+        session = await ChatSession.open(
+            client_id, chat_id, allow_fallback=client_settings.get("allow_gpt_fallback", False),
+        )
+    except HTTPException as e:
+        await send_event(websocket, {"type": "error", "status": e.status_code, "detail": e.detail})
+        await websocket.close(code=1008)
+        return
+    except serialization.JSONDecodeError:
+        await websocket.close(code=1003)
+        return
+    except WebSocketDisconnect:
+        return
+    except Exception:
+        logger.exception("Exception opening websocket_chat session")
+        await websocket.close(code=1011)
+        return
+
+    await send_event(websocket, {"type": "ready", "chat_id": chat_id, "messages": len(session.history.messages)})
+
+    async def send_token(text: str) -> None:
+        await send_event(websocket, {"type": "token", "text": text})
+
+    try:
+        while True:
+            try:
+                message = serialization.loads(await websocket.receive_text())
+            except serialization.JSONDecodeError:
+                message = None
+            # each turn is a request of its own for log correlation and metrics
+            metrics.start_request()
+            request_id = message.get("request_id") if isinstance(message, dict) else None
+            request_id_var.set(request_id or uuid.uuid4().hex)
+            metrics.set_request_labels(client_id=client_id, model=session.config.get("gpt_model", "unknown"))
+            question = message.get("question") if isinstance(message, dict) else None
+            if not question:
+                await send_event(websocket, {"type": "error", "status": 400, "detail": "Missing question"})
+                continue
+            try:
+                scheduler.llm.check(client_id, session.config)
+                await charge_request(api_key_info)
+                result = await session.ask(question, on_token=send_token)
+            except HTTPException as e:
+                await send_event(websocket, {"type": "error", "status": e.status_code, "detail": e.detail})
+                continue
+            except Overloaded as e:
+                logger.warning("Shedding load: %s", e, extra={"category": "scheduler", "client_id": client_id})
+                await send_event(websocket, {
+                    "type": "error", "status": 503, "detail": "Service busy, retry shortly",
+                    "retry_after": e.retry_after,
+                })
+                continue
+            except WebSocketDisconnect:
+                raise
+            except Exception:
+                logger.exception("Exception in websocket_chat")
+                await send_event(websocket, {"type": "error", "status": 500, "detail": "Internal error"})
+                continue
+            await send_event(websocket, {
+                "type": "answer",
+                "answer": result["answer"],
+                "source_documents": source_documents(result),
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # make sure this conversation's writes are in Redis before the state goes away
+        await session.close()
 
 
 # CORS preflight for /chat route
@@ -379,7 +778,7 @@ async def preflight_chat():
 
 # Proxy endpoint - public IP limiter - recaptcha verifications
 @limiter.limit("30/minute")
-@app.post("/proxy-chat")
+@app.post("/proxy-chat", response_model=ChatResponse)
 async def proxy_chat(request: Request):
     body = await request.json()
     client_id = body.get("client_id")
@@ -405,11 +804,13 @@ async def proxy_chat(request: Request):
         # Call the extracted process_chat function directly with api_key_info
         response_data = await process_chat(chat_request, api_key_info)
 
-        # Return proper JSON response
-        return JSONResponse(content=jsonable_encoder(response_data), status_code=200)
+        return FastJSONResponse(content=response_data, status_code=200)
 
+    except HTTPException:
+        # rate limits, quota and load shedding keep their status codes
+        raise
     except Exception as e:
-        print(f"Internal proxy error: {e}")
+        logger.exception("Internal proxy error")
         raise HTTPException(status_code=500, detail="Internal proxy error")
 
 
@@ -440,14 +841,22 @@ async def submit_feedback(
     if not vote_recorded:
         raise HTTPException(status_code=409, detail="User already voted")
 
-    # stream event (analytics)
-    await append_feedback_event(
-        req.client_id, req.message_id, req.user_id, req.vote, reason=reason
+    # stream event (analytics), written after the response
+    await background.submit(
+        f"feedback:{req.client_id}",
+        partial(append_feedback_event, req.client_id, req.message_id, req.user_id, req.vote, reason=reason),
     )
 
-    print(
-        f"[FEEDBACK_RECORDED] client={req.client_id} message_id={req.message_id} "
-        f"user_id={req.user_id} vote={req.vote} reason={reason!r}"
+    logger.info(
+        "Feedback recorded",
+        extra={
+            "category": "feedback",
+            "client_id": req.client_id,
+            "message_id": req.message_id,
+            "user_id": req.user_id,
+            "vote": req.vote,
+            "reason": reason,
+        },
     )
 
     return {"status": "recorded"}
@@ -458,9 +867,11 @@ class ProxyHistoryRequest(BaseModel):
     client_id: str
     chat_id: str
     recaptcha_token: str
+    limit: int | None = Field(None, ge=1, le=HISTORY_PAGE_MAX)
+    before: int | None = Field(None, ge=0)
 
 @limiter.limit("30/minute")
-@app.post("/proxy-history")
+@app.post("/proxy-history", response_model=HistoryResponse)
 async def proxy_history(req: ProxyHistoryRequest, request: Request):
     if not await verify_recaptcha(req.recaptcha_token):
         raise HTTPException(status_code=403, detail="reCAPTCHA verification failed")
@@ -470,14 +881,11 @@ async def proxy_history(req: ProxyHistoryRequest, request: Request):
         raise HTTPException(status_code=400, detail="Unknown client")
 
     if not await is_memory_enabled(req.client_id):
-        return {"history": []}
+        return history_response()
 
-    history_obj = await get_memory(req.chat_id, req.client_id)
-    msgs = [
-        {"role": "assistant" if m.type == "ai" else "user", "text": m.content}
-        for m in history_obj.messages
-    ]
-    return {"history": msgs}
+    with metrics.stage("memory_load"):
+        page, next_before = await get_memory_page(req.client_id, req.chat_id, req.limit, req.before)
+    return history_response(page, next_before)
 
 
 # ---------- Proxy Feedback ----------
@@ -507,18 +915,32 @@ async def proxy_feedback(req: ProxyFeedbackRequest, request: Request):
         req.client_id, req.message_id, req.user_id, req.vote, reason=reason
     )
     if not vote_recorded:
-        print(
-            f"[FEEDBACK_DUPLICATE] client={req.client_id} message_id={req.message_id} "
-            f"user_id={req.user_id} vote={req.vote}"
+        logger.info(
+            "Duplicate feedback vote",
+            extra={
+                "category": "feedback",
+                "client_id": req.client_id,
+                "message_id": req.message_id,
+                "user_id": req.user_id,
+                "vote": req.vote,
+            },
         )
         raise HTTPException(status_code=409, detail="User already voted")
 
-    await append_feedback_event(
-        req.client_id, req.message_id, req.user_id, req.vote, reason=reason
+    await background.submit(
+        f"feedback:{req.client_id}",
+        partial(append_feedback_event, req.client_id, req.message_id, req.user_id, req.vote, reason=reason),
     )
 
-    print(
-        f"[FEEDBACK_RECORDED] client={req.client_id} message_id={req.message_id} "
-        f"user_id={req.user_id} vote={req.vote} reason={reason!r}"
+    logger.info(
+        "Feedback recorded",
+        extra={
+            "category": "feedback",
+            "client_id": req.client_id,
+            "message_id": req.message_id,
+            "user_id": req.user_id,
+            "vote": req.vote,
+            "reason": reason,
+        },
     )
     return {"status": "recorded"}
\ No newline at end of file
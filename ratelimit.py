@@ -1,10 +1,6 @@
-import redis.asyncio as redis
-import os
 import time
 from fastapi import HTTPException
-
-redis_url = os.getenv("REDIS_URL")
-r = redis.from_url(redis_url, decode_responses=True)
+from app.redis_pool import r
 
 async def check_rate_limit(api_key: str, max_requests: int = 20, window_seconds: int = 60):
     key = f"ratelimit:{api_key}"
@@ -1,12 +1,19 @@
 import httpx
 import os
+from app.logging_utils import get_logger
+
+logger = get_logger("recaptcha")
 
 RECAPTCHA_SECRET = os.getenv("RECAPTCHA_SECRET_KEY")
+# Overridable so load tests can point at a local stand-in (scripts/replay_stubs.py)
+RECAPTCHA_VERIFY_URL = os.getenv(
+    "RECAPTCHA_VERIFY_URL", "https://www.google.com/recaptcha/api/siteverify"
+)
 # Minimum score required from reCAPTCHA v3 verification
 RECAPTCHA_MIN_SCORE = float(os.getenv("RECAPTCHA_MIN_SCORE", "0.5"))
 
 async def verify_recaptcha(token: str, expected_action: str | None = None) -> bool:
-    url = "https://www.google.com/recaptcha/api/siteverify"
+    url = RECAPTCHA_VERIFY_URL
     data = {
         "secret": RECAPTCHA_SECRET,
         "response": token,
@@ -15,11 +22,12 @@ async def verify_recaptcha(token: str, expected_action: str | None = None) -> bo
         async with httpx.AsyncClient() as client:
             resp = await client.post(url, data=data, timeout=5)
             result = resp.json()
-        
-        print("🔍 reCAPTCHA verification result:", result)  # Log the full response
-        
+
         score = result.get("score", 0)
-        print("🔍 reCAPTCHA score:", score)
+        logger.debug(
+            "reCAPTCHA result success=%s score=%s", result.get("success"), score,
+            extra={"category": "recaptcha"},
+        )
 
         if not result.get("success"):
             return False
@@ -32,6 +40,6 @@ async def verify_recaptcha(token: str, expected_action: str | None = None) -> bo
 
         return True
     except Exception as e:
-        print("❌ Error verifying reCAPTCHA:", str(e))  # Log exceptions
+        logger.warning("Error verifying reCAPTCHA: %s", e)
         return False
 
@@ -0,0 +1,82 @@
+"""Consolidate chunk JSON files into one memory-mapped chunk store.
+
+Reads every ``*.json`` under ``--chunks`` (both the legacy
+``{"chunk_index", "source", "text"}`` files and ``chunk_texts.py`` output),
+normalizes them to the store schema, assigns the same content-hash ids that
+``embed_upsert.py`` gives the vectors, counts tokens, writes
+``app/chunk_store.py``'s format and validates the result against the source.
+
+    python scripts/build_chunk_store.py --chunks data/chunks --out data/corpus.chunks
+    python scripts/build_chunk_store.py --out data/corpus.chunks --validate-only
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app.chunk_store import ChunkStore, validate, write_store  # noqa: E402
+from chunk_texts import ENCODING, get_encoder  # noqa: E402
+from embed_upsert import CHUNKS_PATH, content_id  # noqa: E402
+
+STORE_PATH = os.path.join("data", "corpus.chunks")
+
+
+def load_legacy(chunks_path: str, encoding: str = ENCODING):
+    """Yield normalized records from a directory of chunk JSON files."""
+    enc = get_encoder(encoding)
+    for filename in sorted(os.listdir(chunks_path)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(chunks_path, filename), "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        seen = {}
+        for i, item in enumerate(chunks):
+            text = item["text"]
+            yield {
+                "id": content_id(filename, text, seen),
+                "text": text,
+                "token_count": item.get("token_count") or len(enc.encode(text)),
+                "source": item.get("source", "unknown"),
+                "filename": filename,
+                "position": i,
+                "section": item.get("section") or "",
+                "section_title": item.get("section_title") or "",
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", default=CHUNKS_PATH, help="directory of chunk JSON files")
+    parser.add_argument("--out", default=STORE_PATH)
+    parser.add_argument("--encoding", default=ENCODING, help="tiktoken encoding for token counts")
+    parser.add_argument("--validate-only", action="store_true", help="check an existing store against --chunks")
+    args = parser.parse_args()
+
+    records = list(load_legacy(args.chunks, args.encoding))
+    if not args.validate_only:
+        start = time.perf_counter()
+        count = write_store(args.out, records, encoding=args.encoding)
+        size = os.path.getsize(args.out)
+        print(f"Wrote {count} chunks ({size / 1024:.0f} KiB) to {args.out} in {time.perf_counter() - start:.2f}s")
+
+    problems = validate(args.out, expected=records)
+    if problems:
+        for problem in problems[:50]:
+            print(f"  ✗ {problem}")
+        raise SystemExit(f"{len(problems)} problems in {args.out}")
+
+    start = time.perf_counter()
+    with ChunkStore(args.out) as store:
+        if records:
+            store.get(records[0]["id"])
+        opened = time.perf_counter() - start
+        tokens = sum(r["token_count"] for r in records)
+        print(f"✅ {len(store)} chunks, {tokens} tokens; open + first lookup in {opened * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Build, review and publish a client's precomputed FAQ answers (``app/faq.py``).
+
+Step 1 generates candidate answers into a review file:
+
+    python scripts/build_faq.py ordinance --questions data/faq/ordinance.questions.jsonl
+    python scripts/build_faq.py prairiepastorate --history questions.txt --top 40
+
+``--questions`` is a curated list, one question per line, or JSONL like::
+
+    {"question": "What time is Sunday Mass?", "variants": ["When is mass on sunday"]}
+
+``--history`` (a file of past questions, same formats) and ``--from-redis``
+(user messages in live ``chatmem:<client>:*`` sessions) are clustered
+instead. Questions with the same normalized text are counted together. Then
+clusters whose embeddings are at least ``--cluster-threshold`` similar are
+merged, and the ``--top`` clusters asked at least ``--min-count`` times
+become entries, with the other phrasings as variants.
+
+Answers come from the normal retrieval and generation path
+(``chatbot.get_batch_responses``). Answers without sources are dropped. The
+review file (``--out``, default ``data/faq/<client>.json``) lists each entry
+with ``"approved": false``. Check the answers, set ``approved`` on the ones
+to serve, and edit wording or variants as needed.
+
+Step 2 embeds the approved entries and publishes them to Redis:
+
+    python scripts/build_faq.py ordinance --publish data/faq/ordinance.json
+
+Publishing refuses a file built under a different prompt or corpus version
+than the current one, since the API would treat it as stale anyway.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import background  # noqa: E402
+from app import faq  # noqa: E402
+from app import redis_utils  # noqa: E402
+from app.chatbot import get_batch_responses, resolve_config  # noqa: E402
+from app.client_config import CLIENT_CONFIG  # noqa: E402
+from app.embeddings import get_embeddings  # noqa: E402
+from app.singleflight import normalize_question  # noqa: E402
+
+FAQ_DIR = os.path.join("data", "faq")
+CLUSTER_THRESHOLD = 0.9
+DEFAULT_TOP = 50
+DEFAULT_MIN_COUNT = 3
+MAX_VARIANTS = 10
+SOURCE_TEXT_CHARS = 300  # what the API returns per source document
+VECTOR_DECIMALS = 5      # plenty for a cosine threshold; keeps the Redis blob small
+NO_ANSWER = "No relevant information found."
+
+
+# === Questions ===
+def load_questions(path: str) -> list[dict]:
+    """``[{"question", "variants", "count"}]`` from a text or JSONL file."""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                items.append({
+                    "question": item["question"],
+                    "variants": list(item.get("variants", [])),
+                    "count": int(item.get("count", 1)),
+                })
+            else:
+                items.append({"question": line, "variants": [], "count": 1})
+    return items
+
+
+async def redis_questions(client_id: str) -> list[str]:
+    """User messages in the client's stored sessions."""
+    questions = []
+    async for key in redis_utils.r.scan_iter(match=f"chatmem:{client_id}:*"):
+        for entry in await redis_utils.r.lrange(key, 0, -1):
+            if isinstance(entry, bytes):
+                entry = entry.decode("utf-8")
+            role, _, content = entry.partition(":")
+            if role == "human" and content.strip():
+                questions.append(content.strip())
+    return questions
+
+
+def group_exact(questions: list[str]) -> list[dict]:
+    """Count questions by normalized text; the most common spelling represents each group."""
+    spellings: dict[str, Counter] = {}
+    for q in questions:
+        norm = normalize_question(q)
+        if norm:
+            spellings.setdefault(norm, Counter())[q] += 1
+    groups = []
+    for counts in spellings.values():
+        ordered = [q for q, _ in counts.most_common()]
+        groups.append({"question": ordered[0], "variants": ordered[1:], "count": sum(counts.values())})
+    groups.sort(key=lambda g: -g["count"])
+    return groups
+
+
+def cluster(groups: list[dict], vectors: list[list[float]], threshold: float) -> list[dict]:
+    """Greedily merge groups into the most common group they are ``threshold``-similar to.
+
+    ``groups`` must be sorted by count, descending, so every cluster is led by
+    its most frequent phrasing.
+    """
+    clusters, centers = [], []
+    for group, vector in zip(groups, vectors):
+        vector = faq.unit(vector)
+        best, best_score = None, threshold
+        for i, center in enumerate(centers):
+            score = sum(a * b for a, b in zip(center, vector))
+            if score >= best_score:
+                best, best_score = i, score
+        if best is None:
+            clusters.append({**group, "variants": list(group["variants"])})
+            centers.append(vector)
+        else:
+            target = clusters[best]
+            target["variants"] += [group["question"], *group["variants"]]
+            target["count"] += group["count"]
+    for c in clusters:
+        c["variants"] = c["variants"][:MAX_VARIANTS]
+    clusters.sort(key=lambda c: -c["count"])
+    return clusters
+
+
+# === Generation ===
+def review_entry(item: dict, result: dict) -> dict | None:
+    sources = [
+        {"source": doc.metadata.get("source", "unknown"), "text": doc.page_content[:SOURCE_TEXT_CHARS]}
+        for doc in result.get("source_documents", [])
+    ]
+    if not sources or result["answer"].strip() == NO_ANSWER:
+        return None
+    return {**item, "answer": result["answer"], "sources": sources, "approved": False}
+
+
+async def generate(client_id: str, items: list[dict]) -> list[dict]:
+    results = await get_batch_responses(client_id, [item["question"] for item in items])
+    entries: list[dict | None] = [None] * len(items)
+    async for index, result in results:
+        if isinstance(result, Exception):
+            print(f"  ✗ {items[index]['question']!r}: {result!r}")
+            continue
+        entries[index] = review_entry(items[index], result)
+        if entries[index] is None:
+            print(f"  - {items[index]['question']!r}: no sourced answer, skipped")
+    await background.drain()  # token accounting
+    return [e for e in entries if e is not None]
+
+
+async def current_versions(client_id: str) -> dict:
+    config = await resolve_config(client_id)
+    corpus = await redis_utils.get_corpus_version(config.get("pinecone_index_name", ""))
+    return {
+        "prompt_version": faq.prompt_version(config),
+        "corpus_version": corpus.decode("utf-8") if isinstance(corpus, bytes) else corpus,
+        "embedding_model": config.get("embedding_model"),
+    }
+
+
+async def build(args, config: dict) -> None:
+    embeddings = get_embeddings({**config, "client_id": args.client})
+    if args.questions:
+        items = load_questions(args.questions)
+    else:
+        questions = []
+        if args.history:
+            for item in load_questions(args.history):
+                questions += [item["question"]] * item["count"]
+        if args.from_redis:
+            questions += await redis_questions(args.client)
+        groups = group_exact(questions)
+        print(f"{len(questions)} questions, {len(groups)} distinct")
+        vectors = await embeddings.aembed_documents([g["question"] for g in groups]) if groups else []
+        items = [c for c in cluster(groups, vectors, args.cluster_threshold) if c["count"] >= args.min_count]
+        items = items[:args.top]
+        print(f"{len(items)} clusters asked at least {args.min_count} times")
+
+    versions = await current_versions(args.client)
+    entries = await generate(args.client, items)
+    out = args.out or os.path.join(FAQ_DIR, f"{args.client}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"client": args.client, **versions, "entries": entries}, f, indent=2, ensure_ascii=False)
+    print(f"{len(entries)} answers written to {out}; set \"approved\": true on the ones to publish")
+
+
+# === Publishing ===
+async def publish(args, config: dict) -> None:
+    with open(args.publish, "r", encoding="utf-8") as f:
+        review = json.load(f)
+    versions = await current_versions(args.client)
+    for field, current in versions.items():
+        if review.get(field) != current:
+            raise SystemExit(f"{args.publish} was built with {field} {review.get(field)!r}, "
+                             f"current is {current!r}; rebuild it")
+
+    approved = [e for e in review["entries"] if e.get("approved")]
+    phrasings = [[e["question"], *e.get("variants", [])] for e in approved]
+    flat = [text for texts in phrasings for text in texts]
+    embeddings = get_embeddings({**config, "client_id": args.client})
+    vectors = iter(await embeddings.aembed_documents(flat) if flat else [])
+    entries = [
+        {
+            "answer": e["answer"],
+            "sources": e.get("sources", []),
+            "questions": [
+                {"text": text, "vector": [round(x, VECTOR_DECIMALS) for x in faq.unit(next(vectors))]}
+                for text in texts
+            ],
+        }
+        for e, texts in zip(approved, phrasings)
+    ]
+    stamp = hashlib.sha256(f"{time.time()}\0{args.publish}".encode("utf-8")).hexdigest()[:16]
+    await redis_utils.save_faq_set(args.client, {"stamp": stamp, **versions, "entries": entries})
+    print(f"Published {len(entries)} FAQ answers ({len(flat)} phrasings) for {args.client} as {stamp}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("client", help="client id from app/client_config.py")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--questions", help="curated questions (text or JSONL); no clustering")
+    source.add_argument("--history", help="past questions to cluster (text or JSONL with counts)")
+    source.add_argument("--from-redis", action="store_true", help="cluster user messages in stored sessions")
+    source.add_argument("--publish", metavar="REVIEW_FILE", help="embed and publish the approved entries")
+    parser.add_argument("--cluster-threshold", type=float, default=CLUSTER_THRESHOLD)
+    parser.add_argument("--min-count", type=int, default=DEFAULT_MIN_COUNT)
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP)
+    parser.add_argument("--out", help=f"review file (defaults to {FAQ_DIR}/<client>.json)")
+    args = parser.parse_args()
+
+    config = CLIENT_CONFIG.get(args.client)
+    if config is None:
+        parser.error(f"unknown client {args.client!r}")
+    asyncio.run(publish(args, config) if args.publish else build(args, config))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,259 @@
-import os
+"""Split raw text files into token-sized, overlapping chunks.
+
+Files are read line by line and chunks are written as they are produced, so
+memory stays flat regardless of input size. Chunk size is measured in model
+tokens (tiktoken) rather than words, consecutive chunks share ``--overlap``
+tokens of context, and a new chunk always starts at an ordinance-style
+heading (``3-4-1``, ``Section 12-14-3``, ``Chapter 3-4``) so chunks never
+straddle sections. A numbered line that reads as a sentence ("12-14-2. No
+person shall park ...") is body text, not a heading. Oversized paragraphs are
+split on sentences, then on token boundaries. A directory tree is processed in parallel across CPU cores.
+
+    python scripts/chunk_texts.py data/raw data/chunks --max-tokens 350 --overlap 50
+
+Each output file is a JSON list of
+``{"source", "chunk_id", "text", "token_count", "section", "section_title"}``.
+"""
+import argparse
 import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 
 # === Config ===
-RAW_PATH = r"C:\Maximos\data\raw"
-CHUNK_OUTPUT_PATH = r"C:\Maximos\data\chunks"
-
-def load_text(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return f.read()
-
-def split_into_chunks(text, max_words=350):
-    paragraphs = text.split('\n')
-    chunks = []
-    chunk = ""
-    word_count = 0
-
-    for para in paragraphs:
-        para = para.strip()
-        if not para:
+RAW_PATH = os.path.join("data", "raw")
+CHUNK_OUTPUT_PATH = os.path.join("data", "chunks")
+MAX_TOKENS = 350
+OVERLAP_TOKENS = 50
+ENCODING = "cl100k_base"
+INPUT_EXTENSIONS = (".txt", ".md", ".json")
+
+HEADING_RE = re.compile(
+    r"^\s*(?:(?:Section|Sec\.|Chapter|§)\s*)?(\d{1,3}-\d{1,3}(?:-\d{1,3})*)\b[.:)]?\s*(.*)$",
+    re.IGNORECASE,
+)
+SENTENCE_RE = re.compile(r"(?<=[.!?;])\s+")
+# a numbered line whose "title" reads like a sentence is a provision with a body
+# ("12-14-2. No person shall park ..."), not a heading
+MAX_TITLE_WORDS = 12
+PROVISION_WORDS = {"shall", "may", "must", "will", "is", "are", "be", "means", "not"}
+
+_encoders: dict = {}
+
+
+def get_encoder(name: str = ENCODING):
+    enc = _encoders.get(name)
+    if enc is None:
+        import tiktoken
+
+        enc = _encoders[name] = tiktoken.get_encoding(name)
+    return enc
+
+
+def match_heading(line: str) -> tuple[str, str] | None:
+    """Return ``(section_id, title)`` if ``line`` opens a numbered section."""
+    if len(line) > 200:
+        return None
+    m = HEADING_RE.match(line)
+    if not m:
+        return None
+    title = m.group(2).strip()
+    has_keyword = not line.lstrip()[:1].isdigit()
+    # bare numbers ("10-15 feet from the curb ...") are only headings if short and titled
+    if not has_keyword and (len(title) > 100 or title[:1].islower()):
+        return None
+    words = title.lower().split()
+    if len(words) > MAX_TITLE_WORDS or PROVISION_WORDS.intersection(w.strip(".,;:") for w in words):
+        return None
+    return m.group(1), title
+
+
+def iter_paragraphs_from_lines(lines):
+    """Group lines into paragraphs separated by blank lines or headings."""
+    buffer = []
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            if buffer:
+                yield " ".join(buffer)
+                buffer = []
+            continue
+        if match_heading(line):
+            # headings are their own paragraph so they start the next chunk
+            if buffer:
+                yield " ".join(buffer)
+                buffer = []
+            yield line
             continue
+        buffer.append(line)
+    if buffer:
+        yield " ".join(buffer)
+
+
+def iter_paragraphs(path: str):
+    """Yield paragraphs of a file without loading the whole file."""
+    if path.endswith(".json"):
+        # crawler output ({"url", "text"}) is one document per file
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        yield from iter_paragraphs_from_lines(
+            (doc.get("text", "") if isinstance(doc, dict) else "").splitlines()
+        )
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_paragraphs_from_lines(f)
+
+
+def split_oversized(text: str, max_tokens: int, enc) -> list[tuple[str, int]]:
+    """Break ``text`` into pieces of at most ``max_tokens`` tokens."""
+    tokens = enc.encode(text)
+    if len(tokens) <= max_tokens:
+        return [(text, len(tokens))]
+    pieces = []
+    for sentence in SENTENCE_RE.split(text):
+        n = len(enc.encode(sentence))
+        if n <= max_tokens:
+            pieces.append((sentence, n))
+            continue
+        ids = enc.encode(sentence)
+        for i in range(0, len(ids), max_tokens):
+            part = ids[i:i + max_tokens]
+            pieces.append((enc.decode(part), len(part)))
+    return pieces
+
+
+def iter_chunks(paragraphs, max_tokens: int = MAX_TOKENS, overlap: int = OVERLAP_TOKENS, encoding: str = ENCODING):
+    """Pack paragraphs into chunks of at most ``max_tokens`` tokens.
+
+    Yields dicts with ``text``, ``token_count``, ``section`` and ``section_title``.
+    """
+    enc = get_encoder(encoding)
+    units: list[tuple[str, int]] = []   # (text, tokens) pieces of the open chunk
+    size = 0
+    fresh = False                        # open chunk has body text beyond overlap/headings
+    section, section_title = None, None
+
+    def emit():
+        text = "\n".join(u[0] for u in units)
+        return {
+            "text": text,
+            "token_count": size,
+            "section": section,
+            "section_title": section_title,
+        }
+
+    def overlap_tail() -> list[tuple[str, int]]:
+        tail, total = [], 0
+        for text, n in reversed(units):
+            if total + n > overlap:
+                if not tail and overlap > 0:
+                    ids = enc.encode(text)[-overlap:]
+                    tail.append((enc.decode(ids), len(ids)))
+                break
+            tail.insert(0, (text, n))
+            total += n
+        return tail
+
+    for paragraph in paragraphs:
+        heading = match_heading(paragraph)
+        if heading:
+            if fresh:
+                yield emit()
+                units, size = [], 0
+            # consecutive headings ("Chapter 3-4" then "3-4-1") stack into one prefix
+            fresh = False
+            for piece, n in split_oversized(paragraph, max_tokens, enc):
+                if size + n > max_tokens:
+                    # too many stacked headings: the earlier ones go out on their own
+                    yield emit()
+                    units, size = [], 0
+                units.append((piece, n))
+                size += n
+            section, section_title = heading
+            continue
+        for piece, n in split_oversized(paragraph, max_tokens, enc):
+            if size + n > max_tokens:
+                if fresh:
+                    yield emit()
+                    units = overlap_tail()
+                    size = sum(u[1] for u in units)
+                    # make room if overlap + piece still exceeds the budget
+                    while units and size + n > max_tokens:
+                        size -= units.pop(0)[1]
+                else:
+                    # only headings so far, and they leave no room for this piece
+                    yield emit()
+                    units, size = [], 0
+            units.append((piece, n))
+            size += n
+            fresh = True
+    if units:
+        yield emit()
+
+
+def output_path_for(path: str, raw_root: str, out_root: str) -> str:
+    rel = os.path.relpath(path, raw_root)
+    stem = os.path.splitext(rel)[0]
+    return os.path.join(out_root, stem.replace(" ", "_").lower() + ".json")
 
-        words = para.split()
-        if word_count + len(words) > max_words:
-            chunks.append(chunk.strip())
-            chunk = para + "\n"
-            word_count = len(words)
-        else:
-            chunk += para + "\n"
-            word_count += len(words)
 
-    if chunk:
-        chunks.append(chunk.strip())
+def process_file(path: str, raw_root: str, out_root: str, max_tokens: int, overlap: int, encoding: str) -> tuple[str, int]:
+    """Chunk one file, streaming chunks straight into its JSON output."""
+    title = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+    output_path = output_path_for(path, raw_root, out_root)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    return chunks
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for chunk in iter_chunks(iter_paragraphs(path), max_tokens, overlap, encoding):
+            record = {"source": title, "chunk_id": count, **chunk}
+            f.write(("," if count else "") + "\n  " + json.dumps(record, ensure_ascii=False))
+            count += 1
+        f.write("\n]\n")
+    return output_path, count
 
-def process_file(filename, title):
-    file_path = os.path.join(RAW_PATH, filename)
-    print(f"Processing: {file_path}")
 
-    text = load_text(file_path)
-    chunks = split_into_chunks(text)
+def find_inputs(raw_root: str) -> list[str]:
+    if os.path.isfile(raw_root):
+        return [raw_root]
+    paths = []
+    for dirpath, _, filenames in os.walk(raw_root):
+        for name in sorted(filenames):
+            if name.endswith(INPUT_EXTENSIONS):
+                paths.append(os.path.join(dirpath, name))
+    return sorted(paths)
 
-    data = []
-    for i, chunk in enumerate(chunks):
-        data.append({
-            "source": title,
-            "chunk_id": i,
-            "text": chunk
-        })
 
-    output_filename = f"{title.replace(' ', '_').lower()}.json"
-    output_path = os.path.join(CHUNK_OUTPUT_PATH, output_filename)
-    
-    os.makedirs(CHUNK_OUTPUT_PATH, exist_ok=True)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("raw", nargs="?", default=RAW_PATH, help="input file or directory tree")
+    parser.add_argument("out", nargs="?", default=CHUNK_OUTPUT_PATH, help="output directory")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=OVERLAP_TOKENS)
+    parser.add_argument("--encoding", default=ENCODING, help="tiktoken encoding name")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    if args.overlap >= args.max_tokens:
+        parser.error("--overlap must be smaller than --max-tokens")
 
-    print(f"Saved {len(chunks)} chunks to: {output_path}")
+    inputs = find_inputs(args.raw)
+    raw_root = os.path.dirname(args.raw) if os.path.isfile(args.raw) else args.raw
+    print(f"Chunking {len(inputs)} files with {args.workers} workers")
 
-# === Process your actual files ===
-process_file("lettertomarinus.txt", "Letter to Marinus on the Filioque")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            pool.submit(process_file, p, raw_root, args.out, args.max_tokens, args.overlap, args.encoding)
+            for p in inputs
+        ]
+        total = 0
+        for future in futures:
+            output_path, count = future.result()
+            total += count
+            print(f"Saved {count} chunks to: {output_path}")
+    print(f"Done: {total} chunks")
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Near-duplicate chunk detection with MinHash + LSH (pure Python).
+
+Each chunk is reduced to word shingles, summarised by a MinHash signature,
+and bucketed by banded LSH, so only chunks sharing a band are compared. A
+chunk whose estimated Jaccard similarity to an earlier one reaches the
+threshold is collapsed into that earlier (canonical) chunk.
+
+    from dedup import Deduplicator
+    dedup = Deduplicator(threshold=0.85)
+    canonical = dedup.check("chunk-id", text)   # None if the chunk is new
+"""
+import hashlib
+import random
+import re
+import struct
+
+NUM_PERM = 128
+BANDS = 16              # 16 bands x 8 rows: candidate pairs from ~0.7 similarity
+SHINGLE_SIZE = 5        # words per shingle
+THRESHOLD = 0.85        # estimated Jaccard needed to call a pair duplicates
+MAX_REFERENCES = 20     # duplicate sources kept on a canonical chunk's metadata
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[int]:
+    """32-bit hashes of the normalised word ``size``-grams of ``text``."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        words = words or [""]
+        grams = [" ".join(words)]
+    else:
+        grams = (" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+    return {
+        struct.unpack("<I", hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest())[0]
+        for g in grams
+    }
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE, seed: int = 1):
+        rng = random.Random(seed)
+        self.shingle_size = shingle_size
+        self.params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, text: str) -> tuple[int, ...]:
+        values = shingles(text, self.shingle_size)
+        return tuple(
+            min(((a * v + b) % _PRIME) & _MAX_HASH for v in values)
+            for a, b in self.params
+        )
+
+
+def estimate_jaccard(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class LSHIndex:
+    """Banded LSH buckets over MinHash signatures."""
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: list[dict] = [{} for _ in range(bands)]
+        self.signatures: dict[str, tuple[int, ...]] = {}
+
+    def _band_keys(self, signature):
+        for i in range(self.bands):
+            yield i, signature[i * self.rows:(i + 1) * self.rows]
+
+    def candidates(self, signature) -> set[str]:
+        found = set()
+        for i, key in self._band_keys(signature):
+            found.update(self._buckets[i].get(key, ()))
+        return found
+
+    def add(self, item_id: str, signature) -> None:
+        self.signatures[item_id] = signature
+        for i, key in self._band_keys(signature):
+            self._buckets[i].setdefault(key, []).append(item_id)
+
+
+class Deduplicator:
+    """Streaming near-duplicate filter: first occurrence wins."""
+
+    def __init__(self, threshold: float = THRESHOLD, num_perm: int = NUM_PERM, bands: int = BANDS):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.index = LSHIndex(num_perm, bands)
+        self.references: dict[str, list[str]] = {}   # canonical id -> duplicate ids
+        self.seen = 0
+
+    def match(self, signature) -> str | None:
+        best, best_score = None, self.threshold
+        for candidate in self.index.candidates(signature):
+            score = estimate_jaccard(signature, self.index.signatures[candidate])
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def check(self, item_id: str, text: str, signature=None) -> str | None:
+        """Return the canonical id ``item_id`` duplicates, or None and index it.
+
+        ``signature`` may be precomputed (e.g. off the event loop).
+        """
+        self.seen += 1
+        signature = signature or self.hasher.signature(text)
+        canonical = self.match(signature)
+        if canonical is None:
+            self.index.add(item_id, signature)
+            return None
+        self.references.setdefault(canonical, []).append(item_id)
+        return canonical
+
+    @property
+    def duplicates(self) -> int:
+        return sum(len(refs) for refs in self.references.values())
+
+    @property
+    def ratio(self) -> float:
+        return self.duplicates / self.seen if self.seen else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.seen} chunks -> {self.seen - self.duplicates} unique "
+            f"({self.duplicates} near-duplicates, {self.ratio:.1%} dedup ratio)"
+        )
+
+
+def dedup_chunks(data: list[dict], threshold: float = THRESHOLD) -> tuple[list[dict], Deduplicator]:
+    """Drop near-duplicate chunks, recording their sources on the canonical chunk.
+
+    ``data`` items need ``id``, ``text`` and ``metadata`` (with ``source``);
+    canonical chunks get ``duplicate_count`` and up to ``MAX_REFERENCES``
+    ``duplicate_sources`` in their metadata.
+    """
+    dedup = Deduplicator(threshold)
+    by_id = {d["id"]: d for d in data}
+    kept = [d for d in data if dedup.check(d["id"], d["text"]) is None]
+    for canonical, refs in dedup.references.items():
+        metadata = by_id[canonical]["metadata"]
+        sources = list(dict.fromkeys(by_id[r]["metadata"].get("source", r) for r in refs))
+        metadata["duplicate_count"] = len(refs)
+        metadata["duplicate_sources"] = sources[:MAX_REFERENCES]
+    return kept, dedup
@@ -1,91 +1,496 @@
-import os
+"""Embed chunk JSON files and upsert them into a Pinecone index.
+
+Embedding requests run concurrently (bounded), batch size adapts to rate
+limits, failed calls retry with exponential backoff, and finished batches are
+upserted concurrently while later batches are still embedding. Every upserted
+chunk id is appended to a checkpoint file, so an interrupted run picks up
+where it stopped instead of paying for the same embeddings again.
+
+Chunk ids are derived from content (file name + text), and ``--incremental``
+compares them with a local manifest of what the index already holds: only
+new or changed chunks are embedded, and vectors for removed chunks are
+deleted. ``--dry-run`` prints that diff without touching anything.
+
+Near-duplicate chunks (repeated boilerplate, shared definitions) are
+collapsed before embedding with MinHash/LSH (``dedup.py``); the canonical
+chunk lists the sources of its duplicates. ``--no-dedup`` turns this off.
+
+``--slim-metadata`` leaves chunk text out of the vector metadata (ids and
+small filter fields only); the API then hydrates text by id from the chunk
+store (``build_chunk_store.py``) or, with ``--publish-redis``, from Redis.
+Enable it per client with ``slim_metadata`` / ``chunk_store_path``.
+
+When ``REDIS_URL`` is set, a finished run also publishes the index's corpus
+version, which retires FAQ answers built before it (``app/faq.py``).
+
+``--model local:<name>`` embeds with the same local sentence-transformers
+provider the API uses for that client (``app/embeddings.py``).
+
+    python scripts/embed_upsert.py --chunks data/chunks --index ordinance
+    python scripts/embed_upsert.py --index ordinance --incremental --dry-run
+"""
+import argparse
+import asyncio
+import hashlib
 import json
-from tqdm import tqdm
-from pinecone import Pinecone, ServerlessSpec
+import os
+import random
+import sys
+import time
+
 import openai
+from pinecone import Pinecone, ServerlessSpec
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from dedup import THRESHOLD as DEDUP_THRESHOLD, dedup_chunks  # noqa: E402
 
 # === CONFIG ===
-CHUNKS_PATH = r"C:\Maximos2\data\chunks"
-openai.api_key = os.getenv("OPENAI_API_KEY")
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-INDEX_NAME = "ordinance"
-
-# === INIT Pinecone ===
-pc = Pinecone(api_key=PINECONE_API_KEY)
-
-if not pc.has_index(INDEX_NAME):
-    pc.create_index(
-        name=INDEX_NAME,
-        dimension=1536,
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1")
-    )
+CHUNKS_PATH = os.getenv("CHUNKS_PATH", os.path.join("data", "chunks"))
+INDEX_NAME = os.getenv("INDEX_NAME", "ordinance")
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_DIM = 1536
+CHECKPOINT_PATH = ".embed_upsert_checkpoint"
+MANIFEST_DIR = os.path.join("data", "manifests")
+EMBEDDING_PRICE_PER_1K = 0.0001  # USD, text-embedding-ada-002
+DELETE_BATCH_SIZE = 1000
+PUBLISH_BATCH_SIZE = 1000
+
+BATCH_SIZE = 100          # starting / maximum texts per embedding request
+MIN_BATCH_SIZE = 8
+EMBED_CONCURRENCY = 4     # embedding requests in flight
+UPSERT_CONCURRENCY = 4    # upsert requests in flight
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0        # seconds, doubled per attempt with jitter
+BACKOFF_MAX = 60.0
+
+
+# === LOAD CHUNKS ===
+def content_id(filename: str, text: str, seen: dict) -> str:
+    """Stable id from file name + text; repeats within a file get a suffix."""
+    digest = hashlib.sha256(f"{filename}\0{text}".encode("utf-8")).hexdigest()[:32]
+    count = seen.get(digest, 0)
+    seen[digest] = count + 1
+    return digest if count == 0 else f"{digest}-{count}"
+
+
+def fingerprint(text: str, metadata: dict) -> str:
+    """Hash of everything that ends up in the vector record."""
+    payload = json.dumps({"text": text, "metadata": metadata}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _record(filename: str, position: int, source: str, chunk_id: str, text: str) -> dict:
+    metadata = {"filename": filename, "chunk_id": position, "source": source}
+    return {"id": chunk_id, "text": text, "metadata": metadata, "fingerprint": fingerprint(text, metadata)}
+
 
-index = pc.Index(INDEX_NAME)
+def load_chunks(chunks_path: str) -> list[dict]:
+    """Load chunks from a directory of chunk JSON files or a ``.chunks`` store."""
+    if os.path.isfile(chunks_path):
+        from app.chunk_store import ChunkStore
 
-# === LOAD + PREPARE CHUNKED DATA ===
-data = []
-for filename in tqdm(os.listdir(CHUNKS_PATH), desc="Loading chunks"):
-    if filename.endswith(".json"):
-        full_path = os.path.join(CHUNKS_PATH, filename)
-        with open(full_path, "r", encoding="utf-8") as f:
+        with ChunkStore(chunks_path) as store:
+            return [
+                _record(r["filename"], r["position"], r["source"], r["id"], r["text"])
+                for r in store
+            ]
+    data = []
+    for filename in sorted(os.listdir(chunks_path)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(chunks_path, filename), "r", encoding="utf-8") as f:
             chunks = json.load(f)
-            for i, item in enumerate(chunks):
-                data.append({
-                    "id": f"{filename}_{i}",
-                    "text": item["text"],
-                    "metadata": {
-                        "filename": filename,
-                        "chunk_id": i,
-                        "source": item.get("source", "unknown")
-                    }
-                })
-
-print(f"Loaded {len(data)} chunks.")
-
-# === EMBED TEXTS ===
-def embed(texts: list[str]):
-    response = openai.embeddings.create(
-        input=texts,
-        model="text-embedding-ada-002"
+        seen = {}
+        for i, item in enumerate(chunks):
+            chunk_id = content_id(filename, item["text"], seen)
+            data.append(_record(filename, i, item.get("source", "unknown"), chunk_id, item["text"]))
+    return data
+
+
+# === MANIFEST ===
+def load_manifest(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"version": 1, "model": None, "chunks": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(path: str, manifest: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def build_manifest(data: list[dict], model: str, slim: bool = False) -> dict:
+    return {
+        "version": 1,
+        "model": model,
+        "slim_metadata": slim,
+        "chunks": {
+            d["id"]: {"fingerprint": d["fingerprint"], "filename": d["metadata"]["filename"]}
+            for d in data
+        },
+    }
+
+
+def diff_manifest(data: list[dict], manifest: dict, model: str, slim: bool = False) -> dict:
+    """Split chunks into new / changed / unchanged and list ids to delete.
+
+    A different embedding model or metadata layout invalidates every stored vector.
+    """
+    same_layout = manifest.get("slim_metadata", False) == slim
+    known = manifest.get("chunks", {}) if manifest.get("model") in (None, model) and same_layout else {}
+    new, changed, unchanged = [], [], []
+    for d in data:
+        entry = known.get(d["id"])
+        if entry is None:
+            new.append(d)
+        elif entry.get("fingerprint") != d["fingerprint"]:
+            changed.append(d)
+        else:
+            unchanged.append(d)
+    current = {d["id"] for d in data}
+    removed = sorted(i for i in manifest.get("chunks", {}) if i not in current)
+    return {"new": new, "changed": changed, "unchanged": unchanged, "removed": removed}
+
+
+def describe_diff(diff: dict) -> str:
+    work = diff["new"] + diff["changed"]
+    est_tokens = sum(len(d["text"]) // 4 for d in work)  # ~4 chars per token
+    return (
+        f"new {len(diff['new'])}, changed {len(diff['changed'])}, "
+        f"unchanged {len(diff['unchanged'])}, removed {len(diff['removed'])}; "
+        f"~{est_tokens} tokens to embed (~${est_tokens / 1000 * EMBEDDING_PRICE_PER_1K:.4f})"
     )
-    return [r.embedding for r in response.data]
-
-
-# === CHUNKED UPSERT TO PINECONE ===
-BATCH_SIZE = 100
-for i in tqdm(range(0, len(data), BATCH_SIZE), desc="Embedding & upserting"):
-    batch = data[i:i + BATCH_SIZE]
-    texts = [d["text"] for d in batch]
-    embeddings = embed(texts)
-
-    vectors = []
-    for d, e, text in zip(batch, embeddings, texts):
-        metadata = d.get("metadata", {})
-        metadata["text"] = text  # Ensure 'text' key exists
-
-        vectors.append({
-            "id": d["id"],
-            "values": e,
-            "metadata": metadata
-        })
-
-    index.upsert(vectors=vectors)
-
-print("🎉 All chunks embedded and upserted!")
-
-# === OPTIONAL QUERY ===
-query = "Do I need to mow my lawn?"
-query_embed = embed([query])[0]
-
-results = index.query(
-    namespace="",
-    vector=query_embed,
-    top_k=3,
-    include_metadata=True
-)
-
-print("\nTop results:")
-for match in results["matches"]:
-    print(f"Score: {match['score']:.4f}")
-    print(f"Metadata: {match['metadata']}\n")
+
+
+# === CHECKPOINT ===
+class Checkpoint:
+    """Append-only record of chunk ids that are already upserted."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: set[str] = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.done = {line.strip() for line in f if line.strip()}
+        self._file = open(path, "a", encoding="utf-8")
+
+    def mark(self, ids: list[str]) -> None:
+        self._file.write("".join(f"{i}\n" for i in ids))
+        self._file.flush()
+        self.done.update(ids)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+# === RETRIES / ADAPTIVE BATCHING ===
+class AdaptiveBatchSize:
+    """Halve the batch size on rate limits, grow it back slowly on success."""
+
+    def __init__(self, start: int, minimum: int):
+        self.maximum = start
+        self.minimum = minimum
+        self.value = start
+
+    def shrink(self) -> None:
+        self.value = max(self.minimum, self.value // 2)
+
+    def grow(self) -> None:
+        self.value = min(self.maximum, self.value + max(1, self.value // 10))
+
+
+def _retry_after(exc: Exception) -> float | None:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+async def with_retries(fn, *, label: str, on_rate_limit=None):
+    """Await ``fn()`` retrying transient failures with exponential backoff."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return await fn()
+        except Exception as e:
+            rate_limited = isinstance(e, openai.RateLimitError) or getattr(e, "status", None) == 429
+            transient = rate_limited or isinstance(e, (
+                openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError,
+                ConnectionError, TimeoutError,
+            )) or (getattr(e, "status", 0) or 0) >= 500
+            if not transient or attempt == MAX_RETRIES:
+                raise
+            if rate_limited and on_rate_limit:
+                on_rate_limit()
+            delay = _retry_after(e) or min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+            delay *= 0.5 + random.random()
+            print(f"{label}: {type(e).__name__}, retrying in {delay:.1f}s (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+
+
+# === EMBED + UPSERT ENGINE ===
+class Progress:
+    def __init__(self, total: int, skipped: int):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.start = time.perf_counter()
+        self._last = 0.0
+
+    def advance(self, n: int, batch_size: int) -> None:
+        self.done += n
+        now = time.perf_counter()
+        if now - self._last >= 2 or self.done + self.skipped == self.total:
+            self._last = now
+            rate = self.done / max(now - self.start, 1e-9)
+            print(
+                f"{self.done + self.skipped}/{self.total} chunks "
+                f"({rate:.1f} chunks/s, batch size {batch_size})"
+            )
+
+
+def make_embedder(model: str, api_key: str | None = None):
+    """Return ``(embed, dimension)`` where ``embed`` is ``async (texts) -> vectors``."""
+    from app.embeddings import LocalEmbeddings, is_local_model
+
+    if is_local_model(model):
+        provider = LocalEmbeddings(model)
+        return provider.aembed_documents, provider.dimension
+
+    client = openai.AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+    async def embed(texts: list[str]) -> list[list[float]]:
+        response = await client.embeddings.create(input=texts, model=model)
+        return [e.embedding for e in response.data]
+
+    return embed, EMBEDDING_DIM
+
+
+async def ingest(
+    data: list[dict],
+    index,
+    embed,
+    checkpoint: Checkpoint,
+    *,
+    batch_size: int = BATCH_SIZE,
+    embed_concurrency: int = EMBED_CONCURRENCY,
+    upsert_concurrency: int = UPSERT_CONCURRENCY,
+    slim: bool = False,
+) -> int:
+    """Embed and upsert every chunk in ``data`` not already in ``checkpoint``.
+
+    ``embed`` is an async callable mapping a list of texts to their vectors.
+    With ``slim`` the chunk text is left out of the vector metadata.
+    """
+    pending = [d for d in data if d["id"] not in checkpoint.done]
+    progress = Progress(len(data), len(data) - len(pending))
+    if not pending:
+        print("Nothing to do: every chunk is already checkpointed.")
+        return 0
+
+    size = AdaptiveBatchSize(batch_size, min(MIN_BATCH_SIZE, batch_size))
+    cursor = 0
+    upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=upsert_concurrency * 2)
+
+    def next_batch() -> list[dict]:
+        nonlocal cursor
+        batch = pending[cursor:cursor + size.value]
+        cursor += len(batch)
+        return batch
+
+    async def embed_worker():
+        while True:
+            batch = next_batch()
+            if not batch:
+                return
+            texts = [d["text"] for d in batch]
+            embeddings = await with_retries(
+                lambda: embed(texts),
+                label=f"embed[{len(batch)}]",
+                on_rate_limit=size.shrink,
+            )
+            size.grow()
+            vectors = [
+                {"id": d["id"], "values": e,
+                 "metadata": d["metadata"] if slim else {**d["metadata"], "text": d["text"]}}
+                for d, e in zip(batch, embeddings)
+            ]
+            await upsert_queue.put(vectors)
+
+    async def upsert_worker():
+        while True:
+            vectors = await upsert_queue.get()
+            try:
+                if vectors is None:
+                    return
+                await with_retries(
+                    lambda: asyncio.to_thread(index.upsert, vectors=vectors),
+                    label=f"upsert[{len(vectors)}]",
+                )
+                checkpoint.mark([v["id"] for v in vectors])
+                progress.advance(len(vectors), size.value)
+            finally:
+                upsert_queue.task_done()
+
+    async def produce():
+        await asyncio.gather(*(embed_worker() for _ in range(embed_concurrency)))
+        for _ in range(upsert_concurrency):
+            await upsert_queue.put(None)
+
+    # one gather so a failure on either side surfaces (and cancels the rest)
+    tasks = [asyncio.create_task(produce())]
+    tasks += [asyncio.create_task(upsert_worker()) for _ in range(upsert_concurrency)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return progress.done
+
+
+def publish_texts(data: list[dict], index_name: str, redis_url: str) -> None:
+    """Copy chunk texts to Redis for slim-metadata retrieval."""
+    import redis
+
+    from app.chunk_store import REDIS_TEXT_KEY
+
+    client = redis.from_url(redis_url)
+    for i in range(0, len(data), PUBLISH_BATCH_SIZE):
+        pipe = client.pipeline(transaction=False)
+        for d in data[i:i + PUBLISH_BATCH_SIZE]:
+            pipe.set(REDIS_TEXT_KEY.format(index=index_name, id=d["id"]), d["text"])
+        pipe.execute()
+    print(f"Published {len(data)} chunk texts to Redis.")
+
+
+def corpus_version(data: list[dict]) -> str:
+    """Digest of every chunk id and fingerprint; changes whenever the index content does."""
+    digest = hashlib.sha256()
+    for d in sorted(data, key=lambda d: d["id"]):
+        digest.update(f"{d['id']}\0{d['fingerprint']}\0".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def publish_corpus_version(data: list[dict], index_name: str, redis_url: str) -> None:
+    """Record the index's corpus version; FAQ sets built against an older one stop being served."""
+    import redis
+
+    from app.chunk_store import CORPUS_VERSION_KEY
+
+    version = corpus_version(data)
+    redis.from_url(redis_url).set(CORPUS_VERSION_KEY.format(index=index_name), version)
+    print(f"Published corpus version {version} for {index_name}.")
+
+
+def get_index(pc: Pinecone, name: str, dimension: int = EMBEDDING_DIM):
+    if not pc.has_index(name):
+        pc.create_index(
+            name=name,
+            dimension=dimension,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
+    return pc.Index(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", default=CHUNKS_PATH,
+                        help="directory of chunk JSON files or a .chunks store (build_chunk_store.py)")
+    parser.add_argument("--index", default=INDEX_NAME)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--embed-concurrency", type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument("--upsert-concurrency", type=int, default=UPSERT_CONCURRENCY)
+    parser.add_argument("--checkpoint", help=f"defaults to {CHECKPOINT_PATH}.<index>")
+    parser.add_argument("--restart", action="store_true", help="ignore and overwrite an existing checkpoint")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only embed new/changed chunks and delete removed ones, per the manifest")
+    parser.add_argument("--manifest", help=f"defaults to {MANIFEST_DIR}/<index>.json")
+    parser.add_argument("--dry-run", action="store_true", help="report the manifest diff and exit")
+    parser.add_argument("--no-dedup", action="store_true", help="keep near-duplicate chunks")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                        help="estimated Jaccard similarity at which chunks count as duplicates")
+    parser.add_argument("--slim-metadata", action="store_true",
+                        help="store ids and filter fields only; text is hydrated from a chunk store/Redis")
+    parser.add_argument("--publish-redis", action="store_true",
+                        help="with --slim-metadata, also write chunk texts to REDIS_URL")
+    parser.add_argument("--query", help="run a sample query after upserting")
+    args = parser.parse_args()
+
+    data = load_chunks(args.chunks)
+    print(f"Loaded {len(data)} chunks.")
+    if not args.no_dedup:
+        data, dedup = dedup_chunks(data, args.dedup_threshold)
+        for d in data:
+            # canonical chunks gained duplicate references
+            d["fingerprint"] = fingerprint(d["text"], d["metadata"])
+        print(f"Dedup: {dedup.summary()}")
+
+    manifest_path = args.manifest or os.path.join(MANIFEST_DIR, f"{args.index}.json")
+    diff = diff_manifest(data, load_manifest(manifest_path), args.model, args.slim_metadata)
+    print(f"Manifest diff: {describe_diff(diff)}")
+    if args.dry_run:
+        return
+    to_embed = diff["new"] + diff["changed"] if args.incremental else data
+
+    if args.slim_metadata and args.publish_redis:
+        publish_texts(data, args.index, os.environ["REDIS_URL"])
+
+    embed, dimension = make_embedder(args.model)
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    index = get_index(pc, args.index, dimension)
+
+    checkpoint_path = args.checkpoint or f"{CHECKPOINT_PATH}.{args.index}"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+    if args.incremental:
+        # changed chunks keep their id, so a stale checkpoint must not hide them
+        checkpoint.done.intersection_update(d["id"] for d in diff["new"])
+
+    start = time.perf_counter()
+    try:
+        done = asyncio.run(ingest(
+            to_embed, index, embed, checkpoint,
+            batch_size=args.batch_size,
+            embed_concurrency=args.embed_concurrency,
+            upsert_concurrency=args.upsert_concurrency,
+            slim=args.slim_metadata,
+        ))
+    finally:
+        checkpoint.close()
+    elapsed = time.perf_counter() - start
+    print(f"🎉 Upserted {done} chunks in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.1f} chunks/s)")
+
+    if args.incremental and diff["removed"]:
+        for i in range(0, len(diff["removed"]), DELETE_BATCH_SIZE):
+            index.delete(ids=diff["removed"][i:i + DELETE_BATCH_SIZE])
+        print(f"Deleted {len(diff['removed'])} stale vectors.")
+    save_manifest(manifest_path, build_manifest(data, args.model, args.slim_metadata))
+    if os.getenv("REDIS_URL"):
+        publish_corpus_version(data, args.index, os.environ["REDIS_URL"])
+    # the manifest now records this run, so the checkpoint has done its job
+    os.remove(checkpoint_path)
+
+    if args.query:
+        # fresh client: the ingest one is bound to the finished event loop
+        query_embedder, _ = make_embedder(args.model)
+        query_embed = asyncio.run(query_embedder([args.query]))[0]
+        results = index.query(vector=query_embed, top_k=3, include_metadata=True)
+        print("\nTop results:")
+        for match in results["matches"]:
+            print(f"Score: {match['score']:.4f}")
+            print(f"Metadata: {match['metadata']}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""Offline retrieval evaluation: recall@k / MRR against latency, context size and cost.
+
+Runs a client's golden question set against retrieval backends over a local
+chunk store (``build_chunk_store.py``) and reports, per backend and ``k``:
+recall@k, MRR, context tokens sent to the LLM, retrieval latency percentiles
+and an estimated cost per query.
+
+Golden sets live in ``data/golden/<client>.jsonl``, one question per line::
+
+    {"question": "Can I park overnight in winter?",
+     "relevant": ["section:3-4-1", "text:overnight parking", "source:Chapter 3-4 Traffic"]}
+
+A ``relevant`` target is matched by chunk id (no prefix or ``id:``), by
+``source:``/``section:`` equality, or by a ``text:`` substring, so one golden
+set works across stores built with different chunk sizes. A question's
+recall@k is the share of its targets matched by any of the top k chunks.
+
+Backends:
+
+- ``dense``   exact cosine search with the client's (or ``--model``) embeddings,
+              i.e. what the Pinecone index returns, minus the network hop;
+- ``bm25``    lexical BM25 over the same chunks;
+- ``hybrid``  reciprocal-rank fusion of the two.
+
+Embeddings for chunks and questions come from a cache under ``--cache-dir``,
+so evaluation needs no network. Fill it once with ``--fill-cache``:
+
+    python scripts/eval_retrieval.py ordinance --store data/corpus.chunks --fill-cache
+    python scripts/eval_retrieval.py ordinance --store data/corpus.chunks \\
+        --backend dense --backend bm25 --backend hybrid --k 1 3 5 10 --out eval.json
+
+Pass ``--store`` several times to compare chunkings, and ``--model`` several
+times to compare embedding models.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.chunk_store import ChunkStore  # noqa: E402
+from app.client_config import CLIENT_CONFIG  # noqa: E402
+
+GOLDEN_DIR = os.path.join("data", "golden")
+CACHE_DIR = os.path.join("data", "eval_cache")
+DEFAULT_KS = (1, 3, 5, 10)
+EMBED_BATCH_SIZE = 100
+RRF_K = 60
+
+# USD per 1K tokens (list prices; adjust as they change)
+EMBEDDING_PRICES = {
+    "text-embedding-ada-002": 0.0001,
+    "text-embedding-3-small": 0.00002,
+    "text-embedding-3-large": 0.00013,
+}
+LLM_INPUT_PRICES = {
+    "gpt-3.5-turbo": 0.0005,
+    "gpt-4o-mini": 0.00015,
+    "gpt-4o": 0.0025,
+    "gpt-4.1-mini": 0.0004,
+}
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+# === Golden sets / relevance ===
+def load_golden(path: str) -> list[dict]:
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                items.append(json.loads(line))
+    return items
+
+
+def matches_target(target: str, record: dict) -> bool:
+    kind, _, value = target.partition(":")
+    if not value:
+        kind, value = "id", target
+    if kind == "id":
+        return record["id"] == value
+    if kind == "source":
+        return record.get("source") == value
+    if kind == "section":
+        return record.get("section") == value
+    if kind == "text":
+        return value.lower() in record["text"].lower()
+    raise ValueError(f"Unknown relevance target {target!r}")
+
+
+def score_query(targets: list[str], ranked: list[dict], ks) -> dict:
+    """recall@k for each k, and reciprocal rank of the first relevant chunk."""
+    first_hit = {}
+    for rank, record in enumerate(ranked, start=1):
+        for target in targets:
+            if target not in first_hit and matches_target(target, record):
+                first_hit[target] = rank
+    recall = {
+        k: (sum(1 for r in first_hit.values() if r <= k) / len(targets)) if targets else 0.0
+        for k in ks
+    }
+    rr = 1.0 / min(first_hit.values()) if first_hit else 0.0
+    return {"recall": recall, "rr": rr}
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+# === Embedding cache ===
+def _text_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Normalized embeddings per (model, text), stored as one ``.npz`` per model."""
+
+    def __init__(self, cache_dir: str, model: str):
+        import numpy as np
+
+        self.np = np
+        self.model = model
+        self.path = os.path.join(cache_dir, re.sub(r"[^\w.-]+", "_", model) + ".npz")
+        self._vectors: dict[str, object] = {}
+        if os.path.exists(self.path):
+            data = np.load(self.path)
+            self._vectors = dict(zip(data["keys"].tolist(), data["vectors"]))
+        self._dirty = False
+
+    def missing(self, texts: list[str]) -> list[str]:
+        return list(dict.fromkeys(t for t in texts if _text_key(self.model, t) not in self._vectors))
+
+    def add(self, texts: list[str], vectors: list[list[float]]) -> None:
+        for text, vector in zip(texts, vectors):
+            v = self.np.asarray(vector, dtype=self.np.float32)
+            self._vectors[_text_key(self.model, text)] = v / (self.np.linalg.norm(v) or 1.0)
+        self._dirty = True
+
+    def matrix(self, texts: list[str]):
+        return self.np.stack([self._vectors[_text_key(self.model, t)] for t in texts])
+
+    def vector(self, text: str):
+        return self._vectors[_text_key(self.model, text)]
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        keys = list(self._vectors)
+        tmp = self.path + ".tmp.npz"
+        self.np.savez(tmp, keys=self.np.array(keys), vectors=self.np.stack([self._vectors[k] for k in keys]))
+        os.replace(tmp, self.path)
+
+
+async def fill_cache(cache: EmbeddingCache, texts: list[str], api_key: str | None) -> int:
+    """Embed every text not yet cached (needs network for API models)."""
+    from embed_upsert import make_embedder, with_retries
+
+    todo = cache.missing(texts)
+    if not todo:
+        return 0
+    embed, _ = make_embedder(cache.model, api_key=api_key)
+    for i in range(0, len(todo), EMBED_BATCH_SIZE):
+        batch = todo[i:i + EMBED_BATCH_SIZE]
+        cache.add(batch, await with_retries(lambda: embed(batch), label=f"embed[{len(batch)}]"))
+        print(f"  cached {min(i + EMBED_BATCH_SIZE, len(todo))}/{len(todo)} embeddings for {cache.model}")
+    cache.save()
+    return len(todo)
+
+
+# === Backends ===
+class DenseBackend:
+    def __init__(self, records: list[dict], cache: EmbeddingCache):
+        missing = cache.missing([r["text"] for r in records])
+        if missing:
+            raise SystemExit(f"{len(missing)} chunk embeddings for {cache.model} are not cached; run with --fill-cache")
+        self.name = f"dense[{cache.model}]"
+        self.records = records
+        self.cache = cache
+        self.matrix = cache.matrix([r["text"] for r in records])
+
+    def search(self, question: str, k: int) -> list[dict]:
+        np = self.cache.np
+        scores = self.matrix @ self.cache.vector(question)
+        k = min(k, len(self.records))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [self.records[i] for i in top[np.argsort(-scores[top])]]
+
+
+class BM25Backend:
+    name = "bm25"
+
+    def __init__(self, records: list[dict], k1: float = 1.5, b: float = 0.75):
+        self.records = records
+        self.k1, self.b = k1, b
+        self.docs = [Counter(_TOKEN_RE.findall(r["text"].lower())) for r in records]
+        self.lengths = [sum(d.values()) for d in self.docs]
+        self.avg_len = sum(self.lengths) / max(len(self.lengths), 1)
+        df = Counter(term for d in self.docs for term in d)
+        n = len(self.docs)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+        self.postings: dict[str, list[int]] = {}
+        for i, d in enumerate(self.docs):
+            for term in d:
+                self.postings.setdefault(term, []).append(i)
+
+    def search(self, question: str, k: int) -> list[dict]:
+        scores: dict[int, float] = {}
+        for term in set(_TOKEN_RE.findall(question.lower())):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i in self.postings[term]:
+                tf = self.docs[i][term]
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_len)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / norm
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [self.records[i] for i in best]
+
+
+class HybridBackend:
+    def __init__(self, dense: DenseBackend, lexical: BM25Backend, depth: int = 50):
+        self.name = f"hybrid[{dense.cache.model}]"
+        self.dense, self.lexical, self.depth = dense, lexical, depth
+
+    def search(self, question: str, k: int) -> list[dict]:
+        fused: dict[str, float] = {}
+        by_id = {}
+        for backend in (self.dense, self.lexical):
+            for rank, record in enumerate(backend.search(question, self.depth)):
+                fused[record["id"]] = fused.get(record["id"], 0.0) + 1.0 / (RRF_K + rank + 1)
+                by_id[record["id"]] = record
+        return [by_id[i] for i in sorted(fused, key=fused.get, reverse=True)[:k]]
+
+
+# === Evaluation ===
+_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    global _encoder
+    if _encoder is None:
+        try:
+            from chunk_texts import get_encoder
+
+            _encoder = get_encoder()
+        except Exception as e:
+            # no tiktoken, or its encoding isn't cached and there is no network
+            print(f"Token counts are estimated (~4 characters per token): {e!r}")
+            _encoder = False
+    return len(_encoder.encode(text)) if _encoder else max(1, len(text) // 4)
+
+
+def record_tokens(record: dict) -> int:
+    """Tokens in a chunk, from the store when it recorded them."""
+    return record.get("token_count") or count_tokens(record["text"])
+
+
+def evaluate(backend, golden: list[dict], ks, embedding_model: str | None, llm_model: str) -> dict:
+    max_k = max(ks)
+    latencies, rrs = [], []
+    recalls = {k: [] for k in ks}
+    context_tokens = {k: [] for k in ks}
+    query_tokens = []
+    for item in golden:
+        t0 = time.perf_counter()
+        ranked = backend.search(item["question"], max_k)
+        latencies.append(time.perf_counter() - t0)
+        scored = score_query(item.get("relevant", []), ranked, ks)
+        rrs.append(scored["rr"])
+        for k in ks:
+            recalls[k].append(scored["recall"][k])
+            context_tokens[k].append(sum(record_tokens(r) for r in ranked[:k]))
+        query_tokens.append(count_tokens(item["question"]))
+
+    n = len(golden)
+    embed_price = EMBEDDING_PRICES.get(embedding_model, 0.0) if embedding_model else 0.0
+    llm_price = LLM_INPUT_PRICES.get(llm_model, 0.0)
+    mean_query_tokens = sum(query_tokens) / n
+    per_k = {}
+    for k in ks:
+        mean_context = sum(context_tokens[k]) / n
+        per_k[str(k)] = {
+            "recall": round(sum(recalls[k]) / n, 4),
+            "context_tokens_mean": round(mean_context, 1),
+            "context_tokens_max": max(context_tokens[k]),
+            # query embedding + the retrieved context as LLM input
+            "est_cost_per_query_usd": round(
+                mean_query_tokens / 1000 * embed_price + mean_context / 1000 * llm_price, 6
+            ),
+        }
+    return {
+        "backend": backend.name,
+        "queries": n,
+        "mrr": round(sum(rrs) / n, 4),
+        "latency_ms": {
+            f"p{int(q * 100)}": round(percentile(latencies, q) * 1000, 3) for q in (0.5, 0.95, 0.99)
+        },
+        "k": per_k,
+    }
+
+
+def print_report(result: dict, store: str) -> None:
+    lat = result["latency_ms"]
+    print(f"\n{result['backend']} on {store}: MRR {result['mrr']:.3f}, "
+          f"latency p50 {lat['p50']} ms / p95 {lat['p95']} ms / p99 {lat['p99']} ms")
+    print(f"  {'k':>3}  {'recall':>7}  {'ctx tokens':>10}  {'$/query':>10}")
+    for k, row in result["k"].items():
+        print(f"  {k:>3}  {row['recall']:>7.3f}  {row['context_tokens_mean']:>10.1f}  "
+              f"{row['est_cost_per_query_usd']:>10.6f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("client", help="client id from app/client_config.py")
+    parser.add_argument("--golden", help=f"golden JSONL (defaults to {GOLDEN_DIR}/<client>.jsonl)")
+    parser.add_argument("--store", action="append", help="chunk store(s) to evaluate (default: client's chunk_store_path)")
+    parser.add_argument("--backend", action="append", choices=["dense", "bm25", "hybrid"])
+    parser.add_argument("--model", action="append", help="embedding model(s) for dense/hybrid (default: client's)")
+    parser.add_argument("--k", type=int, nargs="+", default=list(DEFAULT_KS))
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--fill-cache", action="store_true", help="embed uncached chunks/questions (uses the network)")
+    parser.add_argument("--out", help="write all results as JSON")
+    args = parser.parse_args()
+
+    config = CLIENT_CONFIG.get(args.client)
+    if config is None:
+        parser.error(f"unknown client {args.client!r}")
+    golden = load_golden(args.golden or os.path.join(GOLDEN_DIR, f"{args.client}.jsonl"))
+    stores = args.store or ([config["chunk_store_path"]] if config.get("chunk_store_path") else [])
+    if not stores:
+        parser.error("no --store given and the client has no chunk_store_path")
+    backends = args.backend or ["dense"]
+    models = args.model or [config["embedding_model"]]
+    ks = sorted(set(args.k))
+    print(f"{len(golden)} golden questions for {args.client}; configured max_chunks={config.get('max_chunks')}")
+
+    results = []
+    for store_path in stores:
+        with ChunkStore(store_path) as store:
+            records = list(store)
+        lexical = BM25Backend(records) if {"bm25", "hybrid"} & set(backends) else None
+        if "bm25" in backends:
+            results.append({"store": store_path, **evaluate(lexical, golden, ks, None, config["gpt_model"])})
+            print_report(results[-1], store_path)
+        if not {"dense", "hybrid"} & set(backends):
+            continue
+        for model in models:
+            cache = EmbeddingCache(args.cache_dir, model)
+            texts = [r["text"] for r in records] + [g["question"] for g in golden]
+            if args.fill_cache:
+                added = asyncio.run(fill_cache(cache, texts, config.get("openai_api_key")))
+                print(f"Embedded {added} new texts with {model}")
+            elif cache.missing([g["question"] for g in golden]):
+                raise SystemExit(f"question embeddings for {model} are not cached; run with --fill-cache")
+            dense = DenseBackend(records, cache)
+            for name, backend in (("dense", dense), ("hybrid", HybridBackend(dense, lexical) if lexical else None)):
+                if name in backends:
+                    results.append({"store": store_path, **evaluate(backend, golden, ks, model, config["gpt_model"])})
+                    print_report(results[-1], store_path)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"client": args.client, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Measure what a cold import of the app costs, and enforce a budget.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter,
+then reports the slowest modules by cumulative and self time. It fails if the
+total exceeds ``--budget-ms`` or if any module that should load lazily
+(``HEAVY_MODULES``) was imported at boot.
+
+    python scripts/import_time.py main --top 25
+    python scripts/import_time.py main --budget-ms 1500 --json data/import_time.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Must not be imported by ``import main``; they load on first use or in warmup
+HEAVY_MODULES = (
+    "langchain_openai",
+    "openai",
+    "langchain_pinecone",
+    "pinecone",
+    "langchain.chains",
+    "tiktoken",
+    "sentence_transformers",
+    "transformers",
+    "torch",
+    "numpy",
+)
+# Settings ``import main`` needs; dummies are enough since nothing connects at import
+IMPORT_ENV = {"REDIS_URL": "redis://localhost:6379/0"}
+
+
+def parse_importtime(output: str) -> list[dict]:
+    """Parse ``-X importtime`` stderr into ``{module, self_us, cumulative_us, depth}`` rows."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append({
+                "module": name.strip(),
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            })
+        except ValueError:
+            continue
+    return rows
+
+
+def measure(module: str, python: str = sys.executable) -> list[dict]:
+    env = {**IMPORT_ENV, **os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")]))}
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["no output"]
+        raise RuntimeError(f"import {module} failed: {tail[0]}")
+    return parse_importtime(proc.stderr)
+
+
+def total_ms(rows: list[dict]) -> float:
+    return sum(r["cumulative_us"] for r in rows if r["depth"] == 0) / 1000.0
+
+
+def heavy_imports(rows: list[dict], heavy=HEAVY_MODULES) -> list[str]:
+    """Top-level heavy packages that appear anywhere in ``rows``."""
+    found = []
+    for name in heavy:
+        if any(r["module"] == name or r["module"].startswith(name + ".") for r in rows):
+            found.append(name)
+    return found
+
+
+def check(rows: list[dict], budget_ms: float | None = None, heavy=HEAVY_MODULES) -> list[str]:
+    problems = [f"{name} is imported at startup; load it lazily" for name in heavy_imports(rows, heavy)]
+    total = total_ms(rows)
+    if budget_ms is not None and total > budget_ms:
+        problems.append(f"import took {total:.0f} ms, budget is {budget_ms:.0f} ms")
+    return problems
+
+
+def report(rows: list[dict], top: int) -> None:
+    print(f"{len(rows)} modules, {total_ms(rows):.0f} ms total")
+    print(f"\n{'cumulative ms':>14} {'self ms':>9}  module")
+    for r in sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:top]:
+        print(f"{r['cumulative_us'] / 1000:14.1f} {r['self_us'] / 1000:9.1f}  {'  ' * r['depth']}{r['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--budget-ms", type=float, help="fail if the whole import takes longer")
+    parser.add_argument("--json", help="also write every row to this file")
+    args = parser.parse_args()
+
+    try:
+        rows = measure(args.module)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    report(rows, args.top)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"module": args.module, "total_ms": total_ms(rows), "modules": rows}, f, indent=2)
+
+    problems = check(rows, args.budget_ms)
+    for problem in problems:
+        print(f"  ✗ {problem}")
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""Run ingestion end to end: crawl -> clean -> chunk -> embed -> upsert.
+
+Stages are connected by bounded asyncio queues, so documents stream through:
+the first pages are being embedded while the crawler is still fetching. Each
+stage has its own worker count, and a full downstream queue pauses the stages
+above it instead of buffering the whole site in memory.
+
+The target index, embedding model and API keys come from the client's entry
+in ``app/client_config.py``:
+
+    python scripts/pipeline.py maximos --sitemap https://example.com/sitemap.xml
+    python scripts/pipeline.py ordinance --input data/raw --embed-concurrency 8
+
+``--input`` skips the crawler and reads a directory of ``.txt``/``.md`` files
+or crawler ``.json`` output instead. Crawls use ``sitemap_extract.Crawler``
+with an HTTP cache under the state directory, so pages that answer ``304``
+and are already indexed never reach the later stages.
+
+Progress is checkpointed per stage under ``--state-dir``: a document is
+recorded once every one of its chunks is upserted (the crawl stage skips it
+next time), and upserted chunk ids are recorded as they land (the embed stage
+skips them), so an interrupted run resumes where it stopped. Between chunking
+and embedding, near-duplicate chunks are dropped (``dedup.py``) and listed
+against their canonical chunk in ``duplicates.json``. Per-stage
+throughput is printed while running and written to ``stats.json`` at the end.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from pinecone import Pinecone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import chunk_texts  # noqa: E402
+import embed_upsert  # noqa: E402
+import sitemap_extract  # noqa: E402
+from dedup import THRESHOLD as DEDUP_THRESHOLD, Deduplicator  # noqa: E402
+from app.client_config import CLIENT_CONFIG  # noqa: E402
+
+# === CONFIG ===
+STATE_DIR = os.path.join("data", "pipeline")
+QUEUE_SIZE = 64            # items buffered between two stages
+CRAWL_CONCURRENCY = 16
+CLEAN_CONCURRENCY = 2
+CHUNK_CONCURRENCY = 2
+EMBED_CONCURRENCY = embed_upsert.EMBED_CONCURRENCY
+UPSERT_CONCURRENCY = embed_upsert.UPSERT_CONCURRENCY
+BATCH_LINGER = 0.5         # seconds a partial embed batch waits for more chunks
+MIN_TEXT_LENGTH = sitemap_extract.MIN_TEXT_LENGTH
+REPORT_INTERVAL = 5.0
+
+_DONE = object()
+
+
+# === STAGE RUNTIME ===
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.busy = 0.0
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def as_dict(self) -> dict:
+        elapsed = self.elapsed
+        return {
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "busy_seconds": round(self.busy, 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(self.items_in / elapsed, 3) if elapsed else None,
+        }
+
+
+class Stage:
+    """Pull items from ``inbox``, run ``fn`` on them, push results to ``outbox``.
+
+    ``fn`` is an async generator taking one item (or, with ``batch_size``, a
+    list of up to that many items) and yielding zero or more outputs.
+    """
+
+    def __init__(self, name, fn, *, concurrency=1, inbox=None, outbox=None, batch_size=None):
+        self.name = name
+        self.fn = fn
+        self.concurrency = concurrency
+        self.inbox = inbox
+        self.outbox = outbox
+        self.batch_size = batch_size
+        self.stats = StageStats(name)
+
+    async def _next(self):
+        item = await self.inbox.get()
+        if item is _DONE or not self.batch_size:
+            return item
+        batch = [item]
+        deadline = time.perf_counter() + BATCH_LINGER
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.inbox.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _DONE:
+                # hand the sentinel on so sibling workers stop too
+                self.inbox.put_nowait(_DONE)
+                break
+            batch.append(item)
+        return batch
+
+    async def _worker(self):
+        while True:
+            item = await self._next()
+            if item is _DONE:
+                self.inbox.put_nowait(_DONE)
+                return
+            self.stats.items_in += len(item) if self.batch_size else 1
+            await self._run(self.fn(item))
+
+    async def _run(self, outputs, is_source=False):
+        t0 = time.perf_counter()
+        async for out in outputs:
+            self.stats.busy += time.perf_counter() - t0
+            self.stats.items_out += 1
+            if is_source:
+                self.stats.items_in += 1
+            if self.outbox is not None:
+                await self.outbox.put(out)
+            t0 = time.perf_counter()
+        self.stats.busy += time.perf_counter() - t0
+
+    async def run(self, source=None):
+        """Run the workers; a source stage passes its generator as ``source``."""
+        self.stats.started = time.perf_counter()
+        try:
+            if source is not None:
+                await self._run(source, is_source=True)
+            else:
+                await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+        finally:
+            self.stats.finished = time.perf_counter()
+        if self.outbox is not None:
+            await self.outbox.put(_DONE)
+
+
+async def report(stages: list[Stage], queues: list[asyncio.Queue]):
+    while True:
+        await asyncio.sleep(REPORT_INTERVAL)
+        parts = []
+        for stage, queue in zip(stages, [None] + queues):
+            rate = stage.stats.items_in / stage.stats.elapsed if stage.stats.elapsed else 0.0
+            depth = f" q={queue.qsize()}" if queue is not None else ""
+            parts.append(f"{stage.name} {stage.stats.items_out} ({rate:.1f}/s{depth})")
+        print(" | ".join(parts))
+
+
+# === CHECKPOINTS ===
+class PipelineState:
+    """Per-stage checkpoints and per-document completion tracking."""
+
+    def __init__(self, state_dir: str, restart: bool = False):
+        os.makedirs(state_dir, exist_ok=True)
+        self.state_dir = state_dir
+        paths = {
+            "documents": os.path.join(state_dir, "documents.done"),
+            "chunks": os.path.join(state_dir, "chunks.done"),
+        }
+        if restart:
+            for path in paths.values():
+                if os.path.exists(path):
+                    os.remove(path)
+        self.documents = embed_upsert.Checkpoint(paths["documents"])
+        self.chunks = embed_upsert.Checkpoint(paths["chunks"])
+        self._remaining: dict[str, int] = {}
+
+    def expect(self, source: str, chunk_ids: list[str]) -> list[str]:
+        """Register a document's chunks; returns the ids still to upsert."""
+        pending = [i for i in chunk_ids if i not in self.chunks.done]
+        if pending:
+            self._remaining[source] = len(pending)
+        else:
+            self.documents.mark([source])
+        return pending
+
+    def upserted(self, vectors: list[dict]) -> None:
+        self.chunks.mark([v["id"] for v in vectors])
+        self.settle(vectors)
+
+    def settle(self, records: list[dict]) -> None:
+        """Count chunks as handled toward completing their documents."""
+        finished = []
+        for v in records:
+            source = v["metadata"]["url"]
+            self._remaining[source] -= 1
+            if not self._remaining[source]:
+                del self._remaining[source]
+                finished.append(source)
+        if finished:
+            self.documents.mark(finished)
+
+    def close(self) -> None:
+        self.documents.close()
+        self.chunks.close()
+
+
+# === STAGES ===
+def crawl_source(args, state: PipelineState, crawler):
+    """Async generator of pages (``url``, ``body``) or, for ``--input``, parsed documents."""
+
+    async def from_directory():
+        for path in chunk_texts.find_inputs(args.input):
+            if path in state.documents.done:
+                continue
+            paragraphs = await asyncio.to_thread(lambda: list(chunk_texts.iter_paragraphs(path)))
+            yield {"url": path, "title": os.path.splitext(os.path.basename(path))[0], "paragraphs": paragraphs}
+
+    async def from_sitemap():
+        urls = await crawler.sitemap_urls(args.sitemap)
+        print(f"Crawling {len(urls)} pages")
+        async for result in crawler.crawl(urls, concurrency=args.crawl_concurrency):
+            # 304 means unchanged since it was cached; only skip it if it also made it into the index
+            if result.not_modified and result.url in state.documents.done:
+                continue
+            yield {"url": result.url, "body": result.body}
+
+    return from_directory() if args.input else from_sitemap()
+
+
+def make_clean_stage(crawler):
+    async def clean(page: dict):
+        if "paragraphs" in page:
+            yield page
+            return
+        text = await crawler.clean(page["body"])
+        if text and len(text) > MIN_TEXT_LENGTH:
+            yield {
+                "url": page["url"],
+                "title": page["url"],
+                "paragraphs": list(chunk_texts.iter_paragraphs_from_lines(text.splitlines())),
+            }
+
+    return clean
+
+
+def make_chunk_stage(args, state: PipelineState):
+    async def chunk(doc: dict):
+        chunks = await asyncio.to_thread(lambda: list(chunk_texts.iter_chunks(
+            doc["paragraphs"], args.max_tokens, args.overlap,
+        )))
+        seen, records = {}, {}
+        for i, c in enumerate(chunks):
+            chunk_id = embed_upsert.content_id(doc["url"], c["text"], seen)
+            records[chunk_id] = {
+                "id": chunk_id,
+                "text": c["text"],
+                "metadata": {
+                    "source": doc["title"],
+                    "url": doc["url"],
+                    "chunk_id": i,
+                    "token_count": c["token_count"],
+                    "section": c["section"] or "",
+                    "section_title": c["section_title"] or "",
+                },
+            }
+        for chunk_id in state.expect(doc["url"], list(records)):
+            yield records[chunk_id]
+
+    return chunk
+
+
+def make_dedup_stage(dedup: Deduplicator, state: PipelineState, duplicates: dict):
+    async def drop_duplicates(record: dict):
+        signature = await asyncio.to_thread(dedup.hasher.signature, record["text"])
+        canonical = dedup.check(record["id"], record["text"], signature)
+        if canonical is None:
+            yield record
+            return
+        duplicates.setdefault(canonical, []).append({"id": record["id"], "url": record["metadata"]["url"]})
+        state.settle([record])
+
+    return drop_duplicates
+
+
+def make_embed_stage(embed, size: embed_upsert.AdaptiveBatchSize):
+    async def embed_batch(batch: list[dict]):
+        texts = [d["text"] for d in batch]
+        vectors = await embed_upsert.with_retries(
+            lambda: embed(texts), label=f"embed[{len(batch)}]", on_rate_limit=size.shrink,
+        )
+        size.grow()
+        yield [
+            {"id": d["id"], "values": v, "metadata": {**d["metadata"], "text": d["text"]}}
+            for d, v in zip(batch, vectors)
+        ]
+
+    return embed_batch
+
+
+def make_upsert_stage(index, state: PipelineState):
+    async def upsert(vectors: list[dict]):
+        await embed_upsert.with_retries(
+            lambda: asyncio.to_thread(index.upsert, vectors=vectors),
+            label=f"upsert[{len(vectors)}]",
+        )
+        state.upserted(vectors)
+        yield len(vectors)
+
+    return upsert
+
+
+# === DRIVER ===
+def resolve_client(client_id: str) -> dict:
+    config = CLIENT_CONFIG.get(client_id)
+    if config is None:
+        raise SystemExit(f"Unknown client {client_id!r}; known: {', '.join(sorted(CLIENT_CONFIG))}")
+    return config
+
+
+async def run_pipeline(args, index, embed, state: PipelineState) -> dict:
+    if args.input:
+        return await run_stages(args, index, embed, state, None)
+    crawler = sitemap_extract.Crawler(
+        os.path.join(state.state_dir, "http_cache"), per_host=args.per_host, default_delay=args.delay,
+    )
+    async with crawler:
+        return await run_stages(args, index, embed, state, crawler)
+
+
+async def run_stages(args, index, embed, state: PipelineState, crawler) -> dict:
+    size = embed_upsert.AdaptiveBatchSize(args.batch_size, min(embed_upsert.MIN_BATCH_SIZE, args.batch_size))
+    dedup = None if args.no_dedup else Deduplicator(args.dedup_threshold)
+    duplicates: dict[str, list[dict]] = {}
+    specs = [
+        ("crawl", None, {}),
+        ("clean", make_clean_stage(crawler), {"concurrency": args.clean_concurrency}),
+        ("chunk", make_chunk_stage(args, state), {"concurrency": args.chunk_concurrency}),
+    ]
+    if dedup is not None:
+        # one worker: the LSH index is shared and "first seen" decides the canonical chunk
+        specs.append(("dedup", make_dedup_stage(dedup, state, duplicates), {"concurrency": 1}))
+    specs += [
+        ("embed", make_embed_stage(embed, size),
+         {"concurrency": args.embed_concurrency, "batch_size": args.batch_size}),
+        ("upsert", make_upsert_stage(index, state), {"concurrency": args.upsert_concurrency}),
+    ]
+    queues = [asyncio.Queue(maxsize=QUEUE_SIZE) for _ in specs[1:]]
+    stages = [
+        Stage(name, fn, inbox=queues[i - 1] if i else None, outbox=queues[i] if i < len(queues) else None, **kw)
+        for i, (name, fn, kw) in enumerate(specs)
+    ]
+
+    tasks = [asyncio.create_task(stages[0].run(crawl_source(args, state, crawler)))]
+    tasks += [asyncio.create_task(s.run()) for s in stages[1:]]
+    reporter = asyncio.create_task(report(stages, queues))
+    try:
+        # one gather so a failing stage cancels the rest instead of deadlocking them
+        await asyncio.gather(*tasks)
+    finally:
+        reporter.cancel()
+        for task in tasks:
+            task.cancel()
+    stats = {s.name: s.stats.as_dict() for s in stages}
+    if dedup is not None:
+        print(f"Dedup: {dedup.summary()}")
+        stats["dedup"].update(duplicates=dedup.duplicates, dedup_ratio=round(dedup.ratio, 4))
+        with open(os.path.join(state.state_dir, "duplicates.json"), "w", encoding="utf-8") as f:
+            json.dump(duplicates, f, indent=1)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("client", help="client id from app/client_config.py")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--sitemap", help="sitemap URL to crawl")
+    source.add_argument("--input", help="directory or file of already extracted text")
+    parser.add_argument("--index", help="override the client's pinecone_index_name")
+    parser.add_argument("--state-dir", help=f"defaults to {STATE_DIR}/<index>")
+    parser.add_argument("--restart", action="store_true", help="discard existing checkpoints")
+    parser.add_argument("--max-tokens", type=int, default=chunk_texts.MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=chunk_texts.OVERLAP_TOKENS)
+    parser.add_argument("--batch-size", type=int, default=embed_upsert.BATCH_SIZE)
+    parser.add_argument("--no-dedup", action="store_true", help="keep near-duplicate chunks")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD)
+    parser.add_argument("--crawl-concurrency", type=int, default=CRAWL_CONCURRENCY, help="fetches in flight overall")
+    parser.add_argument("--per-host", type=int, default=sitemap_extract.PER_HOST_CONCURRENCY)
+    parser.add_argument("--delay", type=float, default=sitemap_extract.DEFAULT_CRAWL_DELAY,
+                        help="per-host request spacing when robots.txt sets no Crawl-delay")
+    parser.add_argument("--clean-concurrency", type=int, default=CLEAN_CONCURRENCY)
+    parser.add_argument("--chunk-concurrency", type=int, default=CHUNK_CONCURRENCY)
+    parser.add_argument("--embed-concurrency", type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument("--upsert-concurrency", type=int, default=UPSERT_CONCURRENCY)
+    args = parser.parse_args()
+
+    if args.overlap >= args.max_tokens:
+        parser.error("--overlap must be smaller than --max-tokens")
+
+    config = resolve_client(args.client)
+    index_name = args.index or config["pinecone_index_name"]
+    model = config["embedding_model"]
+    state_dir = args.state_dir or os.path.join(STATE_DIR, index_name)
+    print(f"Ingesting for {args.client} into {index_name} with {model}")
+
+    embed, dimension = embed_upsert.make_embedder(model, api_key=config.get("openai_api_key"))
+    pc = Pinecone(api_key=config.get("pinecone_api_key") or os.getenv("PINECONE_API_KEY"))
+    index = embed_upsert.get_index(pc, index_name, dimension)
+
+    state = PipelineState(state_dir, restart=args.restart)
+    start = time.perf_counter()
+    try:
+        stats = asyncio.run(run_pipeline(args, index, embed, state))
+    finally:
+        state.close()
+    elapsed = time.perf_counter() - start
+
+    stats_path = os.path.join(state_dir, "stats.json")
+    with open(stats_path, "w", encoding="utf-8") as f:
+        json.dump({"client": args.client, "index": index_name, "elapsed_seconds": round(elapsed, 3),
+                   "stages": stats}, f, indent=2)
+    for name, s in stats.items():
+        print(f"{name:>6}: {s['items_in']} in, {s['items_out']} out, {s['items_per_second']}/s, "
+              f"busy {s['busy_seconds']}s")
+    print(f"🎉 Pipeline finished in {elapsed:.1f}s -> {stats_path}")
+
+
+if __name__ == "__main__":
+    main()
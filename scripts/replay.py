@@ -0,0 +1,285 @@
+"""Replay JSONL request logs against a running app instance.
+
+Each log line uses the backlog format (``request_id``, ``title``, ``body``)
+extended with ``timestamp`` (ISO-8601 or epoch seconds) and ``client_id``;
+``chat_id`` and ``endpoint`` (``/chat`` or ``/proxy-chat``) are optional. The
+``body`` is sent as the question.
+
+    python scripts/replay.py logs.jsonl --base-url http://127.0.0.1:8000 \\
+        --api-key ordinance=$ORDINANCE_API_KEY --speed 4 --out run.json
+
+Requests are fired at their original spacing divided by ``--speed`` (or at a
+fixed ``--rate`` per second). ``/metrics`` is scraped before and after the run
+so per-stage latency and Redis commands per request come from the server's own
+histograms. Results are written as JSON so two runs can be diffed.
+"""
+import argparse
+import asyncio
+import json
+import math
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$')
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+# === Log loading ===
+def _parse_timestamp(value) -> float | None:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+def load_requests(path: str) -> list[dict]:
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            entry["_ts"] = _parse_timestamp(entry.get("timestamp"))
+            entries.append(entry)
+    if all(e["_ts"] is not None for e in entries):
+        entries.sort(key=lambda e: e["_ts"])
+    return entries
+
+
+def schedule(entries: list[dict], speed: float, rate: float | None) -> list[float]:
+    """Offsets in seconds from the start of the run at which to send each entry."""
+    if rate:
+        return [i / rate for i in range(len(entries))]
+    if not entries or any(e["_ts"] is None for e in entries):
+        return [0.0] * len(entries)
+    start = entries[0]["_ts"]
+    return [(e["_ts"] - start) / speed for e in entries]
+
+
+# === Prometheus scraping ===
+def parse_metrics(text: str) -> dict:
+    """Parse Prometheus text into ``{(name, frozenset(labels)): value}``."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE_RE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        label_set = frozenset(_LABEL_RE.findall(labels or ""))
+        samples[(name, label_set)] = float(value)
+    return samples
+
+
+def histogram_quantile(q: float, buckets: list[tuple[float, float]]) -> float | None:
+    """Estimate a quantile from cumulative ``(upper_bound, count)`` buckets."""
+    buckets = sorted(buckets)
+    if not buckets or buckets[-1][1] <= 0:
+        return None
+    rank = q * buckets[-1][1]
+    prev_bound, prev_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float("inf"):
+                return prev_bound
+            if count == prev_count:
+                return bound
+            return prev_bound + (bound - prev_bound) * (rank - prev_count) / (count - prev_count)
+        prev_bound, prev_count = bound, count
+    return buckets[-1][0]
+
+
+def stage_summary(before: dict, after: dict) -> dict:
+    """Per-stage count/mean/p50/p95/p99 from the delta of two scrapes."""
+    buckets = defaultdict(list)
+    sums, counts = defaultdict(float), defaultdict(float)
+    name = "axios_stage_duration_seconds"
+    for (metric, labels), value in after.items():
+        if not metric.startswith(name):
+            continue
+        delta = value - before.get((metric, labels), 0.0)
+        label_map = dict(labels)
+        stage = label_map.get("stage", "")
+        if metric == f"{name}_bucket":
+            le = float(label_map["le"].replace("+Inf", "inf"))
+            buckets[(stage, le)].append(delta)
+        elif metric == f"{name}_sum":
+            sums[stage] += delta
+        elif metric == f"{name}_count":
+            counts[stage] += delta
+
+    per_stage = defaultdict(list)
+    for (stage, le), deltas in buckets.items():
+        per_stage[stage].append((le, sum(deltas)))
+
+    result = {}
+    for stage, count in counts.items():
+        if count <= 0:
+            continue
+        result[stage] = {
+            "count": int(count),
+            "mean_ms": round(sums[stage] / count * 1000, 3),
+            **{
+                f"p{int(q * 100)}_ms": _ms(histogram_quantile(q, per_stage[stage]))
+                for q in (0.5, 0.95, 0.99)
+            },
+        }
+    return result
+
+
+def redis_commands(before: dict, after: dict) -> float:
+    total = 0.0
+    for (metric, labels), value in after.items():
+        if metric == "axios_redis_commands_total":
+            total += value - before.get((metric, labels), 0.0)
+    return total
+
+
+# === Load generation ===
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def build_request(entry: dict, api_keys: dict, default_endpoint: str) -> tuple[str, dict, dict]:
+    client_id = entry["client_id"]
+    endpoint = entry.get("endpoint", default_endpoint)
+    payload = {
+        "client_id": client_id,
+        "chat_id": entry.get("chat_id") or f"replay-{entry.get('request_id', 'x')}",
+        "question": entry.get("body") or entry.get("title", ""),
+        "recaptcha_token": "replay",
+    }
+    headers = {"x-request-id": str(entry.get("request_id", ""))}
+    if endpoint == "/chat":
+        headers["x-api-key"] = api_keys.get(client_id, "")
+    return endpoint, payload, headers
+
+
+async def fire(client, entry, offset, start, api_keys, default_endpoint, results, sem):
+    delay = start + offset - time.perf_counter()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    endpoint, payload, headers = build_request(entry, api_keys, default_endpoint)
+    async with sem:
+        t0 = time.perf_counter()
+        try:
+            resp = await client.post(endpoint, json=payload, headers=headers)
+            status = resp.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        results.append({"endpoint": endpoint, "status": status, "latency": time.perf_counter() - t0})
+
+
+async def scrape(client, token: str | None) -> dict:
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    try:
+        resp = await client.get("/metrics", headers=headers)
+        resp.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Could not scrape /metrics: {e}")
+        return {}
+    return parse_metrics(resp.text)
+
+
+async def run(args) -> dict:
+    entries = load_requests(args.log)
+    if args.limit:
+        entries = entries[: args.limit]
+    offsets = schedule(entries, args.speed, args.rate)
+    api_keys = dict(kv.split("=", 1) for kv in args.api_key)
+    results: list[dict] = []
+    sem = asyncio.Semaphore(args.concurrency)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        before = await scrape(client, args.metrics_token)
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            fire(client, e, off, start, api_keys, args.endpoint, results, sem)
+            for e, off in zip(entries, offsets)
+        ))
+        wall = time.perf_counter() - start
+        after = await scrape(client, args.metrics_token)
+
+    per_endpoint = {}
+    grouped = defaultdict(list)
+    for res in results:
+        grouped[res["endpoint"]].append(res)
+    for endpoint, rows in grouped.items():
+        latencies = [r["latency"] for r in rows]
+        errors = [r for r in rows if not (isinstance(r["status"], int) and r["status"] < 400)]
+        status_counts = defaultdict(int)
+        for r in rows:
+            status_counts[str(r["status"])] += 1
+        per_endpoint[endpoint] = {
+            "requests": len(rows),
+            "errors": len(errors),
+            "error_rate": round(len(errors) / len(rows), 4),
+            "status_counts": dict(status_counts),
+            "p50_ms": _ms(percentile(latencies, 0.50)),
+            "p95_ms": _ms(percentile(latencies, 0.95)),
+            "p99_ms": _ms(percentile(latencies, 0.99)),
+            "max_ms": _ms(max(latencies)),
+        }
+
+    return {
+        "log": args.log,
+        "base_url": args.base_url,
+        "speed": args.speed,
+        "rate": args.rate,
+        "requests": len(results),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 3) if wall else None,
+        "endpoints": per_endpoint,
+        "stages": stage_summary(before, after) if before or after else {},
+        "redis_ops_per_request": (
+            round(redis_commands(before, after) / len(results), 3) if results and after else None
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="JSONL request log")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", default="/chat", choices=["/chat", "/proxy-chat"],
+                        help="endpoint for entries without their own 'endpoint' field")
+    parser.add_argument("--api-key", action="append", default=[], metavar="CLIENT=KEY",
+                        help="x-api-key per client for /chat (repeatable)")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression factor for original spacing")
+    parser.add_argument("--rate", type=float, help="ignore timestamps and send this many requests per second")
+    parser.add_argument("--concurrency", type=int, default=64, help="max in-flight requests")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--limit", type=int, help="replay only the first N entries")
+    parser.add_argument("--metrics-token", help="the app's METRICS_TOKEN (/metrics is off without one)")
+    parser.add_argument("--out", default="replay_results.json")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    for endpoint, stats in report["endpoints"].items():
+        print(
+            f"{endpoint}: {stats['requests']} req, p50 {stats['p50_ms']} ms, "
+            f"p95 {stats['p95_ms']} ms, p99 {stats['p99_ms']} ms, errors {stats['error_rate']:.2%}"
+        )
+    print(f"Throughput: {report['throughput_rps']} req/s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
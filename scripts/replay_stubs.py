@@ -0,0 +1,171 @@
+"""Local stand-ins for OpenAI, Pinecone and reCAPTCHA used by load tests.
+
+Run it next to the app and point the app at it:
+
+    python scripts/replay_stubs.py --port 9100 --latency-ms 40
+
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 \\
+    PINECONE_HOST=http://127.0.0.1:9100 \\
+    RECAPTCHA_VERIFY_URL=http://127.0.0.1:9100/recaptcha/api/siteverify \\
+    uvicorn main:app
+
+Responses are deterministic and cheap so the measured latency is the app's own
+overhead plus the configured simulated upstream latency.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_DIM = 1536
+LATENCY = {"openai": 0.0, "pinecone": 0.0, "recaptcha": 0.0}
+ANSWER = (
+    "According to the ordinance, overnight parking on city streets is not "
+    "permitted between 2 a.m. and 6 a.m. from November through March."
+)
+
+app = FastAPI()
+
+
+def _vector(seed: str) -> list[float]:
+    digest = hashlib.sha256(seed.encode("utf-8")).digest()
+    return [(digest[i % len(digest)] - 128) / 128.0 for i in range(EMBEDDING_DIM)]
+
+
+async def _delay(service: str) -> None:
+    if LATENCY[service]:
+        await asyncio.sleep(LATENCY[service])
+
+
+# === OpenAI ===
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    await _delay("openai")
+    inputs = body.get("input")
+    if isinstance(inputs, (str, int)) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    data = []
+    for i, item in enumerate(inputs):
+        vec = _vector(json.dumps(item))
+        if body.get("encoding_format") == "base64":
+            vec = base64.b64encode(struct.pack(f"<{len(vec)}f", *vec)).decode("ascii")
+        data.append({"object": "embedding", "index": i, "embedding": vec})
+    tokens = sum(len(x) if isinstance(x, list) else len(str(x).split()) for x in inputs)
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "text-embedding-ada-002"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await _delay("openai")
+    model = body.get("model", "gpt-3.5-turbo")
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(ANSWER.split()),
+        "total_tokens": prompt_tokens + len(ANSWER.split()),
+    }
+    cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        return {
+            "id": cid,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": ANSWER},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+
+    def chunk(delta, finish=None, **extra):
+        payload = {
+            "id": cid,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if delta is not None else [],
+            **extra,
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def stream():
+        yield chunk({"role": "assistant", "content": ""})
+        for word in ANSWER.split(" "):
+            yield chunk({"content": word + " "})
+        yield chunk({}, finish="stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield chunk(None, usage=usage)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+# === Pinecone data plane ===
+@app.post("/query")
+async def pinecone_query(request: Request):
+    body = await request.json()
+    await _delay("pinecone")
+    top_k = int(body.get("topK", 3))
+    matches = [
+        {
+            "id": f"stub-chunk-{i}",
+            "score": 0.9 - i * 0.05,
+            "values": [],
+            "metadata": {
+                "source": "Stub Ordinance",
+                "filename": "stub.json",
+                "chunk_id": i,
+                "text": f"Section 12-14-{i + 1}. " + "Parking regulations text. " * 30,
+            },
+        }
+        for i in range(top_k)
+    ]
+    return {"matches": matches, "namespace": body.get("namespace", ""), "usage": {"readUnits": 1}}
+
+
+@app.post("/vectors/upsert")
+async def pinecone_upsert(request: Request):
+    body = await request.json()
+    await _delay("pinecone")
+    return {"upsertedCount": len(body.get("vectors", []))}
+
+
+# === reCAPTCHA ===
+@app.post("/recaptcha/api/siteverify")
+async def recaptcha_verify():
+    await _delay("recaptcha")
+    return JSONResponse({"success": True, "score": 0.9, "action": "chat"})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency for every upstream")
+    parser.add_argument("--openai-latency-ms", type=float)
+    parser.add_argument("--pinecone-latency-ms", type=float)
+    parser.add_argument("--recaptcha-latency-ms", type=float)
+    args = parser.parse_args()
+    for service in LATENCY:
+        value = getattr(args, f"{service}_latency_ms")
+        LATENCY[service] = (args.latency_ms if value is None else value) / 1000.0
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -1,16 +1,35 @@
-import requests
-import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
-import os
+"""Crawl every page in a sitemap and save its visible text as JSON.
+
+Pages are fetched concurrently with asyncio (``httpx``), bounded per host and
+spaced by the ``Crawl-delay`` that host's robots.txt asks for. Responses are
+kept in a local HTTP cache (``CACHE_DIR``) together with their ETag and
+Last-Modified headers; the next crawl sends conditional requests, and pages
+answering ``304 Not Modified`` are skipped instead of being re-parsed and
+re-saved. HTML parsing runs in a process pool so BeautifulSoup never blocks
+the event loop, and finished URLs are recorded as they complete so an
+interrupted crawl resumes where it stopped.
+
+    python scripts/sitemap_extract.py https://example.com/sitemap.xml --per-host 4
+"""
+import argparse
+import asyncio
+import hashlib
 import json
+import os
 import time
-from urllib.parse import urlparse, urljoin
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
 from urllib.robotparser import RobotFileParser
 
+import httpx
+from bs4 import BeautifulSoup
+
 # === CONFIGURATION ===
 SITEMAP_URL = 'https://example.com/sitemap.xml'  # 🔁 Replace with your real sitemap URL
 OUTPUT_DIR = './site_text'
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+CACHE_DIR = './site_cache'
+PROGRESS_FILE = '.crawl_progress'
 
 USER_AGENT = "MyRAGBot/1.0 (+https://yourdomain.com/info)"  # Update with your info
 HEADERS = {
@@ -19,115 +38,309 @@ HEADERS = {
 
 NAMESPACE = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
 
-# === Parse robots.txt ===
-def fetch_robots_txt(base_url):
-    parsed = urlparse(base_url)
-    robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
-    rp = RobotFileParser()
-    try:
-        rp.set_url(robots_url)
-        rp.read()
-        print(f"Loaded robots.txt from {robots_url}")
-    except Exception as e:
-        print(f"Failed to load robots.txt: {e}")
-    return rp
-
-def can_fetch_url(rp, url):
-    # Returns True if allowed by robots.txt, False otherwise
-    return rp.can_fetch(USER_AGENT, url)
-
-# === Sitemap parsing functions ===
+PER_HOST_CONCURRENCY = 4   # requests in flight per host
+DEFAULT_CRAWL_DELAY = 0.0  # seconds between requests when robots.txt sets none
+PARSER_WORKERS = os.cpu_count() or 1
+TIMEOUT = 10
+MIN_TEXT_LENGTH = 300
+
+
+class FetchResult:
+    def __init__(self, url, status, body, not_modified=False):
+        self.url = url
+        self.status = status
+        self.body = body
+        self.not_modified = not_modified
+
+
+# === HTTP cache ===
+class FetchCache:
+    """Response bodies plus their validators, one pair of files per URL."""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json"), os.path.join(self.cache_dir, f"{key}.body")
+
+    def get(self, url):
+        meta_path, body_path = self._paths(url)
+        if not (os.path.exists(meta_path) and os.path.exists(body_path)):
+            return None, None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            return meta, f.read()
+
+    def put(self, url, headers, body):
+        meta = {
+            "url": url,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "fetched_at": time.time(),
+        }
+        meta_path, body_path = self._paths(url)
+        # body first: a meta file without its body is treated as a miss
+        for path, data, mode in ((body_path, body, "wb"), (meta_path, json.dumps(meta), "w")):
+            tmp = f"{path}.tmp"
+            with open(tmp, mode, **({} if mode == "wb" else {"encoding": "utf-8"})) as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+    @staticmethod
+    def conditional_headers(meta):
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+
+# === Per-host politeness ===
+class HostPolicy:
+    """robots.txt rules, a concurrency cap and request spacing for one host."""
+
+    def __init__(self, robots, per_host, default_delay):
+        self.robots = robots
+        self.semaphore = asyncio.Semaphore(per_host)
+        delay = robots.crawl_delay(USER_AGENT)
+        self.delay = float(delay) if delay is not None else default_delay
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    def allowed(self, url):
+        return self.robots.can_fetch(USER_AGENT, url)
+
+    async def wait_turn(self):
+        if not self.delay:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.delay
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+# === Parsing (runs in the parser pool) ===
 def get_namespaced_tag(tag):
     return f"{{{NAMESPACE['ns']}}}{tag}"
 
-def fetch_sitemap_urls(sitemap_url, rp):
-    if not can_fetch_url(rp, sitemap_url):
-        print(f"Blocked by robots.txt: {sitemap_url}")
-        return []
 
-    try:
-        r = requests.get(sitemap_url, headers=HEADERS, timeout=10)
-        if r.status_code != 200:
-            print(f"Failed to fetch {sitemap_url}, status code {r.status_code}")
-            return []
+def parse_sitemap(content):
+    """Return the ``<loc>`` entries of a sitemap or sitemap index."""
+    root = ET.fromstring(content)
+    if 'sitemapindex' in root.tag or 'urlset' in root.tag:
+        return [loc.text.strip() for loc in root.findall(".//ns:loc", NAMESPACE) if loc.text]
+    print(f"Unrecognized root tag: {root.tag}")
+    return []
 
-        root = ET.fromstring(r.content)
-        root_tag = root.tag
 
-        if 'sitemapindex' in root_tag:
-            return [loc.text for loc in root.findall(".//ns:loc", NAMESPACE)]
-        elif 'urlset' in root_tag:
-            return [loc.text for loc in root.findall(".//ns:loc", NAMESPACE)]
-        else:
-            print(f"Unrecognized root tag: {root_tag}")
-            return []
-    except Exception as e:
-        print(f"Error parsing sitemap {sitemap_url}: {e}")
-        return []
-
-def resolve_all_page_urls(start_url, rp):
-    urls = fetch_sitemap_urls(start_url, rp)
-    all_page_urls = []
-
-    if not urls:
-        return []
-
-    for url in urls:
-        if url.endswith('.xml'):
-            nested = fetch_sitemap_urls(url, rp)
-            print(f"  ➤ {len(nested)} URLs found in {url}")
-            all_page_urls.extend(nested)
-            time.sleep(1)
-        else:
-            all_page_urls.append(url)
-
-    return all_page_urls
-
-# === Text extraction ===
-def get_clean_text(url, rp):
-    if not can_fetch_url(rp, url):
-        print(f"Blocked by robots.txt: {url}")
-        return None
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=10)
+def clean_html(content):
+    soup = BeautifulSoup(content, "html.parser")
+
+    for tag in soup(["script", "style", "header", "footer", "nav", "aside"]):
+        tag.decompose()
+
+    return soup.get_text(separator="\n", strip=True)
+
+
+# === Crawler ===
+class Crawler:
+    """Async, cache-aware fetcher. Use as ``async with Crawler() as crawler``."""
+
+    def __init__(self, cache_dir=CACHE_DIR, per_host=PER_HOST_CONCURRENCY,
+                 default_delay=DEFAULT_CRAWL_DELAY, parser_workers=PARSER_WORKERS):
+        self.cache = FetchCache(cache_dir)
+        self.per_host = per_host
+        self.default_delay = default_delay
+        self.parser_workers = parser_workers
+        self._hosts: dict[str, asyncio.Future] = {}
+        self._client = None
+        self._pool = None
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(headers=HEADERS, timeout=TIMEOUT, follow_redirects=True)
+        self._pool = ProcessPoolExecutor(max_workers=self.parser_workers)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+        self._pool.shutdown(cancel_futures=True)
+
+    async def _load_robots(self, origin):
+        robots_url = f"{origin}/robots.txt"
+        rp = RobotFileParser(robots_url)
+        try:
+            r = await self._client.get(robots_url)
+            if r.status_code in (401, 403):
+                rp.disallow_all = True
+            elif r.status_code >= 400:
+                rp.allow_all = True
+            else:
+                rp.parse(r.text.splitlines())
+            print(f"Loaded robots.txt from {robots_url}")
+        except httpx.HTTPError as e:
+            print(f"Failed to load robots.txt: {e}")
+            rp.allow_all = True
+        return HostPolicy(rp, self.per_host, self.default_delay)
+
+    async def host(self, url):
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        future = self._hosts.get(origin)
+        if future is None:
+            # concurrent first requests to a host share one robots.txt fetch
+            future = self._hosts[origin] = asyncio.ensure_future(self._load_robots(origin))
+        return await future
+
+    async def fetch(self, url):
+        """GET ``url`` conditionally; ``None`` if disallowed or failed.
+
+        On ``304`` the cached body is returned with ``not_modified`` set.
+        """
+        policy = await self.host(url)
+        if not policy.allowed(url):
+            print(f"Blocked by robots.txt: {url}")
+            return None
+        meta, cached = await asyncio.to_thread(self.cache.get, url)
+        async with policy.semaphore:
+            await policy.wait_turn()
+            try:
+                r = await self._client.get(url, headers=self.cache.conditional_headers(meta))
+            except httpx.HTTPError as e:
+                print(f"Error fetching {url}: {e}")
+                return None
+        if r.status_code == 304 and cached is not None:
+            return FetchResult(url, 304, cached, not_modified=True)
         if r.status_code != 200:
             print(f"Failed to fetch {url}, status code {r.status_code}")
             return None
+        await asyncio.to_thread(self.cache.put, url, r.headers, r.content)
+        return FetchResult(url, 200, r.content)
 
-        soup = BeautifulSoup(r.content, "html.parser")
+    async def parse(self, fn, content):
+        """Run a parsing function in the process pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, content)
 
-        for tag in soup(["script", "style", "header", "footer", "nav", "aside"]):
-            tag.decompose()
+    async def clean(self, content):
+        return await self.parse(clean_html, content)
+
+    async def sitemap_urls(self, sitemap_url):
+        """Every page URL in a sitemap, following nested sitemaps concurrently."""
+        result = await self.fetch(sitemap_url)
+        if result is None:
+            return []
+        try:
+            locs = await self.parse(parse_sitemap, result.body)
+        except ET.ParseError as e:
+            print(f"Error parsing sitemap {sitemap_url}: {e}")
+            return []
+        nested = [u for u in locs if u.endswith('.xml')]
+        pages = [u for u in locs if not u.endswith('.xml')]
+        for sub_url, sub_pages in zip(nested, await asyncio.gather(*(self.sitemap_urls(u) for u in nested))):
+            print(f"  ➤ {len(sub_pages)} URLs found in {sub_url}")
+            pages.extend(sub_pages)
+        return list(dict.fromkeys(pages))
+
+    async def crawl(self, urls, concurrency=None):
+        """Yield ``FetchResult`` for each URL as fetches complete (failures skipped)."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+        todo = iter(urls)
+        done = object()
+
+        async def worker():
+            for url in todo:
+                result = await self.fetch(url)
+                if result is not None:
+                    await queue.put(result)
+
+        async def run_workers():
+            # hosts limit themselves; this only caps total open fetch tasks
+            n = concurrency or self.per_host * 4
+            try:
+                await asyncio.gather(*(worker() for _ in range(n)))
+            finally:
+                await queue.put(done)
+
+        task = asyncio.create_task(run_workers())
+        try:
+            while (item := await queue.get()) is not done:
+                yield item
+            await task
+        finally:
+            task.cancel()
 
-        text = soup.get_text(separator="\n", strip=True)
-        return text
-    except Exception as e:
-        print(f"Error fetching {url}: {e}")
-        return None
 
 # === Save output ===
-def save_to_json(url, text, index):
+def save_to_json(url, text, index, output_dir=OUTPUT_DIR):
     filename = f"{index:04d}.json"
-    filepath = os.path.join(OUTPUT_DIR, filename)
+    filepath = os.path.join(output_dir, filename)
     with open(filepath, "w", encoding="utf-8") as f:
         json.dump({"url": url, "text": text}, f, ensure_ascii=False, indent=2)
 
+
+def load_progress(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
 # === Run the script ===
-def run_full_sitemap_crawl(sitemap_url):
-    rp = fetch_robots_txt(sitemap_url)
+async def run_full_sitemap_crawl(sitemap_url, output_dir=OUTPUT_DIR, cache_dir=CACHE_DIR,
+                                 per_host=PER_HOST_CONCURRENCY, delay=DEFAULT_CRAWL_DELAY, restart=False):
+    os.makedirs(output_dir, exist_ok=True)
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    if restart and os.path.exists(progress_path):
+        os.remove(progress_path)
+    finished = load_progress(progress_path)
+
     print(f"📥 Starting crawl for sitemap: {sitemap_url}")
-    page_urls = resolve_all_page_urls(sitemap_url, rp)
-    print(f"✅ Total page URLs collected: {len(page_urls)}")
-
-    for i, url in enumerate(page_urls):
-        print(f"[{i+1}/{len(page_urls)}] Processing: {url}")
-        text = get_clean_text(url, rp)
-        if text and len(text) > 300:
-            save_to_json(url, text, i)
-        else:
-            print("Skipped (too short, empty, or disallowed)")
-        time.sleep(1)
+    async with Crawler(cache_dir, per_host=per_host, default_delay=delay) as crawler:
+        page_urls = await crawler.sitemap_urls(sitemap_url)
+        print(f"✅ Total page URLs collected: {len(page_urls)}")
+        positions = {url: i for i, url in enumerate(page_urls)}
+        todo = [u for u in page_urls if u not in finished]
+        if finished:
+            print(f"Resuming: {len(page_urls) - len(todo)} pages already done")
+
+        counts = {"saved": 0, "unchanged": 0, "skipped": 0}
+        with open(progress_path, "a", encoding="utf-8") as progress:
+            async for result in crawler.crawl(todo):
+                if result.not_modified:
+                    counts["unchanged"] += 1
+                else:
+                    text = await crawler.clean(result.body)
+                    if text and len(text) > MIN_TEXT_LENGTH:
+                        save_to_json(result.url, text, positions[result.url], output_dir)
+                        counts["saved"] += 1
+                    else:
+                        counts["skipped"] += 1
+                progress.write(result.url + "\n")
+                progress.flush()
+                done = sum(counts.values())
+                if done % 50 == 0:
+                    print(f"[{done}/{len(todo)}] {counts}")
+    # a complete crawl starts from scratch next time (the HTTP cache makes that cheap)
+    os.remove(progress_path)
+    print(f"Done: {counts}")
+
 
 # === Entry point ===
 if __name__ == "__main__":
-    run_full_sitemap_crawl(SITEMAP_URL)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sitemap", nargs="?", default=SITEMAP_URL)
+    parser.add_argument("--out", default=OUTPUT_DIR)
+    parser.add_argument("--cache", default=CACHE_DIR)
+    parser.add_argument("--per-host", type=int, default=PER_HOST_CONCURRENCY)
+    parser.add_argument("--delay", type=float, default=DEFAULT_CRAWL_DELAY,
+                        help="seconds between requests to a host whose robots.txt sets no Crawl-delay")
+    parser.add_argument("--restart", action="store_true", help="ignore progress from an interrupted crawl")
+    args = parser.parse_args()
+    asyncio.run(run_full_sitemap_crawl(
+        args.sitemap, args.out, args.cache, per_host=args.per_host, delay=args.delay, restart=args.restart,
+    ))
@@ -0,0 +1,257 @@
+"""In-process fakes for driving the chat pipeline without external services.
+
+``FakeRedis`` implements the subset of the async Redis API the app uses and
+counts round trips. ``FakeEmbeddings``, ``FakeRetriever``, ``FakeLLM`` and
+``FakeChain`` stand in for OpenAI and Pinecone with a configurable latency so
+benchmarks can model network time without touching the network.
+
+``private_imports`` lets a test file import the real app without changing
+what later test files import.
+"""
+import asyncio
+import contextlib
+import fnmatch
+import sys
+
+
+@contextlib.contextmanager
+def private_imports():
+    """Forget the modules first imported inside the block once it exits.
+
+    The importing test file keeps its references. Files collected after it
+    (``test_config_copy``, ``test_redis_memory``) import afresh, so the
+    ``sys.modules`` stubs they install first still take effect.
+    """
+    before = set(sys.modules)
+    try:
+        yield
+    finally:
+        for name in set(sys.modules) - before:
+            del sys.modules[name]
+
+
+class ResponseError(Exception):
+    """A command-level error reply (e.g. WRONGTYPE)."""
+
+
+class FakePipeline:
+    """Queues commands like a redis-py MULTI/EXEC pipeline.
+
+    Every queued command runs on ``execute``, even after one fails; errors are
+    returned in place of their reply, or the first is raised if ``raise_on_error``.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.command_stack = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.command_stack.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self, raise_on_error=True):
+        self.redis.round_trips += 1
+        results = []
+        for name, args, kwargs in self.command_stack:
+            try:
+                results.append(await getattr(self.redis, "_" + name)(*args, **kwargs))
+            except ResponseError as e:
+                results.append(e)
+        self.command_stack = []
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+
+class FakeRedis:
+    """Async dict-backed Redis stand-in; every public call is one round trip."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.store = {}
+        self.expiry = {}
+        self.round_trips = 0
+
+    def __getattr__(self, name):
+        impl = getattr(type(self), "_" + name, None)
+        if impl is None:
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            self.round_trips += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return await impl(self, *args, **kwargs)
+        return call
+
+    def pipeline(self, *args, **kwargs):
+        return FakePipeline(self)
+
+    async def scan_iter(self, match="*", **kwargs):
+        self.round_trips += 1
+        for key in list(self.store):
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+    # --- strings ---
+    async def _get(self, key):
+        return self.store.get(key)
+
+    async def _mget(self, *keys):
+        if len(keys) == 1 and isinstance(keys[0], (list, tuple)):
+            keys = keys[0]
+        return [self.store.get(k) for k in keys]
+
+    async def _set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value if isinstance(value, str) else str(value)
+        if ex:
+            self.expiry[key] = ex
+        return True
+
+    async def _setex(self, key, ttl, value):
+        return await self._set(key, value, ex=ttl)
+
+    async def _incrby(self, key, amount=1):
+        if not isinstance(self.store.get(key, "0"), str):
+            raise ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        value = int(self.store.get(key, 0)) + amount
+        self.store[key] = str(value)
+        return value
+
+    async def _incr(self, key):
+        return await self._incrby(key, 1)
+
+    async def _expire(self, key, ttl):
+        self.expiry[key] = ttl
+        return True
+
+    async def _ttl(self, key):
+        if key not in self.store:
+            return -2
+        return self.expiry.get(key, -1)
+
+    async def _delete(self, *keys):
+        removed = 0
+        for key in keys:
+            removed += self.store.pop(key, None) is not None
+            self.expiry.pop(key, None)
+        return removed
+
+    # --- lists ---
+    async def _rpush(self, key, *values):
+        lst = self.store.setdefault(key, [])
+        lst.extend(values)
+        return len(lst)
+
+    async def _lrange(self, key, start, end):
+        lst = self.store.get(key, [])
+        end = None if end == -1 else end + 1
+        return lst[start:end]
+
+    async def _llen(self, key):
+        return len(self.store.get(key, []))
+
+    # --- hashes / streams ---
+    async def _hset(self, key, field, value):
+        self.store.setdefault(key, {})[field] = value
+        return 1
+
+    async def _hsetnx(self, key, field, value):
+        h = self.store.setdefault(key, {})
+        if field in h:
+            return 0
+        h[field] = value
+        return 1
+
+    async def _hget(self, key, field):
+        return self.store.get(key, {}).get(field)
+
+    async def _xadd(self, key, mapping, **kwargs):
+        self.store.setdefault(key, []).append(mapping)
+        return f"{len(self.store[key])}-0"
+
+
+class FakeDocument:
+    def __init__(self, page_content, metadata=None):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+
+
+class FakeEmbeddings:
+    def __init__(self, latency: float = 0.0, dim: int = 8):
+        self.latency = latency
+        self.dim = dim
+        self.calls = 0
+
+    def _vector(self, text):
+        return [((hash(text) >> i) & 0xFF) / 255.0 for i in range(self.dim)]
+
+    async def aembed_query(self, text):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+
+class FakeRetriever:
+    """Embeds the query then returns ``k`` canned documents after ``latency``."""
+
+    def __init__(self, embeddings: FakeEmbeddings, k: int = 3, latency: float = 0.0):
+        self.embeddings = embeddings
+        self.k = k
+        self.latency = latency
+        self.docs = [
+            FakeDocument(f"Chunk {i} " + "ordinance text " * 40, {"source": f"doc-{i}"})
+            for i in range(k)
+        ]
+
+    async def ainvoke(self, question, *args, **kwargs):
+        await self.embeddings.aembed_query(question)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return list(self.docs)
+
+
+class FakeLLM:
+    """Stand-in for ``ChatOpenAI``; sleeps ``latency`` then returns fixed text."""
+
+    def __init__(self, latency: float = 0.0, reply: str = "summary"):
+        self.latency = latency
+        self.reply = reply
+        self.calls = 0
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return type("Reply", (), {"content": self.reply})()
+
+
+class FakeChain:
+    """Mimics ConversationalRetrievalChain: retrieve, render history, call the LLM."""
+
+    def __init__(self, retriever: FakeRetriever, llm: FakeLLM, chat_history):
+        self.retriever = retriever
+        self.llm = llm
+        self.chat_history = chat_history
+
+    async def ainvoke(self, inputs, *args, **kwargs):
+        docs = await self.retriever.ainvoke(inputs["question"])
+        # render history + context like the real prompt would
+        prompt = "\n".join(str(getattr(m, "content", m)) for m in self.chat_history.messages)
+        prompt += "\n".join(d.page_content for d in docs) + inputs["question"]
+        reply = await self.llm.ainvoke(prompt)
+        return {"answer": reply.content, "question": inputs["question"]}
+
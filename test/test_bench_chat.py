@@ -0,0 +1,167 @@
+"""Benchmarks for the chat hot path (``process_chat`` / ``get_response``).
+
+Every external service is replaced by the in-process fakes in ``fakes.py`` so
+the numbers reflect our own overhead: Redis round trips, history handling,
+prompt assembly and accounting. Set ``BENCH_LATENCY`` (seconds) to add a
+simulated network delay to each fake Redis/LLM/embedding call.
+
+Run with ``pytest test/test_bench_chat.py --benchmark-only``; each result's
+``extra_info`` records Redis round trips and peak allocated bytes per request.
+"""
+import asyncio
+import json
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("langchain_core")
+pytest.importorskip("pytest_benchmark")
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fakes import FakeChain, FakeEmbeddings, FakeLLM, FakeRedis, FakeRetriever, private_imports
+
+with private_imports():
+    import main
+    import ratelimit
+    import app.chatbot as chatbot
+    import app.redis_memory as redis_memory
+    import app.redis_utils as redis_utils
+    from app.client_config import CLIENT_CONFIG
+
+LATENCY = float(os.getenv("BENCH_LATENCY", "0"))
+CLIENT_ID = "bench"
+CHAT_ID = "bench-chat"
+API_KEY_INFO = {
+    "client": CLIENT_ID,
+    "key": "bench-key",
+    "max_requests": 10**9,
+    "window_seconds": 60,
+    "monthly_limit": 10**9,
+}
+HISTORY_SIZES = {"short": 4, "long": 60}
+
+
+def _bench_config(memory: bool) -> dict:
+    cfg = {k: v for k, v in CLIENT_CONFIG["maximos"].items()}
+    cfg.update({
+        "key": "bench-key",
+        "openai_api_key": "sk-fake",
+        "pinecone_api_key": "pc-fake",
+        "has_chat_memory": memory,
+        "enable_memory_summary": memory,
+    })
+    return cfg
+
+
+@pytest.fixture
+def env(monkeypatch):
+    """Patch every Redis handle and the LLM/vector layer with fakes."""
+    fake = FakeRedis(latency=LATENCY)
+    for module in (main, ratelimit, redis_utils, redis_memory):
+        monkeypatch.setattr(module, "r", fake)
+
+    embeddings = FakeEmbeddings(latency=LATENCY)
+    llm = FakeLLM(latency=LATENCY)
+
+    def fake_get_qa_chain(config, chat_history):
+        retriever = FakeRetriever(embeddings, k=config["max_chunks"], latency=LATENCY)
+        return FakeChain(retriever, llm, chat_history), retriever
+
+    monkeypatch.setattr(chatbot, "ChatOpenAI", lambda *a, **k: llm)
+    monkeypatch.setattr(chatbot, "get_qa_chain", fake_get_qa_chain)
+
+    loop = asyncio.new_event_loop()
+    yield fake, loop
+    loop.close()
+
+
+def _reset(fake: FakeRedis, *, memory: bool, session: str, history: str | None):
+    fake.store.clear()
+    fake.store[f"client_config:{CLIENT_ID}"] = json.dumps(_bench_config(memory))
+    if session == "warm":
+        fake.store[f"ls:{CLIENT_ID}:{CHAT_ID}"] = datetime.utcnow().isoformat()
+        turns = []
+        for i in range(HISTORY_SIZES[history] // 2):
+            turns += [f"human:question {i} about parking rules", f"ai:answer {i} " + "text " * 60]
+        fake.store[f"chatmem:{CLIENT_ID}:{CHAT_ID}"] = turns
+    fake.round_trips = 0
+
+
+def _profile(loop, fake, coro_factory, reset) -> dict:
+    """Run one extra request outside the timer to count round trips and allocations."""
+    reset()
+    tracemalloc.start()
+    loop.run_until_complete(coro_factory())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"redis_round_trips": fake.round_trips, "peak_alloc_bytes": peak}
+
+
+CASES = [
+    pytest.param(True, "cold", None, id="memory-cold"),
+    pytest.param(True, "warm", "short", id="memory-warm-short"),
+    pytest.param(True, "warm", "long", id="memory-warm-long"),
+    pytest.param(False, "cold", None, id="no-memory"),
+]
+
+
+@pytest.mark.parametrize("memory,session,history", CASES)
+def test_bench_process_chat(benchmark, env, memory, session, history):
+    fake, loop = env
+    request = main.ChatRequest(
+        chat_id=CHAT_ID, client_id=CLIENT_ID,
+        question="Where can I park overnight?", recaptcha_token="x",
+    )
+
+    def reset():
+        _reset(fake, memory=memory, session=session, history=history)
+
+    def run():
+        return loop.run_until_complete(main.process_chat(request, API_KEY_INFO))
+
+    benchmark.extra_info.update(
+        _profile(loop, fake, lambda: main.process_chat(request, API_KEY_INFO), reset)
+    )
+    result = benchmark.pedantic(run, setup=reset, rounds=50, iterations=1)
+    assert result["answer"]
+
+
+@pytest.mark.parametrize("memory,session,history", CASES)
+def test_bench_get_response(benchmark, env, memory, session, history):
+    fake, loop = env
+
+    def reset():
+        _reset(fake, memory=memory, session=session, history=history)
+
+    def call():
+        return chatbot.get_response(
+            chat_id=CHAT_ID, question="What are the Mass times?", client_id=CLIENT_ID,
+        )
+
+    benchmark.extra_info.update(_profile(loop, fake, call, reset))
+    result = benchmark.pedantic(
+        lambda: loop.run_until_complete(call()), setup=reset, rounds=50, iterations=1
+    )
+    assert result["answer"]
+
+
+@pytest.mark.parametrize("encoder", ["jsonable_encoder", "orjson"])
+def test_bench_render_history(benchmark, encoder):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    body = {"history": [
+        {"role": "assistant" if i % 2 else "user", "text": f"message {i} " + "text " * 60}
+        for i in range(200)
+    ]}
+    if encoder == "orjson":
+        render = lambda: main.FastJSONResponse(body).body
+    else:
+        render = lambda: JSONResponse(jsonable_encoder(body)).body
+    assert json.loads(benchmark(render)) == body
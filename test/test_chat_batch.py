@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fakes import FakeChain, FakeEmbeddings, FakeLLM, FakeRedis, FakeRetriever, private_imports
+
+with private_imports():
+    import app.chatbot as chatbot
+    import app.redis_utils as redis_utils
+    from app import background
+    from app.client_config import CLIENT_CONFIG
+
+
+class Callback:
+    total_tokens = 10
+    total_cost = 0.001
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+@pytest.fixture
+def env(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(redis_utils, "r", fake)
+    config = {**CLIENT_CONFIG["maximos"], "openai_api_key": "sk-fake", "pinecone_api_key": "pc-fake"}
+    fake.store["client_config:batch"] = json.dumps(config)
+
+    embeddings = FakeEmbeddings()
+    llm = FakeLLM(latency=0.01, reply="answer")
+    in_flight = {"now": 0, "peak": 0}
+
+    class CountingLLM:
+        async def ainvoke(self, prompt, *args, **kwargs):
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            try:
+                if "broken" in prompt:
+                    raise RuntimeError("upstream error")
+                return await llm.ainvoke(prompt)
+            finally:
+                in_flight["now"] -= 1
+
+    def fake_get_qa_chain(config, chat_history):
+        retriever = FakeRetriever(chatbot.TimedEmbeddings(embeddings, config), k=2)
+        return FakeChain(retriever, CountingLLM(), chat_history), retriever
+
+    monkeypatch.setattr(chatbot, "get_embeddings", lambda config: embeddings)
+    monkeypatch.setattr(chatbot, "get_qa_chain", fake_get_qa_chain)
+    monkeypatch.setattr(chatbot, "get_openai_callback", Callback)
+    return fake, embeddings, in_flight
+
+
+def test_batch_embeds_once_and_caps_concurrency(env):
+    fake, embeddings, in_flight = env
+    questions = [f"question {i}" for i in range(12)] + ["question 0"]
+
+    async def run():
+        results = await chatbot.get_batch_responses("batch", questions, concurrency=3)
+        out = [item async for item in results]
+        await background.drain()
+        return out
+
+    results = asyncio.run(run())
+    assert sorted(index for index, _ in results) == list(range(13))
+    assert all(result["answer"] == "answer" for _, result in results)
+    # one aembed_documents call; every retrieval reused its vector
+    assert embeddings.calls == 1
+    assert in_flight["peak"] <= 3
+    assert fake.store["token_usage:batch:total"] == str(10 * 13)
+
+
+def test_failed_item_does_not_stop_the_batch(env):
+    async def run():
+        results = await chatbot.get_batch_responses("batch", ["fine", "broken", "also fine"])
+        return {index: result async for index, result in results}
+
+    results = asyncio.run(run())
+    assert isinstance(results[1], RuntimeError)
+    assert results[0]["answer"] == results[2]["answer"] == "answer"
+
+
+def test_prompt_is_finalized_with_each_real_question(env, monkeypatch):
+    seen = []
+    finalize = chatbot.finalize_prompt
+
+    def spy(config, chat_history, question, summary):
+        seen.append(question)
+        finalize(config, chat_history, question, summary)
+
+    monkeypatch.setattr(chatbot, "finalize_prompt", spy)
+
+    async def run():
+        results = await chatbot.get_batch_responses("batch", ["first", "second"])
+        return [item async for item in results]
+
+    assert len(asyncio.run(run())) == 2
+    assert sorted(seen) == ["first", "second"]
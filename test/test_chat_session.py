@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fakes import FakeRedis, private_imports
+
+with private_imports():
+    import app.chatbot as chatbot
+    import app.redis_memory as redis_memory
+    import app.redis_utils as redis_utils
+    import app.chat_session as chat_session
+    from app.chat_session import ChatSession
+    from app.client_config import CLIENT_CONFIG
+
+KEY = "chatmem:live:s"
+
+
+class Callback:
+    total_tokens = 0
+    total_cost = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class StreamingChain:
+    """Emits the answer token by token through the run's callbacks."""
+
+    async def ainvoke(self, inputs, config=None):
+        answer = f"re: {inputs['question']}"
+        for token in answer.split(" "):
+            for cb in config["callbacks"]:
+                if isinstance(cb, chatbot.TokenStream):
+                    await cb.on_llm_new_token(token + " ", run_id=None)
+        return {"answer": answer}
+
+
+class Retriever:
+    async def ainvoke(self, question):
+        return ["doc"]
+
+
+@pytest.fixture
+def env(monkeypatch):
+    fake = FakeRedis()
+    for module in (redis_utils, redis_memory):
+        monkeypatch.setattr(module, "r", fake)
+    config = {
+        **CLIENT_CONFIG["maximos"], "has_chat_memory": True,
+        "enable_memory_summary": True, "memory_options": {"summary_max_messages": 4},
+    }
+    fake.store["client_config:live"] = json.dumps(config)
+    fake.store["ls:live:s"] = datetime.utcnow().isoformat()
+    fake.store[KEY] = ["human:earlier question", "ai:earlier answer"]
+
+    summaries = []
+
+    async def fake_summary(history, config, max_messages=None):
+        summaries.append(len(history.messages))
+        return f"summary of {len(history.messages)}"
+
+    monkeypatch.setattr(chat_session, "summarize_recent_messages_with_llm", fake_summary)
+    monkeypatch.setattr(chatbot, "get_qa_chain", lambda config, history: (StreamingChain(), Retriever()))
+    monkeypatch.setattr(chatbot, "get_openai_callback", Callback)
+    return fake, summaries
+
+
+def test_session_loads_once_streams_and_writes_through(env):
+    fake, summaries = env
+
+    async def run():
+        session = await ChatSession.open("live", "s")
+        fake.store[KEY].append("human:written elsewhere")  # not re-read: history lives in the session
+        tokens = []
+
+        async def on_token(text):
+            tokens.append(text)
+
+        results = []
+        for i in range(3):
+            results.append(await session.ask(f"question {i}", on_token=on_token))
+        await session.close()
+        return session, tokens, results
+
+    session, tokens, results = asyncio.run(run())
+    assert [r["answer"] for r in results] == ["re: question 0", "re: question 1", "re: question 2"]
+    assert "".join(tokens[:2]) == "re: question "
+    # each turn was appended to Redis after the history loaded at open
+    assert fake.store[KEY] == ["human:earlier question", "ai:earlier answer", "human:written elsewhere"] + [
+        line for i in range(3) for line in (f"human:question {i}", f"ai:re: question {i}")
+    ]
+    assert len(session.history.messages) == 8
+    # summary rebuilt at open size (2) and again only once 4 more messages arrived
+    assert summaries == [2, 6]
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.chunk_store import ChunkStore, ChunkStoreError, validate, write_store
+
+
+def _records():
+    return [
+        {"id": "b" * 32, "text": "Section 3-4-1 Parking. No overnight parking.", "token_count": 9,
+         "source": "Chapter 3-4", "filename": "chapter_3-4.json", "position": 0, "section": "3-4-1"},
+        {"id": "a" * 32, "text": "Snow routes — clear within 2 hours.", "token_count": 8,
+         "source": "Chapter 3-5", "filename": "chapter_3-5.json", "position": 0},
+        {"id": "a" * 32 + "-1", "text": "Snow routes — clear within 2 hours.", "token_count": 8,
+         "source": "Chapter 3-5", "filename": "chapter_3-5.json", "position": 3},
+    ]
+
+
+def test_round_trip_lookup_and_order(tmp_path):
+    path = str(tmp_path / "corpus.chunks")
+    assert write_store(path, _records()) == 3
+
+    with ChunkStore(path) as store:
+        assert len(store) == 3
+        assert "a" * 32 in store and "c" * 32 not in store
+        record = store.get("b" * 32)
+        assert record["text"].startswith("Section 3-4-1")
+        assert record["section"] == "3-4-1" and record["section_title"] == ""
+        assert store.text("a" * 32 + "-1") == "Snow routes — clear within 2 hours."
+        assert store.get_many(["a" * 32, "missing"])[1] is None
+        # iteration keeps build order, lookups use the sorted index
+        assert [r["id"] for r in store] == ["b" * 32, "a" * 32, "a" * 32 + "-1"]
+        assert store.ids() == sorted(store.ids())
+
+
+def test_validate_checks_contents_and_rejects_bad_files(tmp_path):
+    path = str(tmp_path / "corpus.chunks")
+    write_store(path, _records())
+    assert validate(path, expected=_records()) == []
+
+    changed = _records()
+    changed[0]["text"] = "something else"
+    assert validate(path, expected=changed) == [f"{'b' * 32}: text differs from source"]
+
+    bogus = tmp_path / "bogus.chunks"
+    bogus.write_bytes(b"not a chunk store at all, just some bytes here")
+    assert validate(str(bogus))
+    with pytest.raises(ChunkStoreError):
+        ChunkStore(str(bogus))
+
+
+def test_duplicate_ids_are_rejected(tmp_path):
+    records = _records()
+    records[2]["id"] = records[1]["id"]
+    with pytest.raises(ChunkStoreError):
+        write_store(str(tmp_path / "dup.chunks"), records)
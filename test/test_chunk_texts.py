@@ -0,0 +1,85 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts")))
+
+import chunk_texts
+
+
+class WordEncoder:
+    """One token per whitespace-separated word, so token counts are easy to read."""
+
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, ids):
+        return " ".join(ids)
+
+
+@pytest.fixture(autouse=True)
+def words(monkeypatch):
+    monkeypatch.setitem(chunk_texts._encoders, "words", WordEncoder())
+
+
+def _chunks(lines, max_tokens=30, overlap=5):
+    paragraphs = chunk_texts.iter_paragraphs_from_lines(lines)
+    return list(chunk_texts.iter_chunks(paragraphs, max_tokens, overlap, "words"))
+
+
+def _body(n, word="word"):
+    return " ".join(f"{word}{i}" for i in range(n))
+
+
+def test_headings_and_provisions_are_told_apart():
+    assert chunk_texts.match_heading("Section 12-14-3 Parking Restrictions") == ("12-14-3", "Parking Restrictions")
+    assert chunk_texts.match_heading("12-14-3. Standing and Parking.") == ("12-14-3", "Standing and Parking.")
+    assert chunk_texts.match_heading("12-14-2. No person shall park on Main Street.") is None
+    assert chunk_texts.match_heading("10-15 feet from the curb line") is None
+
+
+def test_numbered_provisions_keep_their_text():
+    lines = [
+        "Chapter 12-14 Standing and Parking",
+        "12-14-2. No person shall park a trailer on any street.",
+        "12-14-3. No vehicle may stand in an alley.",
+        "12-14-4. Parking is limited to two hours downtown.",
+        _body(10),
+    ]
+    chunks = _chunks(lines)
+    text = " ".join(" ".join(c["text"].split()) for c in chunks)
+    for provision in lines:
+        assert provision in text
+    assert all(c["token_count"] <= 30 for c in chunks)
+    assert chunks[0]["section"] == "12-14"
+
+
+def test_stacked_headings_are_never_dropped_or_oversized():
+    headings = [f"Section 12-14-{i} Parking Rule Number {i} Heading Title" for i in range(2, 6)]  # 8 tokens each
+    chunks = _chunks([*headings, _body(20)])
+    text = "\n".join(c["text"] for c in chunks)
+    for heading in headings:
+        assert heading in text
+    assert all(c["token_count"] <= 30 for c in chunks)
+    # the last chunk is the body under the last heading
+    assert chunks[-1]["section"] == "12-14-5"
+    assert chunks[-1]["text"].endswith(_body(20))
+
+
+def test_body_is_capped_and_overlaps():
+    chunks = _chunks(["Section 3-4-1 Overnight Parking", *(_body(8, f"p{i}w") + "." for i in range(8))],
+                     max_tokens=20, overlap=5)
+    assert len(chunks) > 1
+    assert all(c["token_count"] <= 20 for c in chunks)
+    for prev, cur in zip(chunks, chunks[1:]):
+        # sentences are longer than the overlap, so it is the last 5 tokens of the previous chunk
+        assert cur["text"].split()[:5] == prev["text"].split()[-5:]
+    assert {c["section"] for c in chunks} == {"3-4-1"}
+    assert chunks[0]["section_title"] == "Overnight Parking"
+
+
+def test_new_section_starts_a_new_chunk_without_overlap():
+    chunks = _chunks(["Section 3-4-1 Parking", _body(6, "a"), "Section 3-4-2 Snow Routes", _body(6, "b")])
+    assert [c["section"] for c in chunks] == ["3-4-1", "3-4-2"]
+    assert "a0" not in chunks[1]["text"]
@@ -77,6 +77,9 @@ def test_config_not_mutated(monkeypatch):
 
         monkeypatch.setattr("app.chatbot.get_openai_callback", lambda: DummyCallback())
         monkeypatch.setattr("app.chatbot.get_persona", lambda client_id: None)
+        async def no_debug_prompt(client_id):
+            return False
+        monkeypatch.setattr("app.chatbot.get_debug_prompt", no_debug_prompt)
         monkeypatch.setattr("app.chatbot.get_memory", lambda chat_id, client_id: ChatMessageHistory())
         monkeypatch.setattr("app.chatbot.get_qa_chain", lambda config, chat_history: (DummyChain(), DummyRetriever()))
         monkeypatch.setattr("app.chatbot.increment_token_usage", lambda **kwargs: None)
@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts")))
+
+import dedup
+
+BOILERPLATE = (
+    "Legislative History: Ordinance #1421 adopted by the City Council on the third reading, "
+    "amending chapter twelve of the municipal code regarding parking on public streets and "
+    "alleys within the corporate limits, effective upon publication as required by law. "
+    "Prior codification: sections 12-3-1 through 12-3-9 of the 1987 code, as amended by "
+    "ordinances adopted in 1994, 2003 and 2011, together with the resolution establishing "
+    "winter maintenance routes and the schedule of fines for violations of this chapter. "
+)
+
+
+def _chunk(chunk_id, text, source):
+    return {"id": chunk_id, "text": text, "metadata": {"source": source}}
+
+
+def test_identical_and_near_identical_text_is_collapsed():
+    d = dedup.Deduplicator()
+    assert d.check("a", BOILERPLATE) is None
+    assert d.check("b", BOILERPLATE) == "a"
+    assert d.check("c", BOILERPLATE.replace("#1421", "#1422")) == "a"
+    assert d.check("d", "Dogs must be leashed in all city parks at all times. " * 5) is None
+    assert d.references == {"a": ["b", "c"]}
+    assert d.duplicates == 2
+    assert d.ratio == 0.5
+
+
+def test_minhash_estimate_tracks_jaccard():
+    hasher = dedup.MinHasher()
+    a = hasher.signature(BOILERPLATE)
+    b = hasher.signature("Snow emergency routes must be cleared of vehicles within two hours. " * 3)
+    assert dedup.estimate_jaccard(a, a) == 1.0
+    assert dedup.estimate_jaccard(a, b) < 0.2
+
+
+def test_dedup_chunks_keeps_first_and_records_sources():
+    data = [
+        _chunk("1", BOILERPLATE, "Chapter 12"),
+        _chunk("2", "Fences may not exceed six feet in height in residential districts. " * 4, "Chapter 9"),
+        _chunk("3", BOILERPLATE, "Chapter 14"),
+    ]
+    kept, d = dedup.dedup_chunks(data)
+    assert [c["id"] for c in kept] == ["1", "2"]
+    assert kept[0]["metadata"]["duplicate_count"] == 1
+    assert kept[0]["metadata"]["duplicate_sources"] == ["Chapter 14"]
+    assert "duplicate_count" not in kept[1]["metadata"]
@@ -0,0 +1,64 @@
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts")))
+
+# Stub the service SDKs so the script imports without them. Always ours, even if
+# another test module stubbed them first, and restored afterwards.
+fake_openai = types.ModuleType("openai")
+for name in ("RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError"):
+    setattr(fake_openai, name, type(name, (Exception,), {}))
+fake_pinecone = types.ModuleType("pinecone")
+fake_pinecone.Pinecone = object
+fake_pinecone.ServerlessSpec = object
+
+with pytest.MonkeyPatch.context() as mp:
+    mp.setitem(sys.modules, "openai", fake_openai)
+    mp.setitem(sys.modules, "pinecone", fake_pinecone)
+    mp.delitem(sys.modules, "embed_upsert", raising=False)
+    import embed_upsert
+
+
+def _chunk(filename, text, i=0, seen=None):
+    metadata = {"filename": filename, "chunk_id": i, "source": "s"}
+    return {
+        "id": embed_upsert.content_id(filename, text, {} if seen is None else seen),
+        "text": text,
+        "metadata": metadata,
+        "fingerprint": embed_upsert.fingerprint(text, metadata),
+    }
+
+
+def test_content_ids_are_stable_and_unique():
+    seen = {}
+    a = embed_upsert.content_id("f.json", "same", seen)
+    b = embed_upsert.content_id("f.json", "same", seen)
+    assert a != b and b.startswith(a)
+    assert embed_upsert.content_id("f.json", "same", {}) == a
+    assert embed_upsert.content_id("g.json", "same", {}) != a
+
+
+def test_diff_manifest_new_changed_removed():
+    old = [_chunk("f.json", "keep"), _chunk("f.json", "edit me", 1), _chunk("f.json", "gone", 2)]
+    manifest = embed_upsert.build_manifest(old, "m")
+
+    edited = _chunk("f.json", "edit me", 1)
+    edited["metadata"]["source"] = "renamed"
+    edited["fingerprint"] = embed_upsert.fingerprint(edited["text"], edited["metadata"])
+    current = [_chunk("f.json", "keep"), edited, _chunk("f.json", "brand new", 2)]
+
+    diff = embed_upsert.diff_manifest(current, manifest, "m")
+    assert [d["text"] for d in diff["new"]] == ["brand new"]
+    assert [d["text"] for d in diff["changed"]] == ["edit me"]
+    assert [d["text"] for d in diff["unchanged"]] == ["keep"]
+    assert diff["removed"] == [old[2]["id"]]
+
+
+def test_model_change_reembeds_everything():
+    data = [_chunk("f.json", "keep")]
+    manifest = embed_upsert.build_manifest(data, "old-model")
+    diff = embed_upsert.diff_manifest(data, manifest, "new-model")
+    assert len(diff["new"]) == 1 and not diff["unchanged"]
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts")))
+
+import eval_retrieval
+
+RECORDS = [
+    {"id": "a", "text": "Overnight parking on city streets is prohibited in winter.", "source": "Chapter 3-4",
+     "section": "3-4-1", "token_count": 10},
+    {"id": "b", "text": "Dogs must be leashed in parks.", "source": "Chapter 6-2", "section": "6-2-3",
+     "token_count": 6},
+    {"id": "c", "text": "Fences may not exceed six feet.", "source": "Chapter 9-1", "section": "9-1-7",
+     "token_count": 6},
+]
+
+
+class WordEncoder:
+    def encode(self, text):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def encoder(monkeypatch):
+    # never load tiktoken here: a cold cache would try to download the encoding
+    monkeypatch.setattr(eval_retrieval, "_encoder", WordEncoder())
+
+
+def test_token_counts_fall_back_when_the_encoder_cannot_load(monkeypatch):
+    import chunk_texts
+
+    def offline(name=None):
+        raise ConnectionError("cl100k_base is not cached and there is no network")
+
+    monkeypatch.setattr(eval_retrieval, "_encoder", None)
+    monkeypatch.setattr(chunk_texts, "get_encoder", offline)
+    assert eval_retrieval.count_tokens("x" * 40) == 10
+    assert eval_retrieval.record_tokens(RECORDS[0]) == 10  # stored count, no encoder needed
+
+
+def test_relevance_targets_match_by_id_source_section_and_text():
+    record = RECORDS[0]
+    assert eval_retrieval.matches_target("a", record)
+    assert eval_retrieval.matches_target("id:a", record)
+    assert eval_retrieval.matches_target("source:Chapter 3-4", record)
+    assert eval_retrieval.matches_target("section:3-4-1", record)
+    assert eval_retrieval.matches_target("text:OVERNIGHT parking", record)
+    assert not eval_retrieval.matches_target("section:6-2-3", record)
+
+
+def test_score_query_recall_and_reciprocal_rank():
+    ranked = [RECORDS[1], RECORDS[0], RECORDS[2]]
+    scored = eval_retrieval.score_query(["section:3-4-1", "c", "id:missing"], ranked, [1, 2, 3])
+    assert scored["recall"] == {1: 0.0, 2: 1 / 3, 3: 2 / 3}
+    assert scored["rr"] == 0.5
+
+
+def test_bm25_ranks_lexical_match_first_and_evaluate_reports():
+    backend = eval_retrieval.BM25Backend(RECORDS)
+    assert [r["id"] for r in backend.search("where can I park overnight", 2)][:1] == ["a"]
+
+    golden = [{"question": "overnight parking rules", "relevant": ["section:3-4-1"]},
+              {"question": "leash law for dogs", "relevant": ["b"]}]
+    result = eval_retrieval.evaluate(backend, golden, [1, 3], "text-embedding-3-small", "gpt-3.5-turbo")
+    assert result["mrr"] == 1.0
+    assert result["k"]["1"]["recall"] == 1.0
+    assert result["k"]["1"]["context_tokens_mean"] == 8.0
+    assert result["k"]["1"]["est_cost_per_query_usd"] > 0
@@ -0,0 +1,65 @@
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import import_time
+from app.lazy import LazyAttr, preload
+
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       226 |        226 |   _io
+import time:       471 |       1264 | _frozen_importlib_external
+import time:       900 |        900 |     tiktoken.core
+import time:       300 |       1200 |   tiktoken
+import time:      2000 |       3200 | app.chatbot
+"""
+
+
+def test_parse_importtime_rows_and_depth():
+    rows = import_time.parse_importtime(SAMPLE)
+    assert [r["module"] for r in rows] == ["_io", "_frozen_importlib_external", "tiktoken.core", "tiktoken", "app.chatbot"]
+    assert [r["depth"] for r in rows] == [1, 0, 2, 1, 0]
+    assert import_time.total_ms(rows) == pytest.approx(4.464)
+
+
+def test_check_flags_heavy_modules_and_budget():
+    rows = import_time.parse_importtime(SAMPLE)
+    problems = import_time.check(rows, budget_ms=1.0)
+    assert any(p.startswith("tiktoken is imported") for p in problems)
+    assert any("budget" in p for p in problems)
+    assert import_time.check(rows, budget_ms=10.0, heavy=("torch",)) == []
+
+
+def test_lazy_attr_imports_on_first_use(monkeypatch):
+    module = types.ModuleType("fake_heavy_sdk")
+    module.Client = lambda **kw: ("client", kw)
+    module.Client.build = staticmethod(lambda: "built")
+    monkeypatch.setitem(sys.modules, "fake_heavy_sdk", module)
+
+    proxy = LazyAttr("fake_heavy_sdk", "Client")
+    assert not proxy.loaded
+    assert proxy(key="k") == ("client", {"key": "k"})
+    assert proxy.loaded
+    assert proxy.build() == "built"
+
+    holder = types.ModuleType("holder")
+    holder.Client = LazyAttr("fake_heavy_sdk", "Client")
+    holder.other = 1
+    assert preload(holder) == ["fake_heavy_sdk.Client"]
+    assert preload(holder) == []
+
+
+@pytest.mark.skipif(
+    any(importlib.util.find_spec(m) is None for m in ("fastapi", "slowapi", "langchain_community", "langchain")),
+    reason="app dependencies not installed",
+)
+def test_main_import_skips_heavy_sdks():
+    rows = import_time.measure("main")
+    assert import_time.heavy_imports(rows) == []
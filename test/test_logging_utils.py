@@ -0,0 +1,75 @@
+import io
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import logging_utils
+
+
+def _record(level=logging.DEBUG, **extra):
+    record = logging.makeLogRecord({"name": "axios.test", "levelno": level, "msg": "hello %s", "args": ("world",)})
+    record.levelname = logging.getLevelName(level)
+    for k, v in extra.items():
+        setattr(record, k, v)
+    return record
+
+
+def test_json_formatter_includes_request_id_and_extras():
+    token = logging_utils.request_id_var.set("req-123")
+    try:
+        record = _record(level=logging.INFO, client_id="maximos", category="memory")
+        logging_utils.RequestIdFilter().filter(record)
+    finally:
+        logging_utils.request_id_var.reset(token)
+    entry = json.loads(logging_utils.JsonFormatter().format(record))
+    assert entry["msg"] == "hello world"
+    assert entry["request_id"] == "req-123"
+    assert entry["client_id"] == "maximos"
+    assert entry["category"] == "memory"
+
+
+def test_sampling_only_drops_debug_records():
+    f = logging_utils.SamplingFilter(logging_utils.parse_sample_rates("memory=0,bogus=x"))
+    assert f.filter(_record(category="memory")) is False
+    assert f.filter(_record(category="config")) is True
+    assert f.filter(_record(level=logging.WARNING, category="memory")) is True
+
+
+def test_prompt_dump_off_by_default():
+    assert logging_utils.prompt_dump_enabled({}) is False
+    assert logging_utils.prompt_dump_enabled(None) is False
+    assert logging_utils.prompt_dump_enabled({"debug_prompt_dump": True}) is True
+
+
+@pytest.fixture
+def stream():
+    """A fresh listener writing to a buffer, even if importing ``main`` already started one."""
+    logging_utils.shutdown_logging()
+    stream = io.StringIO()
+    logging_utils.configure_logging(level="DEBUG", stream=stream)
+    yield stream
+    logging_utils.shutdown_logging()
+
+
+def test_configure_logging_writes_off_thread(stream):
+    logging_utils.get_logger("test").info("queued", extra={"client_id": "c"})
+    logging_utils.shutdown_logging()  # flushes the queue
+    line = json.loads(stream.getvalue().strip().splitlines()[-1])
+    assert line["msg"] == "queued"
+    assert line["logger"] == "axios.test"
+
+
+def test_exceptions_are_formatted_by_the_listener(stream):
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging_utils.get_logger("test").exception("failed for %s", "c")
+    logging_utils.shutdown_logging()
+    line = json.loads(stream.getvalue().strip().splitlines()[-1])
+    assert line["msg"] == "failed for c"
+    assert "ValueError: boom" in line["exc"]
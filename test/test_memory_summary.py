@@ -118,6 +118,9 @@ def test_summary_injected(monkeypatch):
         return config
     monkeypatch.setattr(chatbot_module, "get_client_config", fake_get_client_config)
     monkeypatch.setattr(chatbot_module, "get_persona", lambda cid: None)
+    async def no_debug_prompt(cid):
+        return False
+    monkeypatch.setattr(chatbot_module, "get_debug_prompt", no_debug_prompt)
     monkeypatch.setattr(chatbot_module, "get_memory", lambda chat_id, client_id: history)
     class DummyChain:
         async def ainvoke(self, *a, **k):
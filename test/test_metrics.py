@@ -0,0 +1,60 @@
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import metrics
+
+
+def test_histogram_render_is_cumulative():
+    h = metrics.Histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    h.observe(0.05, stage="a")
+    h.observe(0.5, stage="a")
+    h.observe(5.0, stage="a")
+    lines = h.render()
+    assert 't_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="a",le="1.0"} 2' in lines
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 't_seconds_count{stage="a"} 3' in lines
+
+
+def test_stage_uses_request_labels_and_excludes_nested():
+    metrics.start_request()
+    metrics.set_request_labels(client_id="c1", model="gpt")
+    with metrics.stage("outer_test", exclude="inner_test"):
+        metrics.observe_stage("inner_test", 10.0)
+    text = metrics.render()
+    assert 'axios_stage_duration_seconds_count{stage="outer_test",client_id="c1",model="gpt"} 1' in text
+    # the nested 10s must not leak into the outer stage
+    assert metrics.stage_total("outer_test") < 1.0
+
+
+def test_instrumented_redis_counts_round_trips():
+    class Pipe:
+        def rpush(self, *a):
+            pass
+        async def execute(self):
+            return []
+
+    class Fake:
+        async def get(self, key):
+            return "v"
+        def pipeline(self):
+            return Pipe()
+
+    metrics.start_request()
+    metrics.set_request_labels(client_id="redis-test")
+    r = metrics.instrument_redis(Fake())
+
+    async def run():
+        assert await r.get("k") == "v"
+        pipe = r.pipeline()
+        pipe.rpush("k", "a")
+        pipe.rpush("k", "b")
+        await pipe.execute()
+
+    asyncio.run(run())
+    text = metrics.render()
+    assert 'axios_redis_commands_total{client_id="redis-test",command="get"} 1.0' in text
+    assert 'axios_redis_commands_total{client_id="redis-test",command="pipeline"} 1.0' in text
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.redis_utils as redis_utils
+from app import redis_pool
+from app.redis_pool import MISS, ClientCache
+
+from fakes import FakeRedis
+
+
+@pytest.fixture
+def cached(monkeypatch):
+    fake = FakeRedis()
+    cache = ClientCache(ttl=60)
+    cache.active = True
+    monkeypatch.setattr(redis_utils, "r", fake)
+    monkeypatch.setattr(redis_utils, "client_cache", cache)
+    return fake, cache
+
+
+def test_shared_client_is_used_everywhere():
+    pytest.importorskip("langchain_community")
+    import app.redis_memory as redis_memory
+
+    assert redis_utils.r is redis_pool.r
+    assert redis_memory.r is redis_pool.r
+
+
+def test_hot_reads_skip_redis_until_invalidated(cached):
+    fake, cache = cached
+    fake.store["client_config:acme"] = json.dumps({"gpt_model": "gpt-4o"})
+
+    async def run():
+        first = await redis_utils.get_client_config("acme")
+        trips = fake.round_trips
+        second = await redis_utils.get_client_config("acme")
+        assert second == first and fake.round_trips == trips
+
+        await redis_utils.set_client_config("acme", {"gpt_model": "gpt-4.1"})
+        assert (await redis_utils.get_client_config("acme"))["gpt_model"] == "gpt-4.1"
+
+    asyncio.run(run())
+
+
+def test_scan_result_is_cached_and_dropped_with_any_member(cached):
+    fake, cache = cached
+    fake.store["client_config:a"] = json.dumps({"key": "ka"})
+
+    async def run():
+        configs = await redis_utils.get_all_client_configs()
+        assert configs["a"] == {"key": "ka"}
+        assert cache.lookup("client_config:*") == ["client_config:a"]
+
+        # another worker adds a client; the server invalidation names only the new key
+        fake.store["client_config:b"] = json.dumps({"key": "kb"})
+        cache.invalidate(["client_config:b"])
+        configs = await redis_utils.get_all_client_configs()
+        assert configs["b"] == {"key": "kb"}
+
+    asyncio.run(run())
+
+
+def test_read_racing_an_invalidation_is_not_cached():
+    cache = ClientCache(ttl=60)
+    cache.active = True
+    token = cache.token()
+    cache.invalidate("persona:acme")
+    cache.store("persona:acme", "stale", token)
+    assert cache.lookup("persona:acme") is MISS
+
+
+def test_inactive_or_untracked_keys_bypass_the_cache():
+    cache = ClientCache(ttl=60)
+    cache.store("persona:acme", "x", cache.token())
+    assert cache.lookup("persona:acme") is MISS
+
+    cache.active = True
+    cache.store("ratelimit:k", "1", cache.token())
+    assert cache.lookup("ratelimit:k") is MISS
+    assert len(cache) == 0
+
+
+def test_lru_bound_and_flush():
+    cache = ClientCache(ttl=60, max_size=2)
+    cache.active = True
+    for name in ("a", "b", "c"):
+        cache.store(f"persona:{name}", name, cache.token())
+    assert cache.lookup("persona:a") is MISS
+    assert cache.lookup("persona:c") == "c"
+    cache.invalidate(None)
+    assert len(cache) == 0
+
+
+def test_debug_prompt_toggle_leaves_client_config_alone(cached):
+    fake, cache = cached
+
+    async def run():
+        assert await redis_utils.get_debug_prompt("ordinance") is False
+        await redis_utils.set_debug_prompt("ordinance", True)
+        assert await redis_utils.get_debug_prompt("ordinance") is True
+        await redis_utils.set_debug_prompt("ordinance", False)
+        assert await redis_utils.get_debug_prompt("ordinance") is False
+
+    asyncio.run(run())
+    # a statically defined client keeps following client_config.py
+    assert "client_config:ordinance" not in fake.store
+
+
+def test_persona_append_is_not_hidden_by_a_read_during_the_write(cached, monkeypatch):
+    fake, cache = cached
+    fake.store["persona:acme"] = json.dumps({"prompt": "Be brief."})
+    set_ = fake.set
+
+    async def set_after_a_read(key, value, *args, **kwargs):
+        # another request reads (and caches) the persona while the append is in flight
+        await redis_utils.get_persona("acme")
+        return await set_(key, value, *args, **kwargs)
+
+    monkeypatch.setattr(fake, "set", set_after_a_read)
+
+    async def run():
+        await redis_utils.append_to_persona("acme", "Be kind.")
+        return await redis_utils.get_persona("acme")
+
+    assert asyncio.run(run()) == {"prompt": "Be brief.\n\nBe kind."}
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_core.embeddings import Embeddings
+
+import app.redis_utils as redis_utils
+from app.chunk_store import REDIS_TEXT_KEY, write_store
+from app.retrieval import HydratingRetriever
+
+from fakes import FakeRedis
+
+
+class StaticEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [[0.0, 1.0] for _ in texts]
+
+    def embed_query(self, text):
+        return [0.0, 1.0]
+
+
+class SlimIndex:
+    """Pinecone index stand-in whose matches carry no text."""
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.calls = []
+
+    def query(self, **kwargs):
+        self.calls.append(kwargs)
+        return {"matches": [
+            {"id": i, "score": 0.9, "metadata": {"source": f"src-{i}"}} for i in self.ids[:kwargs["top_k"]]
+        ]}
+
+
+def test_hydrates_from_store_then_redis_in_one_round_trip(tmp_path, monkeypatch):
+    path = str(tmp_path / "corpus.chunks")
+    write_store(path, [{"id": "a", "text": "local text", "token_count": 2}])
+    fake = FakeRedis()
+    fake.store[REDIS_TEXT_KEY.format(index="ordinance", id="b")] = "redis text b"
+    fake.store[REDIS_TEXT_KEY.format(index="ordinance", id="c")] = "redis text c"
+    monkeypatch.setattr(redis_utils, "r", fake)
+
+    index = SlimIndex(["a", "b", "c", "gone"])
+    retriever = HydratingRetriever(
+        index=index, embeddings=StaticEmbeddings(), index_name="ordinance", k=4, chunk_store_path=path,
+    )
+    docs = asyncio.run(retriever.ainvoke("parking"))
+
+    assert [d.page_content for d in docs] == ["local text", "redis text b", "redis text c"]
+    assert docs[0].metadata == {"source": "src-a", "id": "a", "score": 0.9}
+    assert index.calls[0]["top_k"] == 4 and index.calls[0]["include_metadata"] is True
+    assert fake.round_trips == 1
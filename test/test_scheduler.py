@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.scheduler import FairScheduler, Overloaded
+
+
+async def _job(sched, client_id, config, order, hold=0.01):
+    async with sched.slot(client_id, config):
+        order.append(client_id)
+        await asyncio.sleep(hold)
+
+
+def test_client_cap_queues_then_rejects():
+    sched = FairScheduler("test", global_limit=10, limit_key="max_concurrency")
+    config = {"max_concurrency": 1, "max_queue": 1}
+
+    async def run():
+        order = []
+        first = asyncio.create_task(_job(sched, "a", config, order, hold=0.05))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(_job(sched, "a", config, order))
+        await asyncio.sleep(0)
+        assert sched.stats()["clients"]["a"] == {"active": 1, "waiting": 1, "weight": 1.0}
+        with pytest.raises(Overloaded) as exc:
+            async with sched.slot("a", config):
+                pass
+        assert exc.value.reason == "client_queue_full" and exc.value.retry_after >= 1
+        # another tenant is unaffected
+        async with sched.slot("b", config):
+            pass
+        await asyncio.gather(first, second)
+        return order
+
+    assert asyncio.run(run()) == ["a", "a"]
+    assert sched.active == 0 and sched.waiting == 0
+
+
+def test_burst_from_one_client_does_not_starve_another():
+    sched = FairScheduler("test", global_limit=1, limit_key="max_concurrency")
+    config = {"max_concurrency": 10, "max_queue": 100}
+
+    async def run():
+        order = []
+        tasks = [asyncio.create_task(_job(sched, "bulk", config, order)) for _ in range(6)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(_job(sched, "parish", config, order)) for _ in range(2)]
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(run())
+    # parish is served as soon as bulk has had its turn, not after the whole burst
+    assert order.index("parish") <= 2
+    assert order[-1] == "bulk"
+
+
+def test_weights_split_contended_capacity():
+    sched = FairScheduler("test", global_limit=1, limit_key="max_concurrency")
+
+    async def run():
+        order = []
+        tasks = [asyncio.create_task(_job(sched, "heavy", {"scheduler_weight": 3}, order, 0)) for _ in range(12)]
+        tasks += [asyncio.create_task(_job(sched, "light", {"scheduler_weight": 1}, order, 0)) for _ in range(12)]
+        await asyncio.gather(*tasks)
+        return order
+
+    first = asyncio.run(run())[:12]
+    assert 8 <= first.count("heavy") <= 10
+
+
+def test_queue_timeout_and_cancellation_free_their_place():
+    sched = FairScheduler("test", global_limit=1, limit_key="max_concurrency", queue_timeout=0.02)
+
+    async def run():
+        order = []
+        holder = asyncio.create_task(_job(sched, "a", None, order, hold=0.1))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as exc:
+            async with sched.slot("b"):
+                pass
+        assert exc.value.reason == "queue_timeout"
+
+        waiter = asyncio.create_task(_job(sched, "c", None, order))
+        await asyncio.sleep(0)
+        assert sched.waiting == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert sched.waiting == 0
+        await holder
+        return order
+
+    assert asyncio.run(run()) == ["a"]
+    assert sched.active == 0
@@ -0,0 +1,37 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import serialization
+
+
+def test_roundtrip_is_compact_and_keeps_unicode():
+    value = {"prompt": "Bénédiction ✝", "k": [1, 2.5, None, True]}
+    encoded = serialization.dumps(value)
+    assert encoded == json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    assert serialization.loads(encoded) == value
+    assert serialization.loads(encoded.encode("utf-8")) == value
+
+
+def test_encodes_types_the_response_encoder_used_to_handle():
+    from pydantic import BaseModel
+
+    class Doc(BaseModel):
+        source: str
+
+    when = datetime(2025, 1, 2, 3, 4, 5)
+    out = serialization.loads(serialization.dumpb({"at": when, "doc": Doc(source="a"), "tags": {"x"}}))
+    assert out == {"at": "2025-01-02T03:04:05", "doc": {"source": "a"}, "tags": ["x"]}
+    with pytest.raises(TypeError):
+        serialization.dumps({"bad": object()})
+
+
+def test_decode_errors_are_stdlib_decode_errors():
+    # callers keep catching json.JSONDecodeError (legacy plain-string personas)
+    with pytest.raises(json.JSONDecodeError):
+        serialization.loads("You are a helpful parish assistant.")
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("langchain_community")
+
+import app.redis_memory as redis_memory
+
+from fakes import FakeRedis
+
+KEY = "chatmem:c:s"
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(redis_memory, "r", fake)
+    fake.store[KEY] = [f"{'human' if i % 2 == 0 else 'ai'}:m{i}" for i in range(7)]
+    return fake
+
+
+def test_pages_walk_back_from_the_newest(fake):
+    async def run():
+        pages = []
+        before = None
+        while True:
+            page, before = await redis_memory.get_memory_page("c", "s", limit=3, before=before)
+            pages.append(page)
+            if before is None:
+                return pages
+
+    pages = asyncio.run(run())
+    assert [[entry[0] for entry in page] for page in pages] == [[4, 5, 6], [1, 2, 3], [0]]
+    assert pages[0][-1] == (6, "human", "m6")
+    assert pages[0][1] == (5, "ai", "m5")
+    # the first page is one round trip (LLEN + LRANGE pipelined), later pages one each
+    assert fake.round_trips == 3
+
+
+def test_without_limit_everything_is_returned(fake):
+    page, before = asyncio.run(redis_memory.get_memory_page("c", "s"))
+    assert [entry[2] for entry in page] == [f"m{i}" for i in range(7)] and before is None
+    page, before = asyncio.run(redis_memory.get_memory_page("c", "s", before=2))
+    assert [entry[0] for entry in page] == [0, 1] and before is None
+
+
+def test_stream_and_count(fake):
+    async def run():
+        streamed = [entry async for entry in redis_memory.iter_memory("c", "s", batch=3)]
+        return streamed, await redis_memory.memory_length("c", "s")
+
+    streamed, count = asyncio.run(run())
+    assert [entry[0] for entry in streamed] == list(range(7))
+    assert count == 7
+
+
+def test_empty_session(fake):
+    fake.store.clear()
+    assert asyncio.run(redis_memory.get_memory_page("c", "s", limit=5)) == ([], None)
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.redis_utils as redis_utils
+from app import singleflight
+
+from fakes import FakeRedis
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(redis_utils, "r", fake)
+    monkeypatch.setattr(singleflight, "POLL_MIN", 0.01)
+    monkeypatch.setattr(singleflight, "POLL_MAX", 0.02)
+    return fake
+
+
+def _counting(calls, delay=0.05):
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return {"answer": "Sunday 9am", "token_usage": 42, "cost_estimation": 0.01}
+    return fn
+
+
+def test_concurrent_identical_requests_share_one_call(fake):
+    calls = []
+
+    async def run():
+        fn = _counting(calls)
+        return await asyncio.gather(*(
+            singleflight.do("c:k", fn, encode=json.dumps, decode=json.loads) for _ in range(5)
+        ))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [r["answer"] for r in results] == ["Sunday 9am"] * 5
+    assert sum(r["token_usage"] for r in results) == 42
+    assert sum(1 for r in results if r.get("coalesced")) == 4
+    # the result was published for other workers and the lock released
+    assert json.loads(fake.store["sf:result:c:k"])["answer"] == "Sunday 9am"
+    assert "sf:lock:c:k" not in fake.store
+    assert singleflight._flights == {}
+
+
+def test_follower_in_another_worker_reads_the_published_result(fake):
+    calls = []
+    fake.store["sf:lock:c:k"] = "1"
+
+    async def other_worker_finishes():
+        await asyncio.sleep(0.05)
+        fake.store["sf:result:c:k"] = json.dumps({"answer": "from leader", "token_usage": 7})
+        del fake.store["sf:lock:c:k"]
+
+    async def run():
+        asyncio.get_running_loop().create_task(other_worker_finishes())
+        return await singleflight.do("c:k", _counting(calls), encode=json.dumps, decode=json.loads)
+
+    result = asyncio.run(run())
+    assert calls == []
+    assert result["answer"] == "from leader"
+    assert result["coalesced"] and result["token_usage"] == 0
+
+
+def test_follower_takes_over_when_the_leader_vanishes(fake):
+    calls = []
+    fake.store["sf:lock:c:k"] = "1"
+
+    async def leader_dies():
+        await asyncio.sleep(0.03)
+        del fake.store["sf:lock:c:k"]
+
+    async def run():
+        asyncio.get_running_loop().create_task(leader_dies())
+        return await singleflight.do("c:k", _counting(calls, 0), encode=json.dumps, decode=json.loads)
+
+    result = asyncio.run(run())
+    assert len(calls) == 1
+    assert "coalesced" not in result
+
+
+def test_redis_errors_fall_back_to_local(monkeypatch):
+    class Down:
+        async def set(self, *a, **k):
+            raise ConnectionError("redis down")
+
+    monkeypatch.setattr(redis_utils, "r", Down())
+    calls = []
+    result = asyncio.run(singleflight.do("c:k", _counting(calls, 0), encode=json.dumps, decode=json.loads))
+    assert len(calls) == 1 and result["token_usage"] == 42
+
+
+def test_flight_key_normalizes_question_but_not_history():
+    config = {"gpt_model": "gpt-4o", "system_prompt": "Be kind. {context} {question}"}
+    key = singleflight.flight_key("acme", config, "What are the Mass times?")
+    assert key == singleflight.flight_key("acme", config, "  what are the MASS times ")
+    assert key != singleflight.flight_key("acme", {**config, "gpt_model": "gpt-4.1"}, "What are the Mass times?")
+    assert key != singleflight.flight_key("acme", config, "What are the Mass times?", ["hi"])
+    assert key != singleflight.flight_key("other", config, "What are the Mass times?")
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("bs4")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts")))
+
+import httpx
+import sitemap_extract
+
+
+SITEMAP = b"""<?xml version="1.0"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://example.com/a</loc></url>
+  <url><loc>https://example.com/private/b</loc></url>
+</urlset>"""
+
+
+def test_fetch_cache_round_trip_and_validators(tmp_path):
+    cache = sitemap_extract.FetchCache(str(tmp_path))
+    assert cache.get("https://example.com/a") == (None, None)
+
+    cache.put("https://example.com/a", {"etag": '"v1"', "last-modified": "Mon, 01 Jan 2024 00:00:00 GMT"}, b"<p>hi</p>")
+    meta, body = cache.get("https://example.com/a")
+    assert body == b"<p>hi</p>"
+    assert sitemap_extract.FetchCache.conditional_headers(meta) == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }
+
+
+def test_parse_sitemap_returns_locations():
+    assert sitemap_extract.parse_sitemap(SITEMAP) == ["https://example.com/a", "https://example.com/private/b"]
+
+
+def test_crawl_uses_conditional_requests_and_robots(tmp_path):
+    seen_headers = []
+
+    def handler(request):
+        if request.url.path == "/robots.txt":
+            return httpx.Response(200, text="User-agent: *\nDisallow: /private/\n")
+        seen_headers.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=b"<p>page</p>", headers={"ETag": '"v1"'})
+
+    async def crawl():
+        async with sitemap_extract.Crawler(str(tmp_path), parser_workers=1) as crawler:
+            crawler._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            urls = ["https://example.com/a", "https://example.com/private/b"]
+            return [(r.url, r.status, r.not_modified, r.body) async for r in crawler.crawl(urls)]
+
+    first = asyncio.run(crawl())
+    second = asyncio.run(crawl())
+
+    assert first == [("https://example.com/a", 200, False, b"<p>page</p>")]
+    assert second == [("https://example.com/a", 304, True, b"<p>page</p>")]
+    assert seen_headers == [None, '"v1"']
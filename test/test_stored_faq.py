@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.redis_utils as redis_utils
+from app import faq
+
+from fakes import FakeRedis
+
+CONFIG = {
+    "client_id": "parish",
+    "system_prompt": "You are a parish assistant.\n\nContext:\n{context}\n\nQuestion:\n{question}",
+    "gpt_model": "gpt-3.5-turbo",
+    "embedding_model": "text-embedding-3-small",
+    "pinecone_index_name": "pastorate",
+}
+MASS = [1.0, 0.0, 0.0]
+OFFICE = [0.0, 1.0, 0.0]
+
+
+def _set(stamp="s1", config=CONFIG, corpus="c1"):
+    return {
+        "stamp": stamp,
+        "prompt_version": faq.prompt_version(config),
+        "corpus_version": corpus,
+        "embedding_model": config["embedding_model"],
+        "entries": [
+            {
+                "answer": "Sunday Mass is at 9am.",
+                "sources": [{"source": "bulletin", "text": "Mass: Sunday 9am"}],
+                "questions": [
+                    {"text": "What time is Sunday Mass?", "vector": MASS},
+                    {"text": "When is mass on sunday", "vector": [0.9, 0.1, 0.0]},
+                ],
+            },
+            {
+                "answer": "The office is open 9-5 on weekdays.",
+                "sources": [{"source": "contact", "text": "Office hours"}],
+                "questions": [{"text": "What are the office hours?", "vector": OFFICE}],
+            },
+        ],
+    }
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(redis_utils, "r", fake)
+    monkeypatch.setattr(faq, "_sets", {})
+    fake.store["corpus_version:pastorate"] = "c1"
+    return fake
+
+
+def _embedder(vector, calls):
+    async def embed(text):
+        calls.append(text)
+        return vector
+    return embed
+
+
+def _match(question, vector=(0.0, 0.0, 1.0), config=CONFIG):
+    calls = []
+    result = asyncio.run(faq.match(config, question, _embedder(list(vector), calls)))
+    return result, calls
+
+
+def test_exact_match_needs_no_embedding(fake):
+    asyncio.run(redis_utils.save_faq_set("parish", _set()))
+    result, calls = _match("  what time is SUNDAY mass ")
+    assert calls == []
+    assert result["answer"] == "Sunday Mass is at 9am."
+    assert result["token_usage"] == 0 and result["cost_estimation"] == 0.0
+    assert [d.metadata["source"] for d in result["source_documents"]] == ["bulletin"]
+
+
+def test_semantic_match_respects_threshold(fake):
+    asyncio.run(redis_utils.save_faq_set("parish", _set()))
+    result, calls = _match("Mass times this weekend?", vector=[0.98, 0.05, 0.1])
+    assert calls == ["Mass times this weekend?"]
+    assert result["answer"] == "Sunday Mass is at 9am."
+
+    result, _ = _match("Is there parking?", vector=[0.6, 0.6, 0.5])
+    assert result is None
+    # a per-client threshold can loosen (or tighten) the default
+    result, _ = _match("Is there parking?", vector=[0.6, 0.6, 0.5], config={**CONFIG, "faq_min_score": 0.5})
+    assert result is not None
+
+
+def test_prompt_or_corpus_change_makes_set_stale(fake):
+    asyncio.run(redis_utils.save_faq_set("parish", _set()))
+    question = "What are the office hours?"
+    assert _match(question)[0] is not None
+
+    persona = {**CONFIG, "system_prompt": "You are Father Samuel.\n" + CONFIG["system_prompt"]}
+    assert _match(question, config=persona)[0] is None
+    assert _match(question, config={**CONFIG, "gpt_model": "gpt-4o"})[0] is None
+    assert _match(question, config={**CONFIG, "embedding_model": "text-embedding-ada-002"})[0] is None
+
+    fake.store["corpus_version:pastorate"] = "c2"
+    assert _match(question)[0] is None
+    # rebuilt against the new corpus: served again
+    asyncio.run(redis_utils.save_faq_set("parish", _set(stamp="s2", corpus="c2")))
+    assert _match(question)[0] is not None
+
+
+def test_set_is_reloaded_only_when_stamp_changes(fake):
+    asyncio.run(redis_utils.save_faq_set("parish", _set()))
+    assert _match("What time is Sunday Mass?")[0] is not None
+    reads = fake.round_trips
+    assert _match("What time is Sunday Mass?")[0] is not None
+    # stamp and corpus version only; the set itself came from memory
+    assert fake.round_trips - reads == 2
+
+    updated = _set(stamp="s2")
+    updated["entries"][0]["answer"] = "Sunday Mass is at 10am."
+    asyncio.run(redis_utils.save_faq_set("parish", updated))
+    assert _match("What time is Sunday Mass?")[0]["answer"] == "Sunday Mass is at 10am."
+
+    del fake.store["faq:parish:stamp"]
+    assert _match("What time is Sunday Mass?")[0] is None
+    assert "parish" not in faq._sets
+
+
+def test_get_response_serves_faq_without_the_chain(fake, monkeypatch):
+    pytest.importorskip("langchain_community")
+    import app.chatbot as chatbot
+    from app.client_config import CLIENT_CONFIG
+
+    from fakes import FakeEmbeddings
+
+    config = {**CLIENT_CONFIG["prairiepastorate"], "openai_api_key": "sk-fake", "pinecone_api_key": "pc-fake"}
+    fake.store["client_config:parish"] = json.dumps(config)
+    resolved = asyncio.run(chatbot.resolve_config("parish"))
+    faq_set = _set(config=resolved)
+    faq_set["corpus_version"] = fake.store["corpus_version:pastorate"]
+    asyncio.run(redis_utils.save_faq_set("parish", faq_set))
+
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(chatbot, "get_embeddings", lambda config: embeddings)
+
+    def no_chain(config, chat_history):
+        raise AssertionError("the FAQ hit should not reach retrieval")
+
+    monkeypatch.setattr(chatbot, "get_qa_chain", no_chain)
+    result = asyncio.run(chatbot.get_response("chat-1", "What are the office hours?", "parish"))
+    assert result["answer"] == "The office is open 9-5 on weekdays."
+    assert result["token_usage"] == 0
+    assert embeddings.calls == 0
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import sys
+import types
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.warmup as warmup
+
+
+class FlakyRedis:
+    """Fails the first ``failures`` pings, then answers."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.pings = 0
+
+    async def ping(self):
+        self.pings += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("redis down")
+        return True
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(warmup, "state", warmup.WarmupState())
+    monkeypatch.setattr(warmup, "REDIS_RETRY_SECONDS", 0)
+    monkeypatch.setattr(warmup, "REDIS_CONNECTIONS", 2)
+    monkeypatch.setattr(warmup, "warm_up_local_models", lambda models: [])
+    monkeypatch.setattr(warmup.chatbot, "get_pinecone_index", lambda config: object())
+    monkeypatch.setattr(warmup, "get_embeddings", lambda config: object())
+    # a real tiktoken would download its encodings on a cold cache
+    fake_tiktoken = types.ModuleType("tiktoken")
+    fake_tiktoken.get_encoding = lambda name: types.SimpleNamespace(name=name)
+    fake_tiktoken.encoding_for_model = lambda model: types.SimpleNamespace(name="o200k_base")
+    monkeypatch.setitem(sys.modules, "tiktoken", fake_tiktoken)
+
+
+def test_waits_for_redis_then_reports_ready(monkeypatch):
+    redis = FlakyRedis(failures=1)
+    monkeypatch.setattr(warmup, "r", redis)
+
+    async def configs():
+        return {"acme": {"pinecone_index_name": "acme-idx", "gpt_model": "gpt-4o"}, "empty": {}}
+
+    async def persona(client_id):
+        return "be nice" if client_id == "acme" else None
+
+    monkeypatch.setattr(warmup, "get_all_client_configs", configs)
+    monkeypatch.setattr(warmup, "get_persona", persona)
+
+    state = asyncio.run(warmup.run_warmup(query=None))
+
+    assert state.ready
+    report = state.as_dict()
+    assert report["warmup_seconds"] is not None
+    assert report["steps"]["redis"]["status"] == "ok"
+    assert report["steps"]["configs"] == {**report["steps"]["configs"], "clients": 2, "personas": 1}
+    assert report["steps"]["tenant_clients"]["tenants"] == ["acme"]
+    assert report["steps"]["encodings"]["encodings"] == ["cl100k_base", "o200k_base"]
+    assert "synthetic_queries" not in report["steps"]
+
+
+def test_failed_optional_step_does_not_block_readiness(monkeypatch):
+    monkeypatch.setattr(warmup, "r", FlakyRedis(failures=0))
+
+    async def broken():
+        raise RuntimeError("config store unavailable")
+
+    monkeypatch.setattr(warmup, "get_all_client_configs", broken)
+
+    state = asyncio.run(warmup.run_warmup(query=None))
+
+    assert state.ready
+    assert state.steps["configs"]["status"] == "failed"
+    assert "config store unavailable" in state.steps["configs"]["error"]
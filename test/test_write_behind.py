@@ -0,0 +1,191 @@
+import asyncio
+import os
+import sys
+from functools import partial
+
+import pytest
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.redis_utils as redis_utils
+from app import background
+from app.background import BackgroundExecutor
+
+from fakes import FakeRedis
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(redis_utils, "r", fake)
+    return fake
+
+
+async def push(key, value, pipe):
+    pipe.rpush(key, value)
+
+
+def test_jobs_from_many_requests_share_one_round_trip(fake):
+    executor = BackgroundExecutor(shards=1, linger=0.01)
+
+    async def run():
+        for i in range(10):
+            await executor.submit(f"s{i}", partial(push, f"list:{i}", "x"))
+        await executor.drain()
+
+    asyncio.run(run())
+    assert fake.round_trips == 1
+    assert all(fake.store[f"list:{i}"] == ["x"] for i in range(10))
+
+
+def test_flush_sees_every_write_for_the_session_in_order(fake):
+    executor = BackgroundExecutor(shards=4, linger=0)
+
+    async def run():
+        for i in range(5):
+            await executor.submit("chatmem:c:s", partial(push, "chatmem:c:s", str(i)))
+        await executor.flush("chatmem:c:s")
+        return list(fake.store["chatmem:c:s"])
+
+    assert asyncio.run(run()) == ["0", "1", "2", "3", "4"]
+
+
+def test_full_queue_writes_inline(fake, monkeypatch):
+    monkeypatch.setattr(background, "SUBMIT_TIMEOUT", 0.01)
+    executor = BackgroundExecutor(shards=1, queue_size=1, linger=0)
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def stuck(pipe):
+            await gate.wait()
+
+        await executor.submit("a", stuck)   # taken by the worker, which then blocks
+        await asyncio.sleep(0)
+        await executor.submit("b", partial(push, "b", "queued"))  # fills the queue
+        await executor.submit("c", partial(push, "c", "inline"))  # no room: runs now
+        assert fake.store["c"] == ["inline"] and "b" not in fake.store
+        gate.set()
+        await executor.drain()
+
+    asyncio.run(run())
+    assert fake.store["b"] == ["queued"]
+
+
+def test_one_failing_job_does_not_lose_the_batch(fake):
+    executor = BackgroundExecutor(shards=1, linger=0.01)
+
+    async def broken(pipe):
+        raise RuntimeError("bad job")
+
+    async def run():
+        await executor.submit("a", partial(push, "a", "1"))
+        await executor.submit("b", broken)
+        await executor.submit("c", partial(push, "c", "1"))
+        await executor.drain()
+
+    asyncio.run(run())
+    assert fake.store["a"] == ["1"] and fake.store["c"] == ["1"]
+
+
+def test_failed_command_in_batch_does_not_replay_the_others(fake):
+    executor = BackgroundExecutor(shards=1, linger=0.01)
+    fake.store["not-a-counter"] = ["x"]
+
+    async def wrong_type(pipe):
+        pipe.rpush("wrong:log", "1")
+        pipe.incrby("not-a-counter", 1)  # WRONGTYPE inside EXEC
+
+    async def half_queued(pipe):
+        pipe.rpush("half", "1")
+        raise RuntimeError("failed after queuing a command")
+
+    async def run():
+        await executor.submit("tokens:c", partial(redis_utils.increment_token_usage, api_key="c",
+                                                  token_count=5, model="gpt"))
+        await executor.submit("chatmem:c:s", partial(push, "chatmem:c:s", "turn"))
+        await executor.submit("w", wrong_type)
+        await executor.submit("h", half_queued)
+        await executor.submit("feedback:c", partial(redis_utils.append_feedback_event, "c", "m1", "u1", "up"))
+        await executor.drain()
+
+    asyncio.run(run())
+    assert fake.store["token_usage:c:total"] == "5"
+    assert fake.store["chatmem:c:s"] == ["turn"]
+    assert fake.store["wrong:log"] == ["1"]  # the failed job's other command ran once, and was not retried
+    assert "half" not in fake.store          # its partial commands were dropped, never sent
+    assert len(fake.store["feedback_stream:c"]) == 1
+
+
+def test_connection_lost_during_exec_is_not_replayed(fake, monkeypatch):
+    executor = BackgroundExecutor(shards=1, linger=0.01)
+    pipeline = fake.pipeline
+    dropped = []
+
+    def lossy_pipeline(*args, **kwargs):
+        pipe = pipeline()
+        execute = pipe.execute
+
+        async def execute_then_drop(**kw):
+            await execute(**kw)
+            dropped.append(1)
+            raise ConnectionError("connection lost before the EXEC reply")
+        pipe.execute = execute_then_drop
+        return pipe
+
+    async def run():
+        await executor.submit("a", partial(push, "a", "1"))
+        await executor.submit("b", partial(push, "b", "1"))
+        monkeypatch.setattr(fake, "pipeline", lossy_pipeline)
+        await executor.drain()
+
+    asyncio.run(run())
+    assert dropped == [1]
+    assert fake.store["a"] == ["1"] and fake.store["b"] == ["1"]
+
+
+def test_token_usage_can_be_queued_on_a_shared_pipeline(fake):
+    async def run():
+        await background.submit("tokens:c", partial(redis_utils.increment_token_usage, api_key="c",
+                                                    token_count=5, model="gpt"))
+        await background.drain()
+
+    asyncio.run(run())
+    assert fake.store["token_usage:c:total"] == "5"
+    assert fake.store["token_usage:c:model:gpt"] == "5"
+
+
+def test_turns_deferred_by_two_workers_are_both_kept(fake, monkeypatch):
+    pytest.importorskip("langchain_community")
+    from datetime import timedelta
+
+    import app.redis_memory as redis_memory
+
+    async def session_timeout(client_id):
+        return timedelta(minutes=30)
+
+    monkeypatch.setattr(redis_memory, "r", fake)
+    monkeypatch.setattr(redis_memory, "get_session_timeout", session_timeout)
+    key = redis_memory.memory_key("c", "s")
+    fake.store[key] = ["human:q0", "ai:a0"]
+    worker_a = BackgroundExecutor(shards=1, linger=0.05)
+    worker_b = BackgroundExecutor(shards=1, linger=0)
+
+    async def turn(worker, question, answer):
+        history = await redis_memory.get_memory("c", "s")
+        history.add_user_message(question)
+        history.add_ai_message(answer)
+        await worker.submit(key, partial(redis_memory.append_memory, "c", "s", history.messages[-2:]))
+        return len(history.messages)
+
+    async def run():
+        await turn(worker_a, "q1", "a1")
+        # the next turn lands on another worker before the first one's write
+        seen = await turn(worker_b, "q2", "a2")
+        await worker_b.drain()
+        await worker_a.drain()
+        return seen
+
+    assert asyncio.run(run()) == 4
+    assert fake.store[key] == ["human:q0", "ai:a0", "human:q2", "ai:a2", "human:q1", "ai:a1"]